@@ -1,9 +1,30 @@
 import streamlit as st
-from database import cursor
+from snapshot import snapshot_age, snapshot_connection, snapshots
+from attachments import storage_stats
+from chat_archive import load_transcript
+from batch_matching import recent_reports
+from matchmaker import matchmaker_stats
+from scheduler import queue_age_percentiles, scheduler as match_scheduler
+from polling import poller_stats
+from background import loop_stats
 
 def admin_page():
+    # Analytics read from a periodic snapshot so they never contend with live chat writes;
+    # "Refresh Admin Data" starts a new copy and the page shows it on a later visit.
+    force = st.session_state.pop("admin_force_refresh", False)
+    with snapshot_connection(max_age=0 if force else None) as conn:
+        render_admin_panel(conn)
+
+def render_admin_panel(conn):
     st.title("🛡️ Admin Control Center")
     st.caption("Comprehensive overview of users, network health, and session quality.")
+    st.caption(
+        f"📸 Data snapshot is {int(snapshot_age() or 0)}s old "
+        f"(refreshed in the background when older than {int(snapshots.max_age)}s)"
+        + (" · refresh in progress" if snapshots.refreshing() else "")
+    )
+    if snapshots.last_error:
+        st.caption(f"Last snapshot refresh failed: {snapshots.last_error}")
     st.divider()
 
     # =================================================
@@ -11,16 +32,16 @@ def admin_page():
     # =================================================
     st.subheader("Platform Statistics")
 
-    cursor.execute("SELECT COUNT(*) FROM auth_users")
+    cursor = conn.execute("SELECT COUNT(*) FROM auth_users")
     total_users = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM profiles WHERE role='Student'")
+    cursor = conn.execute("SELECT COUNT(*) FROM profiles WHERE role='Student'")
     students = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM profiles WHERE role='Teacher'")
+    cursor = conn.execute("SELECT COUNT(*) FROM profiles WHERE role='Teacher'")
     teachers = cursor.fetchone()[0]
 
-    cursor.execute("SELECT COUNT(*) FROM session_ratings")
+    cursor = conn.execute("SELECT COUNT(*) FROM session_ratings")
     total_sessions = cursor.fetchone()[0]
 
     c1, c2, c3, c4 = st.columns(4)
@@ -36,14 +57,14 @@ def admin_page():
     # =================================================
     st.subheader("User Directory & Performance")
 
-    cursor.execute("""
+    cursor = conn.execute("""
         SELECT 
             a.id, a.name, a.email, 
             p.role, p.grade, p.time,
             p.strong_subjects, p.weak_subjects, p.teaches,
-            (SELECT AVG(rating) FROM session_ratings sr 
-             JOIN profiles pr ON pr.match_id = sr.match_id 
-             WHERE pr.user_id = a.id AND sr.rater_id != a.id) as avg_rating
+            (SELECT AVG(sr.rating) FROM session_participants sp
+             JOIN session_ratings sr ON sr.match_id = sp.match_id AND sr.rater_id = sp.peer_id
+             WHERE sp.user_id = a.id) as avg_rating
         FROM auth_users a
         LEFT JOIN profiles p ON a.id = p.user_id
         ORDER BY a.id DESC
@@ -73,14 +94,14 @@ def admin_page():
                 # Show specific feedback for THIS user
                 st.markdown("---")
                 st.markdown("**Recent Feedback for this User:**")
-                cursor.execute("""
+                cursor = conn.execute("""
                     SELECT sr.rating, sr.feedback, sr.rated_at, au.name 
-                    FROM session_ratings sr
+                    FROM session_participants sp
+                    JOIN session_ratings sr ON sr.match_id = sp.match_id AND sr.rater_id = sp.peer_id
                     JOIN auth_users au ON sr.rater_id = au.id
-                    JOIN profiles p ON sr.match_id = p.match_id
-                    WHERE p.user_id = ? AND sr.rater_id != ?
+                    WHERE sp.user_id = ?
                     ORDER BY sr.rated_at DESC LIMIT 3
-                """, (uid, uid))
+                """, (uid,))
                 feedbacks = cursor.fetchall()
                 if feedbacks:
                     for r, f, d, rater in feedbacks:
@@ -96,7 +117,7 @@ def admin_page():
     # =================================================
     st.subheader("Global Session Audit")
 
-    cursor.execute("""
+    cursor = conn.execute("""
         SELECT 
             sr.match_id, 
             au.name as rater, 
@@ -124,6 +145,16 @@ def admin_page():
             })
         st.table(audit_data)
 
+        session_ids = list(dict.fromkeys(row[0] for row in session_logs if row[0]))
+        if session_ids:
+            with st.expander("📜 Session Transcript"):
+                picked = st.selectbox("Session ID", session_ids, key="admin_transcript_session")
+                transcript = load_transcript(picked, conn)
+                if not transcript:
+                    st.write("No messages recorded for this session.")
+                for m in transcript:
+                    st.write(f"**{m['sender']}:** {m['message']}")
+
     st.divider()
 
     # =================================================
@@ -131,17 +162,16 @@ def admin_page():
     # =================================================
     st.subheader("Top Rated Learning Partners")
 
-    # This query finds users based on ratings received from others
-    cursor.execute("""
+    # Ratings received from partners, over every session a user took part in
+    cursor = conn.execute("""
         SELECT 
             a.name, 
             AVG(sr.rating) as score, 
             COUNT(sr.id) as sessions
-        FROM auth_users a
-        JOIN profiles p ON a.id = p.user_id
-        JOIN session_ratings sr ON p.match_id = sr.match_id
-        WHERE sr.rater_id != a.id
-        GROUP BY a.id
+        FROM session_participants sp
+        JOIN session_ratings sr ON sr.match_id = sp.match_id AND sr.rater_id = sp.peer_id
+        JOIN auth_users a ON a.id = sp.user_id
+        GROUP BY sp.user_id
         ORDER BY score DESC
     """)
     leaderboard = cursor.fetchall()
@@ -153,5 +183,124 @@ def admin_page():
             lname, lscore, lcount = row
             st.write(f"{i}. **{lname}** — ⭐ {round(lscore, 2)} ({lcount} reviews)")
 
+    # =================================================
+    # MATCHMAKER
+    # =================================================
+    st.divider()
+    st.subheader("Matchmaker")
+    mm = matchmaker_stats()
+    m1, m2, m3, m4 = st.columns(4)
+    m1.metric("Queue Length", mm["queue"])
+    m2.metric("Tick Rate", f"{mm['tick_rate']:.2f}/s")
+    m3.metric("Matches Written", mm["matches"])
+    m4.metric("Lost Claims", mm["lost_claims"])
+    ttm = mm["time_to_match"]
+    if ttm:
+        st.caption(
+            f"Time to match over the last {ttm['samples']} users: "
+            f"p50 {ttm['p50']:.1f}s · p90 {ttm['p90']:.1f}s · p99 {ttm['p99']:.1f}s"
+        )
+    elif not mm["running"]:
+        st.caption("Matchmaker thread is not running in this process.")
+
+    ages = queue_age_percentiles()
+    q1, q2, q3, q4 = st.columns(4)
+    if ages["p50"] is not None:
+        q1.metric("Queue Age p50", f"{ages['p50']:.0f}s")
+        q2.metric("Queue Age p90", f"{ages['p90']:.0f}s")
+        q3.metric("Queue Age p95", f"{ages['p95']:.0f}s")
+    else:
+        q1.metric("Oldest in Queue", f"{ages['max']:.0f}s")
+    q4.metric("Mentors at Capacity", mm["mentors_at_capacity"])
+    st.caption(
+        f"Mentors take at most {match_scheduler.capacity} sessions per "
+        f"{match_scheduler.window // 60} min; waiting adds {match_scheduler.wait_weight:g} "
+        f"score points per second, up to {match_scheduler.wait_cap}s. "
+        "Capacity and queue ages are counted per server process."
+    )
+
+    # =================================================
+    # FRAGMENT POLLING
+    # =================================================
+    polls = poller_stats()
+    if polls:
+        st.divider()
+        st.subheader("Fragment Polling")
+        total = sum(p["polls"] for p in polls)
+        empty = sum(p["empty"] for p in polls)
+        p1, p2, p3 = st.columns(3)
+        p1.metric("Live Pollers", len(polls))
+        p2.metric("Polls", total)
+        p3.metric("Empty Polls", f"{empty / total:.0%}" if total else "—")
+        with st.expander("Per-session breakdown"):
+            st.table([
+                {
+                    "User": p["owner"] or "—",
+                    "Fragment": p["name"],
+                    "Polls": p["polls"],
+                    "Empty": f"{p['empty_fraction']:.0%}",
+                    "Interval": f"{p['interval']:.1f}s",
+                }
+                for p in polls
+            ])
+
+    # =================================================
+    # ATTACHMENTS
+    # =================================================
+    store = storage_stats(conn)
+    if store["uploads"]:
+        st.divider()
+        st.subheader("Attachments")
+        s1, s2, s3, s4 = st.columns(4)
+        s1.metric("Stored Files", store["blobs"])
+        s2.metric("Disk Used", f"{store['bytes'] / (1 << 20):.1f} MB")
+        s3.metric("Deduplicated", store["uploads"] - store["blobs"])
+        s4.metric("Image Previews", store["previews"])
+
+    # =================================================
+    # BATCH MATCHING ROUNDS
+    # =================================================
+    reports = recent_reports()
+    if reports:
+        st.divider()
+        st.subheader("Batch Matching Rounds")
+        last = reports[-1]
+        b1, b2, b3, b4 = st.columns(4)
+        b1.metric("Pairs (last round)", last["pairs"])
+        b2.metric("Matched", f"{last['matched_fraction']:.0%}")
+        b3.metric("Total Score", last["total_score"])
+        b4.metric("Solve Time", f"{last['solve_s'] * 1000:.0f} ms")
+        with st.expander("Per-slot breakdown"):
+            for slot, r in last["slots"].items():
+                st.write(
+                    f"**{slot}** — {r['pairs']} pairs from {r['mentees']} mentees / "
+                    f"{r['mentors']} mentors, score {r['total_score']}, "
+                    f"{r['method']} in {r['solve_s'] * 1000:.0f} ms"
+                )
+
+    # =================================================
+    # BACKGROUND JOBS
+    # =================================================
+    jobs = loop_stats()
+    if jobs:
+        st.divider()
+        st.subheader("Background Jobs")
+        failing = sum(1 for j in jobs.values() if j["failures"])
+        j1, j2, j3 = st.columns(3)
+        j1.metric("Jobs Running", sum(1 for j in jobs.values() if j["running"]))
+        j2.metric("Failed Passes", sum(j["failures"] for j in jobs.values()))
+        j3.metric("Jobs With Errors", failing)
+        st.table([
+            {
+                "Job": name,
+                "Running": "yes" if j["running"] else "no",
+                "Passes": j["runs"],
+                "Failures": j["failures"],
+                "Last Error": j["last_error"] or "—",
+            }
+            for name, j in jobs.items()
+        ])
+
     if st.button("Refresh Admin Data"):
+        st.session_state.admin_force_refresh = True
         st.rerun()
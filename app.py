@@ -3,7 +3,13 @@ import pandas as pd
 from groq import Groq
 from supabase import create_client, Client
 import time
+import threading
+import hashlib
+import io
+import os
 from datetime import datetime, timedelta
+from html import escape
+from profile_record import Profile, best_match_index, load_record
 
 # =========================================================
 # 1. APP CONFIGURATION & STYLING
@@ -72,25 +78,71 @@ if "GROQ_API_KEY" in st.secrets:
 # 4. HELPER FUNCTIONS
 # =========================================================
 
+STALE_AFTER = timedelta(hours=1)   # waiting profiles unseen this long are deleted
+PRESENCE_TTL = timedelta(minutes=2) # waiting profiles unseen this long are not offered as matches
+HEARTBEAT_INTERVAL = 30            # seconds between last_seen writes from the waiting page
+CLEANUP_INTERVAL = 300             # seconds between background cleanup passes
+CHAT_WINDOW = 50                   # messages shown before "Load older"
+CHAT_PAGE = 50                     # messages added per "Load older"
+CHAT_COLUMNS = "id, sender, message, file_url, created_at"
+UPLOAD_CHUNK = 1 << 20             # bytes hashed per read
+MAX_UPLOAD = 10 << 20              # largest shared file, bytes
+
 def cleanup_stale_data():
     try:
-        one_hour_ago = (datetime.utcnow() - timedelta(hours=1)).isoformat()
-        supabase.table("profiles").delete().eq("status", "waiting").lt("created_at", one_hour_ago).execute()
+        one_hour_ago = (datetime.utcnow() - STALE_AFTER).isoformat()
+        supabase.table("profiles").delete().eq("status", "waiting").lt("last_seen", one_hour_ago).execute()
     except: pass
 
+@st.cache_resource
+def start_stale_data_reaper():
+    # One cleanup thread per server process instead of a DELETE before every search
+    def reap():
+        while True:
+            cleanup_stale_data()
+            time.sleep(CLEANUP_INTERVAL)
+    reaper = threading.Thread(target=reap, name="sahay-stale-reaper", daemon=True)
+    reaper.start()
+    return reaper
+
 def delete_user_data(user_name):
     try: supabase.table("profiles").delete().eq("name", user_name).execute()
     except: pass
 
+def heartbeat(user_name):
+    # Presence: profiles.last_seen (timestamptz, default now()) is refreshed
+    # while the waiting page is open; matching and cleanup filter on it.
+    try: supabase.table("profiles").update({"last_seen": datetime.utcnow().isoformat()}).eq("name", user_name).eq("status", "waiting").execute()
+    except: pass
+
+@st.fragment(run_every=HEARTBEAT_INTERVAL)
+def keep_presence():
+    heartbeat(st.session_state.user_name)
+
 def upload_file(file_obj, match_id):
+    # Content-addressed: a file is keyed by its SHA-256, hashed in chunks, and
+    # only uploaded when the bucket has no object under that key yet.
+    # Raises ValueError for files over MAX_UPLOAD; returns None if storage fails.
+    if file_obj.size > MAX_UPLOAD:
+        raise ValueError(f"That file is too large; files up to {MAX_UPLOAD >> 20} MB can be shared.")
     try:
-        clean_name = file_obj.name.replace(" ", "_")
-        file_path = f"{match_id}/{int(time.time())}_{clean_name}"
-        bucket = "chat-files"
-        supabase.storage.from_(bucket).upload(file_path, file_obj.getvalue(), {"content-type": file_obj.type})
-        return supabase.storage.from_(bucket).get_public_url(file_path)
+        digest = hashlib.sha256()
+        file_obj.seek(0)
+        for chunk in iter(lambda: file_obj.read(UPLOAD_CHUNK), b""): digest.update(chunk)
+        h = digest.hexdigest()
+        file_path = f"{h[:2]}/{h[2:4]}/{h}{os.path.splitext(file_obj.name)[1].lower()}"
+        bucket = supabase.storage.from_("chat-files")
+        if not bucket.exists(file_path):
+            # Streamed from the rewound upload. Two users sending the same file
+            # at once write identical bytes under the same key, so upsert is safe.
+            file_obj.seek(0)
+            reader = io.BufferedReader(file_obj, UPLOAD_CHUNK)
+            try: bucket.upload(file_path, reader, {"content-type": file_obj.type, "upsert": "true"})
+            finally: reader.detach()
+        return bucket.get_public_url(file_path)
     except: return None
 
+# Reference rules; searches score pre-parsed records (profile_record.py) instead
 def calculate_match_score(me, candidate):
     score = 0
     my_lang = set(x.strip() for x in (me.get('languages') or "").split(',') if x.strip())
@@ -121,21 +173,14 @@ def calculate_match_score(me, candidate):
 
     return score
 
-def find_best_match(my_profile):
-    cleanup_stale_data()
-    opposite = "Teacher" if my_profile['role'] == "Student" else "Student"
-    response = supabase.table("profiles").select("*").eq("role", opposite).eq("time_slot", my_profile['time_slot']).eq("status", "waiting").execute()
-    candidates = response.data
-    if not candidates: return None
-
-    best = None
-    high_score = 0
-    for p in candidates:
-        s = calculate_match_score(my_profile, p)
-        if s > high_score:
-            high_score = s
-            best = p
-    return best
+def find_best_match(me):
+    # `me` is the Profile record built when the profile was saved
+    fresh_since = (datetime.utcnow() - PRESENCE_TTL).isoformat()
+    opposite = "Teacher" if me.role == "Student" else "Student"
+    response = supabase.table("profiles").select("*").eq("role", opposite).eq("time_slot", me.time_slot).eq("status", "waiting").gte("last_seen", fresh_since).execute()
+    candidates = [load_record(p) for p in response.data]
+    best = best_match_index(me, candidates)
+    return None if best is None else response.data[best]
 
 def check_if_matched_by_others(my_name):
     try:
@@ -151,6 +196,7 @@ def check_if_matched_by_others(my_name):
 def save_profile(data):
     data['subjects'] = ", ".join(data['subjects'])
     data['languages'] = ",".join(data['languages'])
+    data['last_seen'] = datetime.utcnow().isoformat()
     try:
         supabase.table("profiles").insert(data).execute()
         return True
@@ -168,9 +214,59 @@ def create_match_record(p1, p2):
     except: pass
     return m_id
 
+def _chat_query(match_id):
+    return supabase.table("messages").select(CHAT_COLUMNS).eq("match_id", match_id)
+
+def _keyset(op, m):
+    # Rows strictly after/before message `m` in (created_at, id) order, so
+    # messages sharing a timestamp are neither skipped nor repeated.
+    return f'created_at.{op}."{m["created_at"]}",and(created_at.eq."{m["created_at"]}",id.{op}.{m["id"]})'
+
+def load_chat(match_id):
+    # The newest CHAT_WINDOW messages on first load; after that only rows past
+    # the last one held are fetched and appended to session state.
+    history = st.session_state.get("chat_history")
+    if not history or history["match_id"] != match_id:
+        rows = _chat_query(match_id).order("created_at", desc=True).order("id", desc=True).limit(CHAT_WINDOW).execute().data
+        history = st.session_state.chat_history = {"match_id": match_id, "messages": rows[::-1], "at_start": len(rows) < CHAT_WINDOW, "expanded": False}
+    else:
+        query = _chat_query(match_id)
+        if history["messages"]: query = query.or_(_keyset("gt", history["messages"][-1]))
+        history["messages"] += query.order("created_at").order("id").execute().data
+        if not history["expanded"] and len(history["messages"]) > CHAT_WINDOW:
+            # Nobody scrolled back: keep the window at CHAT_WINDOW.
+            del history["messages"][:-CHAT_WINDOW]
+            history["at_start"] = False
+    return history["messages"], not history["at_start"]
+
+def load_older_chat(match_id):
+    history = st.session_state.chat_history
+    page = _chat_query(match_id).or_(_keyset("lt", history["messages"][0])).order("created_at", desc=True).order("id", desc=True).limit(CHAT_PAGE).execute().data
+    history["messages"][:0] = page[::-1]
+    history["at_start"] = len(page) < CHAT_PAGE
+    history["expanded"] = True
+
+def chat_html(msgs, me):
+    # Every visible message as one pre-built block, escaped.
+    parts = []
+    for m in msgs:
+        text = escape(m['message'] or "")
+        link = f"<a href='{escape(m['file_url'])}' target='_blank'>📎 View File</a>" if m.get('file_url') else ""
+        if m['sender'] == me:
+            parts.append(f"<div class='chat-bubble-me'>{text}</div>")
+            if link: parts.append(f"<div style='float:right; clear:both; margin-bottom:10px;'>{link}</div>")
+        elif m['sender'] == "AI Bot":
+            parts.append(f"<div class='chat-bubble-ai'>🤖 <b>Sahay AI:</b> {text.replace('🤖 ', '')}</div>")
+        else:
+            parts.append(f"<div class='chat-bubble-partner'><b>{escape(m['sender'] or '')}:</b> {text}</div>")
+            if link: parts.append(f"<div style='float:left; clear:both; margin-bottom:10px;'>{link}</div>")
+    return "".join(parts)
+
 # =========================================================
 # 5. MAIN APP LOGIC
 # =========================================================
+start_stale_data_reaper()
+
 if "stage" not in st.session_state: st.session_state.stage = 1
 if "user_name" not in st.session_state: st.session_state.user_name = ""
 
@@ -210,6 +306,7 @@ if st.session_state.stage == 1:
                     }
                     if save_profile(profile):
                         st.session_state.profile = profile
+                        st.session_state.profile_record = Profile.from_dict(profile)
                         st.session_state.user_name = name
                         st.session_state.stage = 2
                         st.rerun()
@@ -222,11 +319,12 @@ elif st.session_state.stage == 2:
     col1, col2, col3 = st.columns([1,2,1])
     with col2:
         st.info(f"Looking for match for **{st.session_state.user_name}** ({st.session_state.profile['time_slot']})...")
+        keep_presence()
         
         if st.button("🔄 Click to Search Now", type="primary", use_container_width=True):
             with st.spinner("Cleaning old records & calculating scores..."):
                 time.sleep(1)
-                match = find_best_match(st.session_state.profile)
+                match = find_best_match(st.session_state.get("profile_record") or Profile.from_dict(st.session_state.profile))
             
             if match:
                 st.balloons()
@@ -265,20 +363,17 @@ elif st.session_state.stage == 3:
     
     with col_chat:
         try:
-            msgs = supabase.table("messages").select("*").eq("match_id", st.session_state.match_id).order("created_at").execute().data
-        except: msgs = []
+            msgs, has_older = load_chat(st.session_state.match_id)
+        except: msgs, has_older = [], False
 
         with st.container(height=500, border=True):
             if not msgs: st.caption("Start the conversation! 👋")
-            for m in msgs:
-                if m['sender'] == st.session_state.user_name:
-                    st.markdown(f"<div class='chat-bubble-me'>{m['message']}</div>", unsafe_allow_html=True)
-                    if m.get('file_url'): st.markdown(f"<div style='float:right; clear:both; margin-bottom:10px;'><a href='{m['file_url']}' target='_blank'>📎 View File</a></div>", unsafe_allow_html=True)
-                elif m['sender'] == "AI Bot":
-                    st.markdown(f"<div class='chat-bubble-ai'>🤖 <b>Sahay AI:</b> {m['message'].replace('🤖 ', '')}</div>", unsafe_allow_html=True)
-                else:
-                    st.markdown(f"<div class='chat-bubble-partner'><b>{m['sender']}:</b> {m['message']}</div>", unsafe_allow_html=True)
-                    if m.get('file_url'): st.markdown(f"<div style='float:left; clear:both; margin-bottom:10px;'><a href='{m['file_url']}' target='_blank'>📎 View File</a></div>", unsafe_allow_html=True)
+            if has_older and st.button("⬆️ Load older messages", key="load_older"):
+                try:
+                    load_older_chat(st.session_state.match_id)
+                except: pass
+                st.rerun()
+            st.markdown(chat_html(msgs, st.session_state.user_name), unsafe_allow_html=True)
 
         with st.form("chat_input", clear_on_submit=True):
             c1, c2 = st.columns([5, 1])
@@ -298,10 +393,13 @@ elif st.session_state.stage == 3:
             up_file = st.file_uploader("Upload", key="u", label_visibility="collapsed")
             if up_file and st.button("Send File", use_container_width=True):
                 with st.spinner("Sending..."):
-                    url = upload_file(up_file, st.session_state.match_id)
-                    if url:
-                        supabase.table("messages").insert({ "match_id": st.session_state.match_id, "sender": st.session_state.user_name, "message": "📄 *Sent a file*", "file_url": url, "file_type": up_file.type }).execute()
-                        st.rerun()
+                    try: url = upload_file(up_file, st.session_state.match_id)
+                    except ValueError as e: st.error(str(e))
+                    else:
+                        if url:
+                            supabase.table("messages").insert({ "match_id": st.session_state.match_id, "sender": st.session_state.user_name, "message": "📄 *Sent a file*", "file_url": url, "file_type": up_file.type }).execute()
+                            st.rerun()
+                        else: st.error("Upload failed. Please try again.")
 
             st.markdown("---")
             st.write("🤖 **AI Tutor**")
@@ -9,12 +9,11 @@ from auth import auth_page
 from dashboard import dashboard_page
 
 # ---- DATABASE ----
-from database import init_db, cursor, conn
-
-# =========================================================
-# INIT DATABASE
-# =========================================================
-init_db()
+# Importing database applies any pending schema migrations.
+from database import get_connection, transaction
+from profiles import sync_profile_subjects
+from discovery import index as discovery_index
+from ranking import top_k_mentors as rank_mentors
 
 # =========================================================
 # PAGE CONFIG
@@ -87,20 +86,20 @@ if st.sidebar.button("Logout", key="logout_btn"):
 # DATABASE LOADERS
 # =========================================================
 def load_users():
-    cursor.execute("""
-        SELECT 
-            a.name,
-            p.role,
-            p.grade,
-            p.class,
-            p.time,
-            p.strong_subjects,
-            p.weak_subjects,
-            p.teaches
-        FROM profiles p
-        JOIN auth_users a ON a.id = p.user_id
-    """)
-    rows = cursor.fetchall()
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT 
+                a.name,
+                p.role,
+                p.grade,
+                p.class,
+                p.time,
+                p.strong_subjects,
+                p.weak_subjects,
+                p.teaches
+            FROM profiles p
+            JOIN auth_users a ON a.id = p.user_id
+        """).fetchall()
 
     mentors, mentees = [], []
 
@@ -146,17 +145,18 @@ def calculate_match_score(mentee, mentor):
     return score, reasons
 
 
-def find_best_mentor(mentee, mentors):
-    best, best_score, best_reasons = None, -1, []
+MIN_MATCH_SCORE = 15
+TOP_K = 5
+
 
-    for mentor in mentors:
-        if mentor["name"] == mentee["name"]:
-            continue
-        score, reasons = calculate_match_score(mentee, mentor)
-        if score > best_score:
-            best, best_score, best_reasons = mentor, score, reasons
+def top_k_mentors(mentee, mentors, k=TOP_K):
+    """The k best (mentor, score, reasons), best first; see ranking.top_k."""
+    return rank_mentors(mentee, mentors, calculate_match_score, k, MIN_MATCH_SCORE)
 
-    return (best, best_score, best_reasons) if best_score >= 15 else (None, 0, [])
+
+def find_best_mentor(mentee, mentors):
+    best = top_k_mentors(mentee, mentors, k=1)
+    return best[0] if best else (None, 0, [])
 
 # =========================================================
 # PAGE ROUTING
@@ -205,23 +205,26 @@ elif page == "Matchmaking":
                 "teaches": teaches
             }
 
-            cursor.execute("""
-                INSERT INTO profiles
-                (user_id, role, grade, class, time, strong_subjects, weak_subjects, teaches)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                st.session_state.user_id,
-                profile["role"],
-                profile["grade"],
-                profile["class"],
-                profile["time"],
-                ",".join(strong),
-                ",".join(weak),
-                ",".join(teaches)
-            ))
-            conn.commit()
+            with transaction() as conn:
+                conn.execute("""
+                    INSERT INTO profiles
+                    (user_id, role, grade, class, time, strong_subjects, weak_subjects, teaches)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    st.session_state.user_id,
+                    profile["role"],
+                    profile["grade"],
+                    profile["class"],
+                    profile["time"],
+                    ",".join(strong),
+                    ",".join(weak),
+                    ",".join(teaches)
+                ))
+                sync_profile_subjects(conn, st.session_state.user_id, strong, weak, teaches)
+            discovery_index.sync_user(st.session_state.user_id)
 
             st.session_state.profile = profile
+            st.session_state.pop("candidates", None)
             st.session_state.stage = 2
             st.rerun()
 
@@ -234,22 +237,37 @@ elif page == "Matchmaking":
             **st.session_state.profile
         }
 
-        mentor, score, reasons = find_best_mentor(mentee, mentors)
+        # Ranked once per profile; "Next Mentor" walks down the list without re-scoring.
+        if "candidates" not in st.session_state:
+            st.session_state.candidates = top_k_mentors(mentee, mentors)
+            st.session_state.candidate_pos = 0
+        candidates = st.session_state.candidates
+        pos = st.session_state.candidate_pos
 
-        if mentor:
+        if pos < len(candidates):
+            mentor, score, reasons = candidates[pos]
             st.success(f"Matched with {mentor['name']} (Score {score})")
             st.info(", ".join(reasons))
+            if pos + 1 < len(candidates):
+                st.caption(f"{len(candidates) - pos - 1} more candidate(s) ready if this mentor is unavailable.")
 
             st.session_state.current_match = {
                 "mentor": mentor["name"],
                 "mentee": mentee["name"]
             }
 
-            if st.button("Start Session"):
+            c1, c2 = st.columns(2)
+            if c1.button("Start Session"):
                 st.session_state.stage = 3
                 st.rerun()
+            if c2.button("Next Mentor", disabled=pos + 1 >= len(candidates)):
+                st.session_state.candidate_pos += 1
+                st.rerun()
         else:
             st.warning("No suitable mentor found")
+            if st.button("Search Again"):
+                del st.session_state["candidates"]
+                st.rerun()
 
     # -------------------------
     # SESSION
@@ -269,16 +287,16 @@ elif page == "Matchmaking":
         rating = st.slider("Rating", 1, 5)
 
         if st.button("Submit Rating"):
-            cursor.execute("""
-                INSERT INTO ratings (mentor, mentee, rating, session_date)
-                VALUES (?, ?, ?, ?)
-            """, (
-                st.session_state.current_match["mentor"],
-                st.session_state.current_match["mentee"],
-                rating,
-                date.today()
-            ))
-            conn.commit()
+            with transaction() as conn:
+                conn.execute("""
+                    INSERT INTO ratings (mentor, mentee, rating, session_date)
+                    VALUES (?, ?, ?, ?)
+                """, (
+                    st.session_state.current_match["mentor"],
+                    st.session_state.current_match["mentee"],
+                    rating,
+                    date.today()
+                ))
 
             st.success("Rating saved")
             st.session_state.stage = 1
@@ -33,6 +33,18 @@ from admin import admin_page
 from auth import auth_page
 from dashboard import dashboard_page
 from matching import matchmaking_page
+from attachments import start_collector
+from chat_archive import start_archiver
+from batch_matching import start_batch_matcher
+from matchmaker import start_matchmaker
+from presence import heartbeat, start_reaper
+
+# Background maintenance (no-op if already running in this process)
+start_archiver()
+start_collector()
+start_batch_matcher()
+start_matchmaker()
+start_reaper()
 
 # Global UI Styles
 st.markdown("""
@@ -57,6 +69,9 @@ if not st.session_state.logged_in:
     auth_page()
     st.stop()
 
+# Presence: throttled inside, so calling on every run is cheap
+heartbeat(st.session_state.user_id)
+
 # Sidebar Navigation
 with st.sidebar:
     st.markdown(f'<div class="sidebar-header"><div class="app-name">Sahay</div><div class="username">{st.session_state.user_name}</div></div>', unsafe_allow_html=True)
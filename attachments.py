@@ -0,0 +1,282 @@
+"""Content-addressed attachment store.
+
+Uploads are copied to disk CHUNK_SIZE bytes at a time and hashed on the
+way, so a file is never held in memory a second time and an oversized
+upload is cut off at MAX_FILE_SIZE. A blob is stored once under its
+SHA-256 digest, sharded by the first two byte pairs of the digest
+(``uploads/ab/cd/abcd...``) so no directory grows without bound; sending
+the same file again only adds a reference to it. Messages point at a blob
+by digest in ``messages.file_path``.
+
+``attachments`` has one row per blob and ``attachment_owners`` one per
+user who uploaded it. A user's quota (USER_QUOTA) counts each distinct
+blob they own once.
+
+Images get a downscaled JPEG preview (PREVIEW_SIZE) for viewers on slow
+connections, made on a small thread pool after the upload has returned.
+Previews need Pillow; without it they are skipped.
+
+A background collector deletes blobs that no message, live or archived,
+refers to any more, once they are GC_GRACE seconds old, along with files
+left behind by interrupted uploads.
+"""
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from background import start_loop
+from database import get_connection, transaction
+from db_writer import submit_write
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ATTACH_DIR = os.environ.get("SAHAY_ATTACH_DIR", "uploads")
+CHUNK_SIZE = 1 << 20                                                        # bytes per read/write
+MAX_FILE_SIZE = int(os.environ.get("SAHAY_ATTACH_MAX", 10 << 20))           # bytes per file
+USER_QUOTA = int(os.environ.get("SAHAY_ATTACH_QUOTA", 100 << 20))           # bytes per user
+PREVIEW_SIZE = (320, 320)
+PREVIEW_QUALITY = 70
+PREVIEW_WORKERS = 2
+GC_GRACE = 3600             # seconds an unreferenced blob or stray file is kept
+GC_INTERVAL = 3600          # seconds between collector passes
+GC_BATCH = 200              # blobs deleted per transaction
+
+_previews = None
+_previews_lock = threading.Lock()
+
+# =========================================================
+# LAYOUT
+# =========================================================
+def blob_path(digest):
+    return os.path.join(ATTACH_DIR, digest[:2], digest[2:4], digest)
+
+def preview_path(digest):
+    return blob_path(digest) + ".preview.jpg"
+
+def _temp_path():
+    return os.path.join(ATTACH_DIR, "tmp", f"{uuid.uuid4().hex}.part")
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# =========================================================
+# UPLOADS
+# =========================================================
+def quota_used(conn, user_id):
+    return conn.execute("""
+        SELECT COALESCE(SUM(a.size), 0)
+        FROM attachment_owners o JOIN attachments a ON a.sha256 = o.sha256
+        WHERE o.user_id = ?
+    """, (user_id,)).fetchone()[0]
+
+def _spool(stream, limit):
+    """Copy `stream` to a temp file while hashing it; returns (temp path, digest, size)."""
+    tmp = _temp_path()
+    os.makedirs(os.path.dirname(tmp), exist_ok=True)
+    digest, size = hashlib.sha256(), 0
+    try:
+        with open(tmp, "wb") as out:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > limit:
+                    raise ValueError(f"File is larger than {limit // (1 << 20)} MB.")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        _remove(tmp)
+        raise
+    return tmp, digest.hexdigest(), size
+
+def store(stream, user_id, name=None, content_type=None, now=None):
+    """Save an uploaded file for `user_id`; returns its digest.
+
+    Raises ValueError if the file is too large or the user's quota would
+    be exceeded.
+    """
+    now = int(now or time.time())
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    tmp, digest, size = _spool(stream, MAX_FILE_SIZE)
+    try:
+        with transaction() as conn:
+            owned = conn.execute(
+                "SELECT 1 FROM attachment_owners WHERE user_id = ? AND sha256 = ?", (user_id, digest)
+            ).fetchone()
+            if not owned and quota_used(conn, user_id) + size > USER_QUOTA:
+                raise ValueError(f"Upload quota of {USER_QUOTA // (1 << 20)} MB reached.")
+            # Touching created_ts keeps a re-sent blob out of the collector's reach.
+            conn.execute("""
+                INSERT INTO attachments (sha256, size, name, content_type, created_ts) VALUES (?,?,?,?,?)
+                ON CONFLICT(sha256) DO UPDATE SET created_ts = excluded.created_ts
+            """, (digest, size, name, content_type, now))
+            conn.execute(
+                "INSERT OR IGNORE INTO attachment_owners (user_id, sha256, created_ts) VALUES (?,?,?)",
+                (user_id, digest, now)
+            )
+            path = blob_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp, path)
+    finally:
+        _remove(tmp)
+    if Image is not None and (content_type or "").startswith("image/") and not os.path.exists(preview_path(digest)):
+        _preview_pool().submit(make_preview, digest)
+    return digest
+
+def attachment(digest):
+    """The attachments row of a blob as a dict, or None."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT sha256, size, name, content_type, preview FROM attachments WHERE sha256 = ?", (digest,)
+        ).fetchone()
+    return dict(row) if row else None
+
+def read_blob(digest):
+    """The contents of a stored blob; raises FileNotFoundError once it is collected."""
+    with open(blob_path(digest), "rb") as f:
+        return f.read()
+
+def session_attachments(match_id):
+    """Attachments sent in a live session, oldest first."""
+    with get_connection() as conn:
+        return [dict(r) for r in conn.execute("""
+            SELECT a.sha256, a.size, a.name, a.content_type, a.preview
+            FROM messages m JOIN attachments a ON a.sha256 = m.file_path
+            WHERE m.match_id = ? AND m.file_path IS NOT NULL
+            ORDER BY m.id
+        """, (match_id,))]
+
+# =========================================================
+# PREVIEWS
+# =========================================================
+def _preview_pool():
+    global _previews
+    with _previews_lock:
+        if _previews is None:
+            _previews = ThreadPoolExecutor(max_workers=PREVIEW_WORKERS, thread_name_prefix="sahay-preview")
+        return _previews
+
+def make_preview(digest):
+    """Write a downscaled JPEG of an image blob; returns True on success."""
+    target = preview_path(digest)
+    tmp = _temp_path()
+    try:
+        with Image.open(blob_path(digest)) as im:
+            im.draft("RGB", PREVIEW_SIZE)       # JPEG: decode at reduced scale
+            im.thumbnail(PREVIEW_SIZE)
+            im.convert("RGB").save(tmp, "JPEG", quality=PREVIEW_QUALITY, optimize=True)
+        os.replace(tmp, target)
+    except Exception:
+        # Not an image Pillow can read, or the blob was collected meanwhile.
+        _remove(tmp)
+        return False
+    submit_write("UPDATE attachments SET preview = 1 WHERE sha256 = ?", (digest,))
+    return True
+
+# =========================================================
+# GARBAGE COLLECTION
+# =========================================================
+def collect_orphans(grace=GC_GRACE, batch=GC_BATCH, now=None):
+    """Delete unreferenced blobs older than `grace`; returns bytes freed."""
+    cutoff = int(now or time.time()) - grace
+    freed = 0
+    while True:
+        with transaction() as conn:
+            orphans = conn.execute("""
+                SELECT sha256, size FROM attachments a
+                WHERE created_ts < ?
+                  AND NOT EXISTS (SELECT 1 FROM messages WHERE file_path = a.sha256)
+                  AND NOT EXISTS (SELECT 1 FROM messages_archive WHERE file_path = a.sha256)
+                LIMIT ?
+            """, (cutoff, batch)).fetchall()
+            digests = [(row[0],) for row in orphans]
+            conn.executemany("DELETE FROM attachment_owners WHERE sha256 = ?", digests)
+            conn.executemany("DELETE FROM attachments WHERE sha256 = ?", digests)
+            # Unlink before committing: an upload of the same content waits
+            # on this transaction and then finds the blob missing.
+            for digest, size in orphans:
+                _remove(blob_path(digest))
+                _remove(preview_path(digest))
+                freed += size
+        if len(orphans) < batch:
+            return freed
+
+def _listdir(path):
+    try:
+        return os.listdir(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+def _is_hex(name, length):
+    return len(name) == length and all(c in "0123456789abcdef" for c in name)
+
+def _store_files():
+    """(path, digest) of every file the store wrote; digest is None for temp files.
+
+    Only the shard directories and tmp/ are looked at, and only names the
+    store itself gives files, so anything else under ATTACH_DIR is left alone.
+    """
+    tmp_dir = os.path.join(ATTACH_DIR, "tmp")
+    for name in _listdir(tmp_dir):
+        if name.endswith(".part"):
+            yield os.path.join(tmp_dir, name), None
+    for top in _listdir(ATTACH_DIR):
+        if not _is_hex(top, 2):
+            continue
+        for sub in _listdir(os.path.join(ATTACH_DIR, top)):
+            if not _is_hex(sub, 2):
+                continue
+            shard = os.path.join(ATTACH_DIR, top, sub)
+            for name in _listdir(shard):
+                digest = name.split(".")[0]
+                if (_is_hex(digest, 64) and digest.startswith(top + sub)
+                        and name in (digest, digest + ".preview.jpg")):
+                    yield os.path.join(shard, name), digest
+
+def sweep_stray_files(grace=GC_GRACE, now=None):
+    """Remove store files with no attachments row and stale temp files; returns how many."""
+    cutoff = (now or time.time()) - grace
+    with get_connection() as conn:
+        known = {row[0] for row in conn.execute("SELECT sha256 FROM attachments")}
+    # Files stored after `known` was read are younger than the grace period.
+    removed = 0
+    for path, digest in _store_files():
+        if digest in known:
+            continue
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        _remove(path)
+        removed += 1
+    return removed
+
+def collect():
+    """One collector pass: orphaned blobs, then stray files."""
+    collect_orphans()
+    sweep_stray_files()
+
+def start_collector(interval=GC_INTERVAL):
+    """Start the background attachment collector once per process."""
+    return start_loop("sahay-attachment-gc", collect, interval)
+
+def storage_stats(conn=None):
+    """Blob count, stored bytes, previews made, and uploads (one per owner and blob)."""
+    if conn is None:
+        with get_connection() as conn:
+            return storage_stats(conn)
+    blobs, size, previews = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(preview), 0) FROM attachments"
+    ).fetchone()
+    uploads = conn.execute("SELECT COUNT(*) FROM attachment_owners").fetchone()[0]
+    return {"blobs": blobs, "bytes": size, "previews": previews, "uploads": uploads}
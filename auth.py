@@ -1,5 +1,5 @@
 import streamlit as st
-from database import cursor, conn
+from database import get_connection, transaction
 
 # =========================
 # SIGN UP
@@ -17,11 +17,11 @@ def signup():
             return
 
         try:
-            cursor.execute(
-                "INSERT INTO auth_users (name, email, password) VALUES (?, ?, ?)",
-                (name.strip(), email.strip(), password)
-            )
-            conn.commit()
+            with transaction() as conn:
+                conn.execute(
+                    "INSERT INTO auth_users (name, email, password) VALUES (?, ?, ?)",
+                    (name.strip(), email.strip(), password)
+                )
             st.success("Account created successfully. Please login.")
         except Exception:
             st.error("Email already exists")
@@ -37,11 +37,11 @@ def login():
     password = st.text_input("Password", type="password", key="login_password")
 
     if st.button("Login", key="login_btn"):
-        cursor.execute(
-            "SELECT id, name FROM auth_users WHERE email=? AND password=?",
-            (email.strip(), password)
-        )
-        user = cursor.fetchone()
+        with get_connection() as conn:
+            user = conn.execute(
+                "SELECT id, name FROM auth_users WHERE email=? AND password=?",
+                (email.strip(), password)
+            ).fetchone()
 
         if user:
             st.session_state.logged_in = True
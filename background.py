@@ -0,0 +1,81 @@
+"""Periodic background jobs.
+
+Maintenance that runs off the request path (archiving, presence reaping,
+matchmaking, batch rounds, attachment collection) is a function called
+every few seconds or minutes from a daemon thread. ``start_loop`` starts
+that thread once per process. A pass that raises is logged with its
+traceback and counted, and the loop goes on with the next pass, so a
+locked database doesn't stop the job but a programming error still shows
+up in the log and on the admin page (``loop_stats``).
+"""
+import logging
+import threading
+import time
+
+log = logging.getLogger("sahay.background")
+
+_loops = {}
+_loops_lock = threading.Lock()
+
+
+class Loop:
+    def __init__(self, name, target, interval):
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self.thread = None
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "failures": 0, "last_error": None, "last_error_at": None}
+
+    def run_once(self):
+        """One pass of the job; returns False if it raised."""
+        try:
+            self.target()
+        except Exception as exc:
+            log.exception("background job %s failed", self.name)
+            with self._lock:
+                self._stats["runs"] += 1
+                self._stats["failures"] += 1
+                self._stats["last_error"] = f"{type(exc).__name__}: {exc}"
+                self._stats["last_error_at"] = time.time()
+            return False
+        with self._lock:
+            self._stats["runs"] += 1
+        return True
+
+    def _run(self):
+        while True:
+            self.run_once()
+            time.sleep(self.interval)
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["running"] = self.running()
+        s["interval"] = self.interval
+        return s
+
+
+def start_loop(name, target, interval):
+    """Call `target()` every `interval` seconds in a daemon thread, once per process.
+
+    `name` is both the thread name and the key in ``loop_stats``. Returns
+    the Loop.
+    """
+    with _loops_lock:
+        loop = _loops.get(name)
+        if loop is None:
+            loop = _loops[name] = Loop(name, target, interval)
+        if not loop.running():
+            loop.thread = threading.Thread(target=loop._run, name=name, daemon=True)
+            loop.thread.start()
+        return loop
+
+def loop_stats():
+    """{name: stats} for every loop started in this process."""
+    with _loops_lock:
+        loops = list(_loops.values())
+    return {loop.name: loop.stats() for loop in loops}
@@ -0,0 +1,270 @@
+"""Global batch matching.
+
+Instead of letting whoever clicks first take the best mentor, a round
+collects everyone who is 'waiting' and online, splits them by time slot
+and solves a maximum-weight assignment between mentees and mentors over
+the app6 score (``batch_scoring.MentorMatrix``). Slots up to HUNGARIAN_MAX on the smaller
+side are solved exactly with the Hungarian algorithm; larger slots keep
+each mentee's SPARSE_K best mentors and assign greedily by score.
+
+Mentors without capacity left are kept out of the round, and each pair's
+weight carries the scheduler's wait bonus, so long-waiting users are
+preferred over marginally better scores (see scheduler.py). Reported
+scores are the plain match scores.
+
+Pairs are published exactly like a discovery match: both profiles move to
+'confirming' with a shared match id, which the matchmaking page picks up.
+"""
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from background import start_loop
+from batch_scoring import MAX_LIST, WEAK_SHIFT, MentorMatrix
+from database import get_connection, transaction
+from discovery import PRESENCE_TTL, index as discovery_index
+from match_claims import claim_pair, new_match_id
+from scheduler import MIN_SCORE, offered_subjects, scheduler
+
+BATCH_MATCH_INTERVAL = float(os.environ.get("SAHAY_BATCH_MATCH_INTERVAL", 0))  # 0 disables the thread
+HUNGARIAN_MAX = 400     # largest side solved exactly
+SPARSE_K = 8            # candidate mentors kept per mentee in the fallback
+HISTORY = 50            # round reports kept in memory
+
+_reports = deque(maxlen=HISTORY)
+
+# =========================================================
+# POOL
+# =========================================================
+def load_waiting_pool(conn, now=None):
+    """Online waiting users as scorer dicts, grouped by time slot.
+
+    Anyone with weak subjects is a mentee; teachers and students with
+    strong subjects but nothing to learn are mentors. Nobody is on both
+    sides, so an assignment never uses a person twice. A mentor's
+    "teaches" list holds every subject they can help with (teaches and
+    strong, as in scheduler.pair_score), which is the list the app6
+    scorer reads. Users without a heartbeat in the last PRESENCE_TTL
+    seconds are left out, as in discovery.
+    """
+    fresh_since = int(now or time.time()) - PRESENCE_TTL
+    people = {}
+    for user_id, name, role, grade, time_slot in conn.execute("""
+        SELECT p.user_id, a.name, p.role, p.grade, p.time
+        FROM profiles p
+        JOIN auth_users a ON a.id = p.user_id
+        WHERE p.status = 'waiting' AND p.last_seen >= ?
+    """, (fresh_since,)):
+        people[user_id] = {
+            "user_id": user_id, "name": name, "role": role, "grade": grade, "time": time_slot,
+            "strong_subjects": [], "weak_subjects": [], "teaches": [],
+        }
+    for user_id, subject, kind in conn.execute("""
+        SELECT ps.user_id, ps.subject, ps.kind
+        FROM profile_subjects ps
+        JOIN profiles p ON p.user_id = ps.user_id
+        WHERE p.status = 'waiting' AND p.last_seen >= ?
+    """, (fresh_since,)):
+        if user_id in people:
+            column = {"strong": "strong_subjects", "weak": "weak_subjects"}.get(kind, kind)
+            people[user_id][column].append(subject)
+
+    slots = {}
+    for person in people.values():
+        person["teaches"] = offered_subjects(
+            {"teaches": person["teaches"], "strong": person["strong_subjects"]}
+        )
+        mentees, mentors = slots.setdefault(person["time"], ([], []))
+        if person["weak_subjects"]:
+            mentees.append(person)
+        elif person["role"] == "Teacher" or person["strong_subjects"] or person["teaches"]:
+            mentors.append(person)
+    return slots
+
+def score_matrix(mentees, mentors):
+    """Weights[i, j] = score of mentee i with mentor j; 0 where not allowed.
+
+    A pair is allowed only if the mentor covers one of the mentee's weak
+    subjects; a shared slot and grade alone don't make a match.
+    """
+    matrix = MentorMatrix(mentors, "app6")
+    weights = np.zeros((len(mentees), len(mentors)), dtype=np.int64)
+    weak_bits = ((1 << MAX_LIST) - 1) << WEAK_SHIFT
+    for i, mentee in enumerate(mentees):
+        scores, reasons = matrix.score(mentee)
+        covered = (reasons & weak_bits) != 0
+        weights[i] = np.where(matrix.eligible(mentee) & covered & (scores >= MIN_SCORE), scores, 0)
+    return weights
+
+# =========================================================
+# SOLVERS
+# =========================================================
+def hungarian(cost):
+    """Minimum-cost assignment of every row of an n x m cost matrix (n <= m).
+
+    Shortest augmenting path form of the Hungarian algorithm, O(n^2 m),
+    with the inner column scan vectorized. Returns the column of each row.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)     # row (1-based) assigned to each column
+    way = np.zeros(m + 1, dtype=np.int64)
+
+    for i in range(1, n + 1):
+        owner[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = owner[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+
+    assignment = np.full(n, -1, dtype=np.int64)
+    for j in range(1, m + 1):
+        if owner[j]:
+            assignment[owner[j] - 1] = j - 1
+    return assignment
+
+def solve_exact(weights):
+    """Maximum-weight pairs (row, col) via the Hungarian algorithm."""
+    transpose = weights.shape[0] > weights.shape[1]
+    w = weights.T if transpose else weights
+    cols = hungarian((w.max(initial=0) - w).astype(float))
+    pairs = [(r, int(c)) for r, c in enumerate(cols) if c >= 0 and w[r, c] > 0]
+    return [(c, r) for r, c in pairs] if transpose else pairs
+
+def solve_sparse(weights, k=SPARSE_K):
+    """Greedy assignment over each mentee's k best mentors.
+
+    Greedy is at least half of the best matching over the kept edges only.
+    Against the true optimum there is no such bound: a mentee whose best
+    mentors are all taken stays unmatched even if another mentor was free.
+    """
+    n, m = weights.shape
+    k = min(k, m)
+    top = np.argpartition(-weights, k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(n), k)
+    cols = top.ravel()
+    w = weights[rows, cols]
+    order = np.lexsort((rows, -w))      # highest weight first, then mentee order
+
+    taken_rows, taken_cols, pairs = set(), set(), []
+    for e in order:
+        if w[e] <= 0:
+            break
+        r, c = int(rows[e]), int(cols[e])
+        if r not in taken_rows and c not in taken_cols:
+            taken_rows.add(r)
+            taken_cols.add(c)
+            pairs.append((r, c))
+    return pairs
+
+def wait_bonus(mentees, mentors):
+    """Scheduler wait bonus for every pair: the longer wait of the two counts."""
+    def waits(people):
+        return np.array([scheduler.waited(p["user_id"]) or 0.0 for p in people])
+    waited = np.maximum.outer(waits(mentees), waits(mentors))
+    return np.rint(scheduler.wait_weight * np.minimum(waited, scheduler.wait_cap)).astype(np.int64)
+
+def solve_slot(mentees, mentors):
+    """Returns (pairs as (mentee, mentor, score), method)."""
+    mentors = [m for m in mentors if scheduler.has_capacity(m["user_id"])]
+    if not mentees or not mentors:
+        return [], "empty"
+    weights = score_matrix(mentees, mentors)
+    blended = np.where(weights > 0, weights + wait_bonus(mentees, mentors), 0)
+    if min(blended.shape) <= HUNGARIAN_MAX:
+        pairs, method = solve_exact(blended), "hungarian"
+    else:
+        pairs, method = solve_sparse(blended), "sparse-greedy"
+    return [(mentees[r], mentors[c], int(weights[r, c])) for r, c in pairs], method
+
+# =========================================================
+# PUBLISH
+# =========================================================
+def publish_pairs(pairs):
+    """Move each pair to 'confirming'; pairs where either user has left 'waiting' are skipped."""
+    published, lost = [], []
+    with transaction() as conn:
+        for mentee, mentor, score in pairs:
+            match_id = new_match_id("batch")
+            if claim_pair(conn, mentee["user_id"], mentor["user_id"], match_id, ("waiting",)):
+                published.append((mentee, mentor, score))
+            else:
+                lost.extend((mentee["user_id"], mentor["user_id"]))
+    for mentee, mentor, _ in published:
+        discovery_index.remove(mentee["user_id"])
+        discovery_index.remove(mentor["user_id"])
+        scheduler.record_session(mentor["user_id"])
+        scheduler.dequeue(mentee["user_id"])
+        scheduler.dequeue(mentor["user_id"])
+    for user_id in lost:
+        discovery_index.sync_user(user_id)
+        if discovery_index.profile(user_id) is None:
+            scheduler.dequeue(user_id)
+    return published
+
+# =========================================================
+# ROUNDS
+# =========================================================
+def run_round(publish=True):
+    """One batch round over every time slot; returns the round report."""
+    started = time.time()
+    with get_connection() as conn:
+        slots = load_waiting_pool(conn)
+    scheduler.observe(
+        p["user_id"] for mentees, mentors in slots.values() for p in mentees + mentors
+    )
+
+    report = {"started_at": started, "slots": {}, "mentees": 0, "pairs": 0, "total_score": 0, "solve_s": 0.0}
+    all_pairs = []
+    for time_slot, (mentees, mentors) in slots.items():
+        t0 = time.perf_counter()
+        pairs, method = solve_slot(mentees, mentors)
+        solve_s = time.perf_counter() - t0
+        all_pairs.extend(pairs)
+        report["slots"][time_slot] = {
+            "mentees": len(mentees), "mentors": len(mentors), "pairs": len(pairs),
+            "total_score": sum(s for _, _, s in pairs), "method": method, "solve_s": solve_s,
+        }
+        report["mentees"] += len(mentees)
+        report["solve_s"] += solve_s
+
+    if publish:
+        all_pairs = publish_pairs(all_pairs)
+    report["pairs"] = len(all_pairs)
+    report["total_score"] = sum(s for _, _, s in all_pairs)
+    report["matched_fraction"] = len(all_pairs) / report["mentees"] if report["mentees"] else 0.0
+    report["duration_s"] = time.time() - started
+    _reports.append(report)
+    return report
+
+def recent_reports():
+    return list(_reports)
+
+def start_batch_matcher(interval=BATCH_MATCH_INTERVAL):
+    """Start periodic batch rounds once per process; disabled when interval is 0."""
+    if interval <= 0:
+        return None
+    return start_loop("sahay-batch-matcher", run_round, interval)
@@ -0,0 +1,153 @@
+"""Vectorized mentor scoring.
+
+``calculate_match_score`` scores one mentee/mentor pair at a time with list
+membership tests and string compares. ``MentorMatrix`` encodes a mentor
+pool once (subject bitmasks, slot ids, grade ids) and then scores a mentee
+against every mentor in a single NumPy pass, returning the same scores as
+the per-pair functions plus a per-rule reason bitmask.
+
+Reason mask layout (per mentor):
+    bit 0            time slot matched
+    bit 1            grade matched
+    bit 2 + i        mentee's i-th weak subject is covered by the mentor
+    bit 32 + i       mentee's i-th strong subject is shared (strong-bonus variants)
+"""
+from collections import namedtuple
+
+import numpy as np
+
+Variant = namedtuple("Variant", "mentor_keys strong_bonus weak_fmt time_reason grade_reason strong_fmt")
+
+# Rule sets of the existing scorers. `mentor_keys` is the order in which the
+# mentor's subject list is looked up, mirroring the nested dict.get() calls.
+VARIANTS = {
+    # app6.py
+    "app6": Variant(("teaches", "strong_subjects"), 0,
+                    "+50 {}", "+20 time match", "+10 same grade", None),
+    # app2.py / app4.py
+    "app2": Variant(("strong_subjects", "teaches"), 5,
+                    "+50: {} help", "+20: same time", "+10: same grade", "+5: {} practice"),
+    # app5.py
+    "app5": Variant(("strong_subjects", "teaches"), 5,
+                    "+50 {} help", "+20 same time", "+10 same grade", "+5 {} practice"),
+}
+VARIANTS["app4"] = VARIANTS["app2"]
+
+TIME_BIT = 1
+GRADE_BIT = 2
+WEAK_SHIFT = 2
+STRONG_SHIFT = 32
+MAX_LIST = 30
+MAX_SUBJECTS = 63
+
+
+def mentor_subjects(mentor, keys):
+    first, second = keys
+    return mentor.get(first, mentor.get(second, []))
+
+
+class MentorMatrix:
+    def __init__(self, mentors, variant="app6"):
+        self.mentors = list(mentors)
+        self.variant = VARIANTS[variant]
+        self.subject_bits = {}
+        self.slot_ids = {}
+        self.grade_ids = {}
+        self.name_rows = {}
+
+        n = len(self.mentors)
+        self.subject_masks = np.zeros(n, dtype=np.int64)
+        self.slots = np.empty(n, dtype=np.int32)
+        self.grades = np.empty(n, dtype=np.int32)
+
+        for row, mentor in enumerate(self.mentors):
+            mask = 0
+            for subject in mentor_subjects(mentor, self.variant.mentor_keys):
+                mask |= 1 << self._bit(subject)
+            self.subject_masks[row] = mask
+            self.slots[row] = self.slot_ids.setdefault(mentor["time"], len(self.slot_ids))
+            self.grades[row] = self.grade_ids.setdefault(mentor["grade"], len(self.grade_ids))
+            self.name_rows.setdefault(mentor["name"], []).append(row)
+
+    def _bit(self, subject):
+        bit = self.subject_bits.get(subject)
+        if bit is None:
+            bit = len(self.subject_bits)
+            if bit >= MAX_SUBJECTS:
+                raise ValueError(f"more than {MAX_SUBJECTS} distinct subjects")
+            self.subject_bits[subject] = bit
+        return bit
+
+    def _hits(self, subject):
+        bit = self.subject_bits.get(subject)
+        if bit is None:
+            return None
+        return (self.subject_masks >> bit) & 1
+
+    def score(self, mentee):
+        """Return (scores, reason_masks) for this mentee against every mentor."""
+        weak = mentee.get("weak_subjects", [])
+        strong = mentee.get("strong_subjects", []) if self.variant.strong_bonus else []
+        if len(weak) > MAX_LIST or len(strong) > MAX_LIST:
+            raise ValueError(f"more than {MAX_LIST} subjects in one list")
+
+        scores = np.zeros(len(self.mentors), dtype=np.int64)
+        reasons = np.zeros(len(self.mentors), dtype=np.int64)
+
+        for i, subject in enumerate(weak):
+            hits = self._hits(subject)
+            if hits is not None:
+                scores += 50 * hits
+                reasons |= hits << (WEAK_SHIFT + i)
+
+        slot = self.slot_ids.get(mentee["time"], -1)
+        same_slot = (self.slots == slot).astype(np.int64)
+        scores += 20 * same_slot
+        reasons |= same_slot * TIME_BIT
+
+        grade = self.grade_ids.get(mentee["grade"], -1)
+        same_grade = (self.grades == grade).astype(np.int64)
+        scores += 10 * same_grade
+        reasons |= same_grade * GRADE_BIT
+
+        for i, subject in enumerate(strong):
+            hits = self._hits(subject)
+            if hits is not None:
+                scores += self.variant.strong_bonus * hits
+                reasons |= hits << (STRONG_SHIFT + i)
+
+        return scores, reasons
+
+    def reasons(self, mentee, mask):
+        """Render one reason mask as the variant's reason strings, in rule order."""
+        v = self.variant
+        mask = int(mask)
+        out = [v.weak_fmt.format(s) for i, s in enumerate(mentee.get("weak_subjects", []))
+               if mask >> (WEAK_SHIFT + i) & 1]
+        if mask & TIME_BIT:
+            out.append(v.time_reason)
+        if mask & GRADE_BIT:
+            out.append(v.grade_reason)
+        if v.strong_bonus:
+            out += [v.strong_fmt.format(s) for i, s in enumerate(mentee.get("strong_subjects", []))
+                    if mask >> (STRONG_SHIFT + i) & 1]
+        return out
+
+    def eligible(self, mentee):
+        """Boolean mask of mentors other than the mentee themself."""
+        mask = np.ones(len(self.mentors), dtype=bool)
+        mask[self.name_rows.get(mentee["name"], [])] = False
+        return mask
+
+    def best(self, mentee, threshold=15):
+        """Same result as find_best_mentor: first highest-scoring eligible mentor."""
+        scores, reasons = self.score(mentee)
+        eligible = self.eligible(mentee)
+        if not eligible.any():
+            return None, 0, []
+        masked = np.where(eligible, scores, -1)
+        row = int(np.argmax(masked))
+        score = int(masked[row])
+        if score < threshold:
+            return None, 0, []
+        return self.mentors[row], score, self.reasons(mentee, reasons[row])
@@ -0,0 +1,173 @@
+"""Compare the per-pair mentor scorers with the vectorized MentorMatrix.
+
+The reference scorers are the ``calculate_match_score`` / ``find_best_mentor``
+functions of the app scripts themselves, pulled out of the source with
+``ast`` (the scripts can't be imported: they render Streamlit pages at
+module level). Every mentee's scores and reasons are checked against the
+reference before anything is timed.
+
+    python bench_batch_scoring.py --mentors 10000 100000
+"""
+import argparse
+import ast
+import os
+import random
+import sys
+import time
+
+from batch_scoring import VARIANTS, MentorMatrix
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Repo modules without import-time side effects, which the scripts' helpers may use.
+PURE_MODULES = {"ranking"}
+SUBJECTS = ["Mathematics", "English", "Science", "Hindi", "Social Studies", "Computer"]
+TIME_SLOTS = ["4-5 PM", "5-6 PM", "6-7 PM", "7-8 PM"]
+GRADES = [f"Grade {g}" for g in range(1, 11)]
+
+
+def _is_pure_import(node):
+    loadable = sys.stdlib_module_names | PURE_MODULES
+    if isinstance(node, ast.Import):
+        return all(a.name.split(".")[0] in loadable for a in node.names)
+    if isinstance(node, ast.ImportFrom):
+        return node.level == 0 and node.module.split(".")[0] in loadable
+    return False
+
+
+def _is_constant(node):
+    return (
+        isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant)
+        and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets)
+    )
+
+
+def load_reference(variant, names=("calculate_match_score", "find_best_mentor", "top_k_mentors")):
+    """Execute just the named top-level functions of `<variant>.py`, together
+    with the standard-library (and PURE_MODULES) imports and UPPER_CASE
+    constants they may use."""
+    path = os.path.join(ROOT, f"{variant}.py")
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    body = [
+        n for n in tree.body
+        if (isinstance(n, ast.FunctionDef) and n.name in names) or _is_pure_import(n) or _is_constant(n)
+    ]
+    namespace = {}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, "exec"), namespace)
+    return namespace
+
+
+def make_people(n, rng, prefix):
+    people = []
+    for i in range(n):
+        is_teacher = prefix == "mentor" and rng.random() < 0.3
+        person = {
+            "name": f"{prefix} {i}",
+            "role": "Teacher" if is_teacher else "Student",
+            "grade": rng.choice(GRADES),
+            "time": rng.choice(TIME_SLOTS),
+            "strong_subjects": [] if is_teacher else rng.sample(SUBJECTS, rng.randint(0, 3)),
+            "weak_subjects": rng.sample(SUBJECTS, rng.randint(0, 3)),
+            "teaches": rng.sample(SUBJECTS, rng.randint(1, 3)) if is_teacher else [],
+        }
+        # Some mentors come from sources that don't set every key.
+        if rng.random() < 0.1:
+            del person[rng.choice(["teaches", "strong_subjects"])]
+        people.append(person)
+    return people
+
+
+def check_equivalence(variant, mentors, mentees, reference):
+    matrix = MentorMatrix(mentors, variant)
+    score_pair = reference["calculate_match_score"]
+    for mentee in mentees:
+        scores, masks = matrix.score(mentee)
+        for row, mentor in enumerate(mentors):
+            expected = score_pair(mentee, mentor)
+            got = (int(scores[row]), matrix.reasons(mentee, masks[row]))
+            if got != expected:
+                raise AssertionError(f"{variant}: {mentee['name']} x {mentor['name']}: {got} != {expected}")
+        if variant in ("app5", "app6"):
+            # app2/app4 apply the threshold to the reasons only (operator precedence).
+            expected = reference["find_best_mentor"](mentee, mentors)
+            if matrix.best(mentee) != expected:
+                raise AssertionError(f"{variant}: best mentor for {mentee['name']} differs")
+        if "top_k_mentors" in reference:
+            check_top_k(variant, mentors, mentee, reference)
+
+
+def check_top_k(variant, mentors, mentee, reference):
+    """The heap-based ranking must equal a full sort (score desc, list order) cut at k."""
+    score_pair = reference["calculate_match_score"]
+    ranked = sorted(
+        ((i, *score_pair(mentee, m)) for i, m in enumerate(mentors) if m["name"] != mentee["name"]),
+        key=lambda r: (-r[1], r[0])
+    )
+    ranked = [(mentors[i], s, r) for i, s, r in ranked if s >= reference["MIN_MATCH_SCORE"]]
+    for k in (1, 2, 5, 50):
+        if reference["top_k_mentors"](mentee, mentors, k) != ranked[:k]:
+            raise AssertionError(f"{variant}: top {k} mentors for {mentee['name']} differ from a full sort")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def bench(variant, mentors, mentees, reference):
+    score_pair = reference["calculate_match_score"]
+
+    def loop():
+        for mentee in mentees:
+            for mentor in mentors:
+                score_pair(mentee, mentor)
+
+    _, loop_s = timed(loop)
+    matrix, encode_s = timed(MentorMatrix, mentors, variant)
+
+    def batch():
+        for mentee in mentees:
+            matrix.score(mentee)
+
+    _, batch_s = timed(batch)
+    pairs = len(mentors) * len(mentees)
+    return {
+        "loop_us_per_mentee": loop_s / len(mentees) * 1e6,
+        "batch_us_per_mentee": batch_s / len(mentees) * 1e6,
+        "encode_ms": encode_s * 1000,
+        "pairs_per_s": pairs / batch_s,
+        "speedup": loop_s / batch_s,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mentors", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--mentees", type=int, default=20)
+    parser.add_argument("--variants", nargs="+", choices=sorted(VARIANTS), default=sorted(VARIANTS))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    references = {v: load_reference(v) for v in args.variants}
+
+    # Exhaustive pairwise check on a small pool, including duplicate names.
+    mentors = make_people(400, rng, "mentor")
+    mentees = make_people(40, rng, "mentee") + mentors[:10]
+    for variant in args.variants:
+        check_equivalence(variant, mentors, mentees, references[variant])
+    print(f"equivalent: {', '.join(args.variants)} ({len(mentors) * len(mentees):,} pairs each)")
+
+    print(f"\n{'variant':<8}{'mentors':>10}{'loop us':>12}{'batch us':>12}{'encode ms':>12}{'speedup':>10}")
+    for n in args.mentors:
+        mentors = make_people(n, rng, "mentor")
+        mentees = make_people(args.mentees, rng, "mentee")
+        for variant in args.variants:
+            r = bench(variant, mentors, mentees, references[variant])
+            print(f"{variant:<8}{n:>10,}{r['loop_us_per_mentee']:>12,.0f}{r['batch_us_per_mentee']:>12,.0f}"
+                  f"{r['encode_ms']:>12,.1f}{r['speedup']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Check and time incremental chat sync.
+
+Every scenario drives a ``ChatCursor`` against a temporary database the
+way the live chat does (syncs as messages arrive, "load older" until
+nothing is left) and checks that the reader ends up with the complete
+transcript, in order, without duplicates. Then a cursor poll with
+nothing new is timed against re-reading the whole transcript.
+
+    python bench_chat.py --check
+    python bench_chat.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import database
+from chat_sync import CHAT_BUFFER, ChatCursor
+from database import ConnectionPool, init_db
+
+MATCH_ID = "bench_chat"
+
+# name -> steps; an int posts that many messages and syncs, "older:n" loads
+# n pages of history. Every scenario ends by loading all remaining history.
+SCENARIOS = {
+    "short": [30],
+    "long": [CHAT_BUFFER * 2 + 50],
+    "evicted after first sync": [10, CHAT_BUFFER + 50],
+    "evicted in bursts": [5, CHAT_BUFFER - 10, 20, CHAT_BUFFER],
+    "new while scrolled back": [CHAT_BUFFER + 100, "older:3", CHAT_BUFFER + 50, 7],
+}
+
+
+def post(db_pool, n):
+    now = int(time.time())
+    with db_pool.transaction() as conn:
+        start = conn.execute("SELECT COUNT(*) FROM messages WHERE match_id = ?", (MATCH_ID,)).fetchone()[0]
+        conn.executemany(
+            "INSERT INTO messages (match_id, sender, message, created_ts) VALUES (?, 'bench', ?, ?)",
+            [(MATCH_ID, f"m{start + i}", now) for i in range(n)]
+        )
+
+
+def all_ids(db_pool):
+    with db_pool.connection() as conn:
+        return [r[0] for r in conn.execute("SELECT id FROM messages WHERE match_id = ? ORDER BY id", (MATCH_ID,))]
+
+
+def run_scenario(db_pool, steps):
+    with db_pool.transaction() as conn:
+        conn.execute("DELETE FROM messages WHERE match_id = ?", (MATCH_ID,))
+    cursor = ChatCursor(MATCH_ID)
+    for step in steps:
+        if isinstance(step, int):
+            post(db_pool, step)
+            cursor.sync()
+        else:
+            for _ in range(int(step.split(":")[1])):
+                cursor.load_older()
+    while cursor.has_older():
+        cursor.load_older()
+    return [m["id"] for m in cursor.visible()]
+
+
+def check(db_pool):
+    for name, steps in SCENARIOS.items():
+        got = run_scenario(db_pool, steps)
+        expected = all_ids(db_pool)
+        if got != expected:
+            missing = len(set(expected) - set(got))
+            raise AssertionError(f"{name}: {len(got)} messages shown, {missing} unreachable, expected {len(expected)}")
+    print(f"cursor history complete: {len(SCENARIOS)} scenario(s)")
+
+
+def bench(db_pool, sizes, repeat):
+    print(f"\n{'messages':>10}{'poll us':>12}{'full read ms':>15}")
+    for n in sizes:
+        with db_pool.transaction() as conn:
+            conn.execute("DELETE FROM messages WHERE match_id = ?", (MATCH_ID,))
+        post(db_pool, n)
+        cursor = ChatCursor(MATCH_ID)
+        cursor.sync()
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            cursor.sync()
+        poll_s = (time.perf_counter() - started) / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            with db_pool.connection() as conn:
+                conn.execute(
+                    "SELECT id, sender, message, file_path, created_ts FROM messages WHERE match_id = ? ORDER BY created_ts",
+                    (MATCH_ID,)
+                ).fetchall()
+        full_s = (time.perf_counter() - started) / repeat
+        print(f"{n:>10,}{poll_s * 1e6:>12.1f}{full_s * 1000:>15.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--check", action="store_true", help="only run the history checks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool = ConnectionPool(os.path.join(tmp, "chat.db"))
+        init_db(db_pool)
+        # chat_sync reads through database.get_connection, which uses the module pool.
+        database.pool = db_pool
+        try:
+            check(db_pool)
+            if not args.check:
+                bench(db_pool, args.sizes, args.repeat)
+        finally:
+            db_pool.close()
+
+
+if __name__ == "__main__":
+    main()
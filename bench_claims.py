@@ -0,0 +1,137 @@
+"""Concurrency stress test for match claiming.
+
+Hundreds of scanner threads start at the same instant against a temporary
+database in which every user is 'waiting'. Each scanner picks random
+peers and tries to claim one until it succeeds or runs out of attempts.
+Afterwards every claim is checked: each match id must be held by exactly
+two profiles, both named in the claim, and no user may be in two claims.
+
+``--legacy`` runs the old read-then-two-UPDATEs flow for comparison.
+
+    python bench_claims.py --scanners 400 --users 400
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from database import ConnectionPool, init_db
+from match_claims import claim_match, new_match_id
+
+
+def seed(db_pool, users):
+    with db_pool.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO auth_users (id, name, email, password) VALUES (?, ?, ?, 'pw')",
+            [(uid, f"User {uid}", f"user{uid}@example.org") for uid in range(1, users + 1)]
+        )
+        conn.executemany(
+            "INSERT INTO profiles (user_id, role, grade, time, status) VALUES (?, 'Student', 'Grade 5', '5-6 PM', 'waiting')",
+            [(uid,) for uid in range(1, users + 1)]
+        )
+
+
+def legacy_claim(db_pool, user_id, peer_id):
+    """The pre-claim flow: check the peer, then two independent UPDATEs."""
+    with db_pool.connection() as conn:
+        row = conn.execute("SELECT status FROM profiles WHERE user_id=?", (peer_id,)).fetchone()
+        if not row or row["status"] != "waiting":
+            return None
+        match_id = new_match_id()
+        conn.execute("UPDATE profiles SET status='confirming', match_id=? WHERE user_id=?", (match_id, user_id))
+        conn.execute("UPDATE profiles SET status='confirming', match_id=? WHERE user_id=?", (match_id, peer_id))
+        return match_id
+
+
+def scanner(db_pool, user_id, users, attempts, barrier, claims, errors, legacy, seed_value):
+    rng = random.Random(seed_value)
+    barrier.wait()
+    try:
+        for _ in range(attempts):
+            peer_id = rng.randint(1, users)
+            if peer_id == user_id:
+                continue
+            if legacy:
+                match_id = legacy_claim(db_pool, user_id, peer_id)
+            else:
+                match_id = claim_match(user_id, peer_id, db_pool=db_pool)
+            if match_id:
+                claims.append((match_id, user_id, peer_id))
+                return
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def verify(db_pool, claims):
+    with db_pool.connection() as conn:
+        holders = {}
+        for user_id, match_id in conn.execute(
+            "SELECT user_id, match_id FROM profiles WHERE status='confirming'"
+        ):
+            holders.setdefault(match_id, set()).add(user_id)
+
+    per_user = Counter(u for _, a, b in claims for u in (a, b))
+    double_booked = sorted(u for u, n in per_user.items() if n > 1)
+    broken = [c for c in claims if holders.get(c[0]) != {c[1], c[2]}]
+    orphans = [m for m, users in holders.items() if len(users) != 2]
+    return double_booked, broken, orphans
+
+
+def run(scanners, users, attempts, pool_size, legacy, seed_value):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool = ConnectionPool(os.path.join(tmp, "claims.db"), max_size=pool_size)
+        init_db(db_pool)
+        seed(db_pool, users)
+
+        barrier = threading.Barrier(scanners)
+        claims, errors = [], []
+        threads = [
+            threading.Thread(
+                target=scanner,
+                args=(db_pool, (n % users) + 1, users, attempts, barrier, claims, errors, legacy, seed_value + n),
+            )
+            for n in range(scanners)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        double_booked, broken, orphans = verify(db_pool, claims)
+        db_pool.close()
+
+    print(f"{'legacy' if legacy else 'claim_match'}: {scanners} scanners, {users} users, "
+          f"{len(claims)} claims in {elapsed:.2f}s ({len(errors)} errors)")
+    print(f"  double-booked users: {len(double_booked)}")
+    print(f"  claims not held by both users: {len(broken)}")
+    print(f"  match ids held by != 2 profiles: {len(orphans)}")
+    for e in errors[:5]:
+        print(f"  error: {e}")
+    return not (double_booked or broken or orphans or errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scanners", type=int, default=400)
+    parser.add_argument("--users", type=int, default=400)
+    parser.add_argument("--attempts", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--legacy", action="store_true", help="use the old two-UPDATE flow")
+    args = parser.parse_args()
+
+    ok = all(
+        run(args.scanners, args.users, args.attempts, args.pool_size, args.legacy, args.seed + r * args.scanners)
+        for r in range(args.rounds)
+    )
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
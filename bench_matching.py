@@ -0,0 +1,265 @@
+"""Matching micro-benchmarks and equivalence checks for every scorer variant.
+
+Variants are the scorers as they exist in the app scripts:
+
+    app, sahay          language / subject / grade / topic   (profile rows)
+    app2, app4          weak-subject help, +5 strong overlap  (mentor dicts)
+    app5                as app2 with different reason strings
+    app6                weak subject vs mentor teaches, time, grade
+
+The reference implementations are loaded from the scripts' source (see
+``bench_batch_scoring.load_reference``). Each variant is also run through
+its optimized path: ``batch_scoring.MentorMatrix`` for the mentor variants,
+``profile_record`` for the profile variants.
+
+Results are checked against the frozen outputs in matching_fixtures.json
+before anything is timed. ``--record`` rewrites that file from the current
+reference code; only do that when a scoring rule is meant to change.
+
+    python bench_matching.py --check
+    python bench_matching.py --sizes 100 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from batch_scoring import MentorMatrix
+from bench_batch_scoring import load_reference, make_people
+from bench_profiles import make_rows
+from profile_record import Profile, best_match, score_profiles
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(ROOT, "matching_fixtures.json")
+MENTOR_VARIANTS = ("app2", "app4", "app5", "app6")
+PROFILE_VARIANTS = ("app", "sahay")
+FIXTURE_POOL = 120
+FIXTURE_SEARCHERS = 15
+
+
+def reference_best_match(score_pair, me, candidates):
+    """The candidate loop of find_best_match in app.py/sahay.py, minus the Supabase query."""
+    best, high_score = None, 0
+    for p in candidates:
+        s = score_pair(me, p)
+        if s > high_score:
+            high_score, best = s, p
+    return best
+
+
+def normalize(value):
+    """JSON-comparable form of a scorer result; people are reduced to their names."""
+    if isinstance(value, dict):
+        return value.get("name")
+    if isinstance(value, (list, tuple)):
+        return [normalize(v) for v in value]
+    return value
+
+# =========================================================
+# VARIANTS
+# =========================================================
+class MentorVariant:
+    def __init__(self, name):
+        self.name = name
+        self.ref = load_reference(name)
+
+    def make_pool(self, n, rng):
+        return make_people(n, rng, "mentor")
+
+    def make_searchers(self, n, rng, pool):
+        return make_people(n, rng, "mentee") + pool[:2]
+
+    def reference_scores(self, me, pool):
+        return [list(self.ref["calculate_match_score"](me, m)) for m in pool]
+
+    def reference_best(self, me, pool):
+        return self.ref["find_best_mentor"](me, pool)
+
+    def prepare(self, pool):
+        return MentorMatrix(pool, self.name)
+
+    def fast_scores(self, prepared, me):
+        scores, masks = prepared.score(me)
+        return [[int(s), prepared.reasons(me, m)] for s, m in zip(scores, masks)]
+
+    def fast_best(self, prepared, me):
+        # app2/app4 apply their threshold to the reasons only; the batch scorer
+        # implements the intended rule, so it is compared with app5/app6 only.
+        return prepared.best(me)
+
+    def best_comparable(self):
+        return self.name in ("app5", "app6")
+
+
+class ProfileVariant:
+    def __init__(self, name):
+        self.name = name
+        self.ref = load_reference(name, ("calculate_match_score",))
+
+    def make_pool(self, n, rng):
+        return make_rows(n, rng)
+
+    def make_searchers(self, n, rng, pool):
+        return make_rows(n, rng, first_id=10**9) + pool[:2]
+
+    def reference_scores(self, me, pool):
+        return [self.ref["calculate_match_score"](me, p) for p in pool]
+
+    def reference_best(self, me, pool):
+        return reference_best_match(self.ref["calculate_match_score"], me, pool)
+
+    def prepare(self, pool):
+        return [Profile.from_dict(p) for p in pool]
+
+    def fast_scores(self, prepared, me):
+        me = Profile.from_dict(me)
+        return [score_profiles(me, p) for p in prepared]
+
+    def fast_best(self, prepared, me):
+        best = best_match(Profile.from_dict(me), prepared)
+        return best.row if best else None
+
+    def best_comparable(self):
+        return True
+
+
+def load_variants(names):
+    return [MentorVariant(n) if n in MENTOR_VARIANTS else ProfileVariant(n) for n in names]
+
+# =========================================================
+# FIXTURES
+# =========================================================
+def record_fixtures(variants, seed):
+    fixtures = {"seed": seed, "variants": {}}
+    for v in variants:
+        rng = random.Random(f"{seed}-{v.name}")
+        pool = v.make_pool(FIXTURE_POOL, rng)
+        searchers = v.make_searchers(FIXTURE_SEARCHERS, rng, pool)
+        fixtures["variants"][v.name] = {
+            "pool": pool,
+            "searchers": searchers,
+            "scores": [normalize(v.reference_scores(me, pool)) for me in searchers],
+            "best": [normalize(v.reference_best(me, pool)) for me in searchers],
+        }
+    with open(FIXTURES, "w") as f:
+        json.dump(fixtures, f, separators=(",", ":"))
+        f.write("\n")
+    return fixtures
+
+
+def check_fixtures(variants):
+    """Returns a list of mismatch descriptions; empty when everything agrees."""
+    with open(FIXTURES) as f:
+        fixtures = json.load(f)["variants"]
+    problems = []
+    for v in variants:
+        fx = fixtures.get(v.name)
+        if fx is None:
+            problems.append(f"{v.name}: no fixture (run --record)")
+            continue
+        pool, prepared = fx["pool"], v.prepare(fx["pool"])
+        for i, me in enumerate(fx["searchers"]):
+            checks = [
+                ("reference scores", normalize(v.reference_scores(me, pool)), fx["scores"][i]),
+                ("reference best", normalize(v.reference_best(me, pool)), fx["best"][i]),
+                ("optimized scores", normalize(v.fast_scores(prepared, me)), fx["scores"][i]),
+            ]
+            if v.best_comparable():
+                checks.append(("optimized best", normalize(v.fast_best(prepared, me)), fx["best"][i]))
+            for label, got, expected in checks:
+                if got != expected:
+                    problems.append(f"{v.name}: {label} differ for searcher {i} ({me.get('name')})")
+    return problems
+
+# =========================================================
+# TIMING
+# =========================================================
+def timed(fn, *args):
+    """(result, seconds, peak traced bytes); timed and traced in separate runs."""
+    started = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_variant(v, n, searches, rng):
+    pool = v.make_pool(n, rng)
+    searchers = v.make_searchers(searches, rng, pool)[:searches]
+
+    # Pair scoring alone and the whole best-candidate search, per searcher.
+    _, ref_score_s, ref_score_peak = timed(lambda: [v.reference_scores(me, pool) for me in searchers])
+    _, ref_best_s, ref_best_peak = timed(lambda: [v.reference_best(me, pool) for me in searchers])
+    prepared, prep_s, prep_peak = timed(v.prepare, pool)
+    _, fast_best_s, fast_best_peak = timed(lambda: [v.fast_best(prepared, me) for me in searchers])
+
+    return {
+        "variant": v.name, "pool": n,
+        "ref_score_ms": ref_score_s / searches * 1000,
+        "ref_best_ms": ref_best_s / searches * 1000,
+        "ref_best_peak_kb": ref_best_peak / 1024,
+        "prepare_ms": prep_s * 1000,
+        "prepare_peak_kb": prep_peak / 1024,
+        "fast_best_ms": fast_best_s / searches * 1000,
+        "fast_best_peak_kb": fast_best_peak / 1024,
+        "ref_score_peak_kb": ref_score_peak / 1024,
+    }
+
+
+def print_row(r):
+    print(f"{r['variant']:<7}{r['pool']:>9,}{r['ref_score_ms']:>12.2f}{r['ref_best_ms']:>12.2f}"
+          f"{r['ref_best_peak_kb']:>12,.0f}{r['prepare_ms']:>12.1f}{r['prepare_peak_kb']:>12,.0f}"
+          f"{r['fast_best_ms']:>11.2f}{r['fast_best_peak_kb']:>12,.0f}"
+          f"{r['ref_best_ms'] / max(r['fast_best_ms'], 1e-9):>9.1f}x")
+
+
+def main():
+    all_variants = PROFILE_VARIANTS + MENTOR_VARIANTS
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--variants", nargs="+", choices=all_variants, default=list(all_variants))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000, 100_000])
+    parser.add_argument("--searches", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--check", action="store_true", help="only run the fixture checks")
+    parser.add_argument("--record", action="store_true", help="rewrite the fixtures from the reference code")
+    parser.add_argument("--json", help="also write timings to this file")
+    args = parser.parse_args()
+
+    variants = load_variants(args.variants)
+    if args.record:
+        record_fixtures(load_variants(all_variants), args.seed)
+        print(f"Wrote {FIXTURES}")
+
+    problems = check_fixtures(variants)
+    for p in problems:
+        print(f"MISMATCH {p}")
+    print(f"fixtures: {len(variants)} variant(s), {len(problems)} mismatch(es)")
+    if problems:
+        sys.exit(1)
+    if args.check:
+        return
+
+    rng = random.Random(args.seed)
+    print(f"\n{'variant':<7}{'pool':>9}{'score ms':>12}{'best ms':>12}{'best KB':>12}"
+          f"{'prep ms':>12}{'prep KB':>12}{'opt ms':>11}{'opt KB':>12}{'speedup':>10}")
+    results = []
+    for n in args.sizes:
+        for v in variants:
+            r = bench_variant(v, n, args.searches, rng)
+            results.append(r)
+            print_row(r)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"created_at": int(time.time()), "seed": args.seed, "results": results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
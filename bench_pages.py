@@ -0,0 +1,180 @@
+"""Time each page's query set against synthetic databases of growing scale.
+
+The SQL is taken from the page modules themselves (via query_audit's
+collector), so the benchmark follows the code rather than a copy of it.
+Each statement is timed once per page load, so per-row queries (the
+admin panel's per-user feedback lookup) are under-counted by the number of
+rows shown. Results go to a JSON file; pass the previous file with
+``--compare`` to print per-page deltas.
+
+    python bench_pages.py --scales tiny small --out bench_pages.json
+    python bench_pages.py --scales tiny small --compare bench_pages.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import tempfile
+import time
+
+from query_audit import collect_statements
+from seed_data import SCALES, create_seeded_db
+
+# Page -> (module, function) pairs whose read queries make up the page.
+PAGES = {
+    "dashboard": [
+        ("dashboard.py", "dashboard_page"),
+        ("dashboard.py", "render_custom_streak"),
+        ("dashboard.py", "load_match_history"),
+        ("dashboard.py", "load_incoming_requests"),
+        ("streak.py", "init_streak"),
+    ],
+    "matchmaking": [
+        ("matching.py", "matchmaking_page"),
+        ("matching.py", "show_discovery"),
+        ("matching.py", "show_confirmation"),
+        ("session_registry.py", "session_peer"),
+    ],
+    # The chat fragment reads through chat_sync: a cursor poll and a "load older" page.
+    "live_chat": [
+        ("chat_sync.py", "fetch_messages"),
+        ("chat_sync.py", "fetch_before"),
+    ],
+    "admin": [
+        ("admin.py", "render_admin_panel"),
+    ],
+    "practice": [
+        ("practice.py", "get_normalized_class_level"),
+        ("practice.py", "practice_page"),
+    ],
+}
+
+_KEYWORDS = {"IN", "NOT", "AND", "OR", "IS"}
+
+
+def bind(sql, ctx):
+    """Pick a representative value for each placeholder from the column it is compared to."""
+    params = []
+    for m in re.finditer(r"\?", sql):
+        words = [w for w in re.findall(r"[\w.]+", sql[:m.start()]) if w.upper() not in _KEYWORDS]
+        column = words[-1].lower() if words else ""
+        if column == "limit":
+            params.append(50)
+        elif "match_id" in column:
+            params.append(ctx["match_id"])
+        elif column == "id":
+            params.append(ctx["message_id"])
+        else:
+            params.append(ctx["user_id"])
+    return tuple(params)
+
+
+def page_statements():
+    statements = collect_statements(os.path.dirname(os.path.abspath(__file__)))
+    by_function = {}
+    for s in statements:
+        if s.sql.upper().startswith(("SELECT", "WITH")):
+            by_function.setdefault((s.file, s.function), []).append(s)
+    return {
+        page: [s for key in keys for s in by_function.get(key, [])]
+        for page, keys in PAGES.items()
+    }
+
+
+def pick_context(conn):
+    """A busy user with a current session, so every query has rows to find.
+
+    Message-id cursors are bound to the session's newest message: a poll
+    finds nothing new and "load older" reads a full page.
+    """
+    row = conn.execute("""
+        SELECT p.user_id, p.match_id
+        FROM profiles p
+        JOIN session_ratings sr ON sr.rater_id = p.user_id
+        WHERE p.match_id IS NOT NULL
+        LIMIT 1
+    """).fetchone()
+    newest = conn.execute("SELECT MAX(id) FROM messages WHERE match_id = ?", (row[1],)).fetchone()[0]
+    return {"user_id": row[0], "match_id": row[1], "message_id": newest or 0}
+
+
+def time_statement(conn, statement, params, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = len(conn.execute(statement.sql, params).fetchall())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), rows
+
+
+def bench_scale(scale, seed, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        db_pool, counts = create_seeded_db(os.path.join(tmp, f"{scale}.db"), scale, seed)
+        seed_time = time.perf_counter() - started
+
+        pages = {}
+        with db_pool.connection() as conn:
+            ctx = pick_context(conn)
+            for page, statements in page_statements().items():
+                queries = []
+                for s in statements:
+                    params = bind(s.sql, ctx)
+                    try:
+                        median, rows = time_statement(conn, s, params, repeat)
+                    except Exception as e:
+                        queries.append({"file": s.file, "function": s.function, "line": s.line,
+                                        "sql": s.sql, "error": str(e)})
+                        continue
+                    queries.append({"file": s.file, "function": s.function, "line": s.line,
+                                    "sql": s.sql, "median_ms": median * 1000, "rows": rows})
+                pages[page] = {
+                    "total_ms": sum(q.get("median_ms", 0.0) for q in queries),
+                    "queries": queries,
+                }
+        db_pool.close()
+
+    return {"scale": scale, "counts": counts, "seed_s": seed_time, "pages": pages}
+
+
+def print_results(results, previous=None):
+    prev = {
+        (r["scale"], page): data["total_ms"]
+        for r in (previous or {}).get("results", [])
+        for page, data in r["pages"].items()
+    }
+    print(f"{'scale':<8}{'page':<14}{'total ms':>12}{'prev ms':>12}{'change':>10}")
+    for r in results:
+        for page, data in r["pages"].items():
+            before = prev.get((r["scale"], page))
+            change = f"{(data['total_ms'] / before - 1) * 100:+.0f}%" if before else ""
+            before_s = f"{before:.2f}" if before else "-"
+            print(f"{r['scale']:<8}{page:<14}{data['total_ms']:>12.2f}{before_s:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["tiny", "small"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default="bench_pages.json")
+    parser.add_argument("--compare", help="previous results file to diff against")
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare and os.path.exists(args.compare):
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    results = [bench_scale(scale, args.seed, args.repeat) for scale in args.scales]
+    print_results(results, previous)
+
+    with open(args.out, "w") as f:
+        json.dump({"created_at": int(time.time()), "seed": args.seed, "results": results}, f, indent=2)
+    print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
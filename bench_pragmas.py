@@ -0,0 +1,134 @@
+"""Concurrent writer/reader throughput under each SQLite pragma profile.
+
+Writers insert chat rows into ``messages`` the way ``show_live_session``
+does (one commit per message); readers poll ``profiles`` and the live
+transcript the way the dashboard and chat fragment do.
+
+    python bench_pragmas.py --writers 4 --readers 8 --seconds 5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from database import PRAGMA_PROFILES, ConnectionPool, init_db
+
+MATCH_IDS = [f"sess_{i}" for i in range(50)]
+USERS = 500
+
+
+def seed(db_pool):
+    with db_pool.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO auth_users (name, email, password) VALUES (?, ?, ?)",
+            [(f"user{i}", f"user{i}@example.org", "pw") for i in range(USERS)]
+        )
+        conn.executemany(
+            "INSERT INTO profiles (user_id, role, grade, time, strong_subjects, weak_subjects, teaches, status) "
+            "VALUES (?, 'Student', 'Grade 5', '5-6 PM', 'Mathematics', 'English', '', 'waiting')",
+            [(i + 1,) for i in range(USERS)]
+        )
+
+
+def writer(db_pool, stop, latencies):
+    rng = random.Random()
+    while not stop.is_set():
+        start = time.perf_counter()
+        with db_pool.transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (match_id, sender, message, created_ts) VALUES (?,?,?,?)",
+                (rng.choice(MATCH_IDS), "bench", "hello there", int(time.time()))
+            )
+        latencies.append(time.perf_counter() - start)
+
+
+def reader(db_pool, stop, latencies):
+    rng = random.Random()
+    while not stop.is_set():
+        start = time.perf_counter()
+        with db_pool.connection() as conn:
+            conn.execute(
+                "SELECT role, grade, time, strong_subjects, weak_subjects, teaches FROM profiles WHERE user_id=?",
+                (rng.randint(1, USERS),)
+            ).fetchone()
+            conn.execute(
+                "SELECT sender, message FROM messages WHERE match_id=? ORDER BY created_ts ASC",
+                (rng.choice(MATCH_IDS),)
+            ).fetchall()
+        latencies.append(time.perf_counter() - start)
+
+
+def p95(values):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=20)[-1]
+
+
+def run_profile(profile, writers, readers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool = ConnectionPool(
+            os.path.join(tmp, "bench.db"),
+            max_size=writers + readers,
+            profile=profile
+        )
+        init_db(db_pool)
+        seed(db_pool)
+
+        stop = threading.Event()
+        write_lat, read_lat = [], []
+        threads = [
+            threading.Thread(target=writer, args=(db_pool, stop, write_lat))
+            for _ in range(writers)
+        ] + [
+            threading.Thread(target=reader, args=(db_pool, stop, read_lat))
+            for _ in range(readers)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        db_pool.close()
+
+    return {
+        "profile": profile,
+        "writes_per_s": len(write_lat) / seconds,
+        "reads_per_s": len(read_lat) / seconds,
+        "write_p95_ms": p95(write_lat) * 1000,
+        "read_p95_ms": p95(read_lat) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--profiles", nargs="+", default=list(PRAGMA_PROFILES))
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = [
+        run_profile(p, args.writers, args.readers, args.seconds)
+        for p in args.profiles
+    ]
+
+    print(f"{'profile':<10}{'writes/s':>12}{'reads/s':>12}{'write p95':>12}{'read p95':>12}")
+    for r in results:
+        print(
+            f"{r['profile']:<10}{r['writes_per_s']:>12.1f}{r['reads_per_s']:>12.1f}"
+            f"{r['write_p95_ms']:>10.2f}ms{r['read_p95_ms']:>10.2f}ms"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Memory and throughput of dict profiles versus pre-parsed Profile records.
+
+Scores one searcher against a pool of Supabase-style profile rows with the
+dict-based ``calculate_match_score`` of app.py (loaded from the source,
+like bench_batch_scoring) and with ``profile_record.score_profiles``, after
+checking both agree on every pair. Memory is measured with tracemalloc
+for the pool as the search sees it: the rows themselves versus the
+records built from them (without a back-reference to the row). The
+"cached" column is the app's search path, where fetched rows are turned
+into records through ``load_record``.
+
+    python bench_profiles.py --sizes 1000 10000 100000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from bench_batch_scoring import load_reference
+from profile_record import Profile, best_match, load_record, score_profiles
+
+LANGUAGES = ["English", "Hindi", "Marathi", "Tamil", "Bengali", "Telugu"]
+SUBJECTS = ["Mathematics", "Science", "English", "History", "Physics", "Chemistry"]
+TOPICS = ["", "", "algebra", "Algebra, Geometry", "thermodynamics", "grammar", "Grammar basics"]
+TIME_SLOTS = ["4-5 PM", "5-6 PM", "6-7 PM"]
+
+
+def make_rows(n, rng, first_id=0):
+    rows = []
+    for i in range(first_id, first_id + n):
+        row = {
+            "id": i,
+            "name": f"User {i}",
+            "role": rng.choice(["Student", "Teacher"]),
+            "grade": f"Grade {rng.randint(1, 12)}",
+            "time_slot": rng.choice(TIME_SLOTS),
+            "subjects": ", ".join(rng.sample(SUBJECTS, rng.randint(1, 3))),
+            "languages": ",".join(rng.sample(LANGUAGES, rng.randint(1, 2))),
+            "specific_topics": rng.choice(TOPICS),
+            "status": "waiting",
+            "created_at": "2026-01-01T00:00:00",
+        }
+        # Rows the scorer has to be careful with.
+        edge = rng.random()
+        if edge < 0.02:
+            row["grade"] = rng.choice([None, "Grade", "Grade x", "7"])
+        elif edge < 0.03:
+            del row["role"]
+        elif edge < 0.04:
+            row["languages"] = rng.choice([None, "", " , "])
+        rows.append(row)
+    return rows
+
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    value = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return value, size
+
+
+def check_equivalence(rows, searchers, score_dict):
+    records = [Profile.from_dict(r) for r in rows]
+    for me in searchers:
+        me_record = Profile.from_dict(me)
+        for row, record in zip(rows, records):
+            expected, got = score_dict(me, row), score_profiles(me_record, record)
+            if expected != got:
+                raise AssertionError(f"{me['name']} x {row['name']}: {got} != {expected}")
+
+
+def best_dict(me, candidates, score_dict):
+    best, high_score = None, 0
+    for p in candidates:
+        s = score_dict(me, p)
+        if s > high_score:
+            high_score, best = s, p
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--searches", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    score_dict = load_reference("app", ("calculate_match_score",))["calculate_match_score"]
+
+    rows = make_rows(2_000, rng)
+    check_equivalence(rows, rows[:60], score_dict)
+    print(f"equivalent: {2_000 * 60:,} pairs")
+    next_id = len(rows)
+
+    print(f"\n{'pool':>8}{'dict KB':>11}{'record KB':>11}{'dict us/cand':>14}{'rec us/cand':>13}"
+          f"{'cached us/cand':>16}{'build ms':>10}{'speedup':>9}")
+    for n in args.sizes:
+        rows, dict_bytes = measure(lambda: make_rows(n, rng, first_id=next_id))
+        next_id += n
+        records, record_bytes = measure(lambda: [Profile.from_dict(r, keep_row=False) for r in rows])
+        searchers = rng.sample(rows, args.searches)
+
+        started = time.perf_counter()
+        expected = [best_dict(me, rows, score_dict) for me in searchers]
+        dict_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        records = [Profile.from_dict(r) for r in rows]
+        build_s = time.perf_counter() - started
+        me_records = [Profile.from_dict(me) for me in searchers]
+        started = time.perf_counter()
+        got = [best_match(me, records) for me in me_records]
+        record_s = time.perf_counter() - started
+
+        if [b.row if b else None for b in got] != expected:
+            raise AssertionError(f"best match differs at pool size {n}")
+
+        # The search path: rows re-fetched per search, records from the cache.
+        for r in rows:
+            load_record(r)
+        started = time.perf_counter()
+        for me in me_records:
+            best_match(me, [load_record(r) for r in rows])
+        cached_s = time.perf_counter() - started
+
+        per = n * args.searches
+        print(f"{n:>8,}{dict_bytes / 1024:>11,.0f}{record_bytes / 1024:>11,.0f}"
+              f"{dict_s / per * 1e6:>14.2f}{record_s / per * 1e6:>13.2f}{cached_s / per * 1e6:>16.2f}"
+              f"{build_s * 1000:>10.1f}{dict_s / record_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
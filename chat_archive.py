@@ -0,0 +1,72 @@
+"""Hot/cold split for chat messages.
+
+The live chat only ever reads ``messages`` for sessions in progress, so
+once a session is finished its rows are moved to ``messages_archive``.
+A session counts as finished when no profile references its match id any
+more and nothing has been said in it for ARCHIVE_AFTER seconds.
+
+Anything that shows a transcript should go through ``load_transcript``,
+which reads both tables.
+"""
+import time
+
+from background import start_loop
+from database import get_connection, transaction
+
+ARCHIVE_AFTER = 6 * 3600        # idle seconds before a finished session is archived
+ARCHIVE_INTERVAL = 600          # seconds between archiver passes
+ARCHIVE_BATCH = 100             # sessions moved per pass
+
+# =========================================================
+# ARCHIVAL
+# =========================================================
+def finished_sessions(conn, older_than, limit=ARCHIVE_BATCH):
+    return [row[0] for row in conn.execute("""
+        SELECT m.match_id
+        FROM messages m
+        WHERE m.match_id IS NOT NULL
+        GROUP BY m.match_id
+        HAVING MAX(m.created_ts) < ?
+           AND m.match_id NOT IN (SELECT match_id FROM profiles WHERE match_id IS NOT NULL)
+        LIMIT ?
+    """, (older_than, limit))]
+
+def archive_session(conn, match_id, now=None):
+    conn.execute("""
+        INSERT OR IGNORE INTO messages_archive
+            (id, match_id, sender, message, file_path, created_at, created_ts, archived_at)
+        SELECT id, match_id, sender, message, file_path, created_at, created_ts, ?
+        FROM messages WHERE match_id = ?
+    """, (int(now or time.time()), match_id))
+    return conn.execute("DELETE FROM messages WHERE match_id = ?", (match_id,)).rowcount
+
+def archive_finished_sessions(idle_for=ARCHIVE_AFTER, batch=ARCHIVE_BATCH):
+    """Move finished sessions to the archive; returns the number of messages moved."""
+    now = int(time.time())
+    moved = 0
+    while True:
+        with transaction() as conn:
+            match_ids = finished_sessions(conn, now - idle_for, batch)
+            for match_id in match_ids:
+                moved += archive_session(conn, match_id, now)
+        if len(match_ids) < batch:
+            return moved
+
+def start_archiver(interval=ARCHIVE_INTERVAL):
+    """Start the background archiver once per process."""
+    return start_loop("sahay-chat-archiver", archive_finished_sessions, interval)
+
+# =========================================================
+# READ API
+# =========================================================
+def load_transcript(match_id, conn=None):
+    """All messages of a session, hot or archived, oldest first."""
+    if conn is None:
+        with get_connection() as conn:
+            return load_transcript(match_id, conn)
+    return conn.execute("""
+        SELECT id, sender, message, file_path, created_ts FROM messages_archive WHERE match_id = ?
+        UNION ALL
+        SELECT id, sender, message, file_path, created_ts FROM messages WHERE match_id = ?
+        ORDER BY created_ts, id
+    """, (match_id, match_id)).fetchall()
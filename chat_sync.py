@@ -0,0 +1,157 @@
+"""Incremental chat sync.
+
+The live chat keeps a ``ChatCursor`` per viewer in session state: the id of
+the newest message it has seen and a bounded buffer of recent messages.
+A sync only asks for ``id > cursor``, which is an index range scan on
+``messages(match_id, id)``, instead of re-reading the whole transcript.
+
+Messages posted through ``post_message`` are also announced on an
+in-process board of the newest message id per match, so a chat tick in the
+same process knows there is something new without touching the database.
+When to sync otherwise is up to the caller's poller (see polling.py);
+that is how messages written by another worker process arrive.
+
+Only the last CHAT_WINDOW messages are shown at first. ``load_older``
+widens that to the rest of the buffer a page at a time, then fetches
+earlier pages by keyset (``id < oldest shown``).
+"""
+import threading
+import time
+from collections import deque
+
+from database import get_connection
+from db_writer import write
+
+CHAT_BUFFER = 200           # messages kept per viewer
+CHAT_WINDOW = 50            # messages shown before "load older"
+CHAT_PAGE = 50              # messages added per "load older"
+
+
+class ChatFanout:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest = {}
+
+    def announce(self, match_id, message_id):
+        with self._lock:
+            if message_id > self._latest.get(match_id, 0):
+                self._latest[match_id] = message_id
+
+    def latest(self, match_id):
+        """Newest message id announced in this process for the match (0 if none)."""
+        with self._lock:
+            return self._latest.get(match_id, 0)
+
+    def forget(self, match_id):
+        with self._lock:
+            self._latest.pop(match_id, None)
+
+
+fanout = ChatFanout()
+
+# =========================================================
+# MESSAGES
+# =========================================================
+def post_message(match_id, sender, message, file_path=None):
+    """Store a chat message and announce it; returns the message id."""
+    message_id = write(
+        "INSERT INTO messages (match_id, sender, message, file_path, created_ts) VALUES (?,?,?,?,?)",
+        (match_id, sender, message, file_path, int(time.time()))
+    )
+    fanout.announce(match_id, message_id)
+    return message_id
+
+def fetch_messages(match_id, after_id=0, limit=CHAT_BUFFER):
+    """Up to `limit` messages newer than `after_id`, oldest first.
+
+    With no cursor yet (after_id 0) these are the newest `limit` messages.
+    """
+    with get_connection() as conn:
+        if after_id:
+            rows = conn.execute("""
+                SELECT id, sender, message, file_path, created_ts FROM messages
+                WHERE match_id = ? AND id > ?
+                ORDER BY id LIMIT ?
+            """, (match_id, after_id, limit)).fetchall()
+        else:
+            rows = conn.execute("""
+                SELECT id, sender, message, file_path, created_ts FROM messages
+                WHERE match_id = ?
+                ORDER BY id DESC LIMIT ?
+            """, (match_id, limit)).fetchall()[::-1]
+    return [dict(r) for r in rows]
+
+def fetch_before(match_id, before_id, limit=CHAT_PAGE):
+    """Up to `limit` messages older than `before_id`, oldest first."""
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT id, sender, message, file_path, created_ts FROM messages
+            WHERE match_id = ? AND id < ?
+            ORDER BY id DESC LIMIT ?
+        """, (match_id, before_id, limit)).fetchall()
+    return [dict(r) for r in rows[::-1]]
+
+# =========================================================
+# CURSOR
+# =========================================================
+class ChatCursor:
+    def __init__(self, match_id, size=CHAT_BUFFER, window=CHAT_WINDOW):
+        self.match_id = match_id
+        self.last_id = 0
+        self.messages = deque(maxlen=size)
+        self.window = window
+        self.older = []         # pages loaded on demand, just before the buffer
+        self.at_start = False   # nothing older than what is loaded
+
+    def behind(self):
+        """True if this process has announced a message the buffer doesn't have yet."""
+        return fanout.latest(self.match_id) > self.last_id
+
+    def sync(self):
+        """Append messages newer than the cursor to the buffer; returns how many arrived."""
+        added = 0
+        while True:
+            first = not self.last_id
+            rows = fetch_messages(self.match_id, self.last_id, self.messages.maxlen)
+            if first:
+                self.at_start = len(rows) < self.messages.maxlen
+            if not rows:
+                break
+            overflow = len(self.messages) + len(rows) - self.messages.maxlen
+            if self.older and overflow > 0:
+                # The reader has scrolled back; keep the history contiguous.
+                combined = list(self.messages) + rows
+                self.older.extend(combined[:overflow])
+                self.messages = deque(combined[overflow:], maxlen=self.messages.maxlen)
+            else:
+                if overflow > 0:
+                    # Evicted rows are history again, reachable through load_older.
+                    self.at_start = False
+                self.messages.extend(rows)
+            self.last_id = rows[-1]["id"]
+            added += len(rows)
+            if len(rows) < self.messages.maxlen:
+                break
+        return added
+
+    def visible(self):
+        """Messages to render, oldest first."""
+        tail = list(self.messages)
+        return self.older + tail if self.older else tail[-self.window:]
+
+    def has_older(self):
+        return (not self.older and len(self.messages) > self.window) or not self.at_start
+
+    def load_older(self, page=CHAT_PAGE):
+        """Show one more page of history: from the buffer first, then from the database."""
+        tail = list(self.messages)
+        if not self.older and self.window < len(tail):
+            self.window = min(self.window + page, len(tail))
+            return
+        shown = self.older or tail
+        if not shown:
+            self.at_start = True
+            return
+        rows = fetch_before(self.match_id, shown[0]["id"], page)
+        self.older[:0] = rows
+        self.at_start = len(rows) < page
@@ -3,7 +3,11 @@ import time
 import uuid
 import requests
 from datetime import datetime
-from database import cursor, conn
+from database import get_connection, transaction
+from db_writer import write
+from profiles import save_profile
+from discovery import index as discovery_index
+from session_registry import register_session
 from streak import init_streak
 from streamlit_lottie import st_lottie
 
@@ -30,8 +34,8 @@ def inject_emerald_dashboard_styles():
     """, unsafe_allow_html=True)
 
 def render_custom_streak():
-    cursor.execute("SELECT streak FROM user_streaks WHERE user_id = ?", (st.session_state.user_id,))
-    res = cursor.fetchone()
+    with get_connection() as conn:
+        res = conn.execute("SELECT streak FROM user_streaks WHERE user_id = ?", (st.session_state.user_id,)).fetchone()
     streak_val = res[0] if res else 0
     anim_fire = load_lottieurl("https://assets9.lottiefiles.com/packages/lf20_S691S7.json")
 
@@ -47,36 +51,40 @@ def render_custom_streak():
     st.markdown("</div>", unsafe_allow_html=True)
 
 def load_match_history(user_id):
-    cursor.execute("""
-        SELECT sr.match_id, sr.rating, au.id, au.name
-        FROM session_ratings sr
-        JOIN auth_users au ON au.id != sr.rater_id
-        WHERE sr.rater_id = ?
-        ORDER BY sr.rowid DESC
-    """, (user_id,))
-    return cursor.fetchall()
+    # Rated sessions, newest first, with the partner from the session registry.
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT sp.match_id, sr.rating, au.id, au.name
+            FROM session_participants sp
+            JOIN session_ratings sr ON sr.match_id = sp.match_id AND sr.rater_id = sp.user_id
+            JOIN auth_users au ON au.id = sp.peer_id
+            WHERE sp.user_id = ?
+            ORDER BY sp.started_ts DESC
+        """, (user_id,)).fetchall()
 
 def send_rematch_request(to_user_id):
-    cursor.execute("INSERT INTO rematch_requests (from_user, to_user, status, seen) VALUES (?, ?, 'pending', 0)", 
-                   (st.session_state.user_id, to_user_id))
-    conn.commit()
+    write("INSERT INTO rematch_requests (from_user, to_user, status, seen) VALUES (?, ?, 'pending', 0)", 
+          (st.session_state.user_id, to_user_id))
 
 def load_incoming_requests(user_id):
-    cursor.execute("""
-        SELECT rr.id, au.name, au.id, rr.seen
-        FROM rematch_requests rr
-        JOIN auth_users au ON au.id = rr.from_user
-        WHERE rr.to_user = ? AND rr.status = 'pending'
-        ORDER BY rr.id DESC
-    """, (user_id,))
-    return cursor.fetchall()
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT rr.id, au.name, au.id, rr.seen
+            FROM rematch_requests rr
+            JOIN auth_users au ON au.id = rr.from_user
+            WHERE rr.to_user = ? AND rr.status = 'pending'
+            ORDER BY rr.id DESC
+        """, (user_id,)).fetchall()
 
 def accept_request(req_id, from_user_id):
     new_match_id = f"rematch_{uuid.uuid4().hex[:8]}"
-    cursor.execute("UPDATE rematch_requests SET status='accepted' WHERE id=?", (req_id,))
-    cursor.execute("UPDATE profiles SET status='matched', match_id=?, accepted=1 WHERE user_id IN (?, ?)", 
-                   (new_match_id, st.session_state.user_id, from_user_id))
-    conn.commit()
+    with transaction() as conn:
+        conn.execute("UPDATE rematch_requests SET status='accepted' WHERE id=?", (req_id,))
+        conn.execute("UPDATE profiles SET status='matched', match_id=?, accepted=1 WHERE user_id IN (?, ?)", 
+                     (new_match_id, st.session_state.user_id, from_user_id))
+        register_session(conn, new_match_id, st.session_state.user_id, from_user_id)
+    discovery_index.remove(st.session_state.user_id)
+    discovery_index.remove(from_user_id)
 
 def dashboard_page():
     inject_emerald_dashboard_styles()
@@ -86,8 +94,8 @@ def dashboard_page():
     anim_network = load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_dmw3t0vg.json")
 
     # 1. Active Session Pulse
-    cursor.execute("SELECT status FROM profiles WHERE user_id=?", (st.session_state.user_id,))
-    current_status = cursor.fetchone()
+    with get_connection() as conn:
+        current_status = conn.execute("SELECT status FROM profiles WHERE user_id=?", (st.session_state.user_id,)).fetchone()
 
     if current_status and current_status[0] == 'matched':
         st.markdown("<div class='pulse-box'><h4 style='color:#065f46; margin:0;'>Active Session Ready</h4></div>", unsafe_allow_html=True)
@@ -107,8 +115,8 @@ def dashboard_page():
     st.write("")
 
     # 3. Profile Management
-    cursor.execute("SELECT role, grade, time, strong_subjects, weak_subjects, teaches FROM profiles WHERE user_id=?", (st.session_state.user_id,))
-    profile = cursor.fetchone()
+    with get_connection() as conn:
+        profile = conn.execute("SELECT role, grade, time, strong_subjects, weak_subjects, teaches FROM profiles WHERE user_id=?", (st.session_state.user_id,)).fetchone()
     
     if not profile or st.session_state.get("edit_profile", False):
         st.markdown("<div class='profile-card'>", unsafe_allow_html=True)
@@ -126,11 +134,8 @@ def dashboard_page():
                 strong, weak = [], []
             
             if st.form_submit_button("Finalize Profile Synchronization"):
-                cursor.execute("""
-                    INSERT OR REPLACE INTO profiles (user_id, role, grade, time, strong_subjects, weak_subjects, teaches, status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, 'waiting')
-                """, (st.session_state.user_id, role, grade, time_slot, ",".join(strong), ",".join(weak), ",".join(teaches)))
-                conn.commit()
+                save_profile(st.session_state.user_id, role, grade, time_slot, strong, weak, teaches)
+                discovery_index.sync_user(st.session_state.user_id)
                 st.session_state.edit_profile = False
                 st.rerun()
         st.markdown("</div>", unsafe_allow_html=True)
@@ -1,149 +1,545 @@
 import sqlite3
 import threading
 import os
+import time
+from contextlib import contextmanager
 
 # =========================================================
 # DATABASE CONFIGURATION
 # =========================================================
 DB_PATH = "app.db"
+POOL_SIZE = 8
+POOL_TIMEOUT = 30.0
 
-conn = sqlite3.connect(
-    DB_PATH,
-    check_same_thread=False
-)
-cursor = conn.cursor()
+# Pragma profile applied to every pooled connection. "legacy" reproduces
+# SQLite's stock settings (rollback journal, full fsync on every commit);
+# "wal" lets dashboard/admin readers run alongside chat writers.
+DB_PROFILE = os.environ.get("SAHAY_DB_PROFILE", "wal")
+
+PRAGMA_PROFILES = {
+    "legacy": {
+        "busy_timeout": 5000,
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+    },
+    "wal": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 134217728,
+        "temp_store": "MEMORY",
+    },
+}
 
 _db_lock = threading.Lock()
 
+# =========================================================
+# CONNECTION POOL
+# =========================================================
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared by all session threads.
+
+    A connection is only ever used by one thread at a time: it is checked
+    out with ``acquire()`` and handed back with ``release()``. Connections run
+    in autocommit mode; multi-statement writes go through ``transaction()``.
+    """
+
+    def __init__(self, db_path, max_size=POOL_SIZE, timeout=POOL_TIMEOUT, profile=DB_PROFILE):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self.pragmas = PRAGMA_PROFILES[profile]
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "acquired": 0,
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "max_wait": 0.0,
+        }
+
+    def connect(self, **overrides):
+        """A new connection outside the pool, with the pool's pragmas and `overrides` on top."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in {**self.pragmas, **overrides}.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No database connection available after {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+            self._stats["acquired"] += 1
+            if waited:
+                elapsed = time.perf_counter() - start
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += elapsed
+                self._stats["max_wait"] = max(self._stats["max_wait"], elapsed)
+
+            if self._idle:
+                self._stats["hits"] += 1
+                return self._idle.pop()
+
+            self._stats["misses"] += 1
+            self._created += 1
+
+        try:
+            return self.connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Run the block in one write transaction, rolled back on error."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s["size"] = self._created
+            s["idle"] = len(self._idle)
+            s["max_size"] = self.max_size
+        acquired = s["acquired"] or 1
+        s["hit_rate"] = s["hits"] / acquired
+        s["avg_wait"] = s["wait_time"] / acquired
+        return s
+
+    def close(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._created -= 1
+
+
+pool = ConnectionPool(DB_PATH)
+
+def get_connection():
+    return pool.connection()
+
+def transaction():
+    return pool.transaction()
+
+def pool_stats():
+    return pool.stats()
+
 # =========================================================
 # SAFE COLUMN CHECK
 # =========================================================
-def column_exists(table, column):
-    cursor.execute(f"PRAGMA table_info({table})")
-    return column in [row[1] for row in cursor.fetchall()]
+def column_exists(conn, table, column):
+    rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return column in [row[1] for row in rows]
 
 # =========================================================
-# INITIALIZE DATABASE
+# SCHEMA MIGRATIONS
 # =========================================================
-def init_db():
-    with _db_lock:
+# Each migration runs exactly once per database, in order, inside its own
+# transaction. Append new entries to MIGRATIONS; never edit applied ones.
+def migrate_base_schema(conn):
+    # Also upgrades databases created before schema_version existed,
+    # hence the column probes.
 
-        # -------------------------
-        # AUTH USERS
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS auth_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            email TEXT UNIQUE,
-            password TEXT
-        )
-        """)
-
-        # -------------------------
-        # PROFILES
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS profiles (
-            user_id INTEGER PRIMARY KEY,
-            role TEXT,
-            grade TEXT,
-            time TEXT,
-            strong_subjects TEXT,
-            weak_subjects TEXT,
-            teaches TEXT,
-            status TEXT DEFAULT 'waiting',
-            match_id TEXT,
-            accepted INTEGER DEFAULT 0,
-            class_level INTEGER,
-            last_seen INTEGER,
-            created_at TEXT DEFAULT (datetime('now'))
-        )
-        """)
-
-        migrations = [
-            ("class_level", "INTEGER"),
-            ("last_seen", "INTEGER"),
-            ("accepted", "INTEGER DEFAULT 0"),
-            ("match_id", "TEXT"),
-            ("status", "TEXT DEFAULT 'waiting'")
-        ]
-        
-        for col, col_type in migrations:
-            if not column_exists("profiles", col):
-                cursor.execute(f"ALTER TABLE profiles ADD COLUMN {col} {col_type}")
-
-        # -------------------------
-        # CHAT MESSAGES
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            match_id TEXT,
-            sender TEXT,
-            message TEXT,
-            file_path TEXT,
-            created_at TEXT DEFAULT (datetime('now')),
-            created_ts INTEGER
-        )
-        """)
-
-        if not column_exists("messages", "created_ts"):
-            cursor.execute("ALTER TABLE messages ADD COLUMN created_ts INTEGER")
-        if not column_exists("messages", "file_path"):
-            cursor.execute("ALTER TABLE messages ADD COLUMN file_path TEXT")
-
-        # -------------------------
-        # SESSION RATINGS
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS session_ratings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            match_id TEXT,
-            rater_id INTEGER,
-            rating INTEGER CHECK(rating BETWEEN 1 AND 5),
-            feedback TEXT,
-            rated_at TEXT DEFAULT (datetime('now'))
-        )
-        """)
-        
-        if not column_exists("session_ratings", "feedback"):
-            cursor.execute("ALTER TABLE session_ratings ADD COLUMN feedback TEXT")
-
-        # -------------------------
-        # USER STREAKS
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_streaks (
-            user_id INTEGER PRIMARY KEY,
-            streak INTEGER DEFAULT 0,
-            last_active DATE
-        )
-        """)
-
-        # -------------------------
-        # REMATCH REQUESTS (With 'seen' status)
-        # -------------------------
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS rematch_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            from_user INTEGER,
-            to_user INTEGER,
-            status TEXT DEFAULT 'pending',
-            seen INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT (datetime('now'))
-        )
-        """)
+    # -------------------------
+    # AUTH USERS
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS auth_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        email TEXT UNIQUE,
+        password TEXT
+    )
+    """)
+
+    # -------------------------
+    # PROFILES
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profiles (
+        user_id INTEGER PRIMARY KEY,
+        role TEXT,
+        grade TEXT,
+        time TEXT,
+        strong_subjects TEXT,
+        weak_subjects TEXT,
+        teaches TEXT,
+        status TEXT DEFAULT 'waiting',
+        match_id TEXT,
+        accepted INTEGER DEFAULT 0,
+        class_level INTEGER,
+        last_seen INTEGER,
+        created_at TEXT DEFAULT (datetime('now'))
+    )
+    """)
+
+    migrations = [
+        ("class_level", "INTEGER"),
+        ("last_seen", "INTEGER"),
+        ("accepted", "INTEGER DEFAULT 0"),
+        ("match_id", "TEXT"),
+        ("status", "TEXT DEFAULT 'waiting'")
+    ]
+    
+    for col, col_type in migrations:
+        if not column_exists(conn, "profiles", col):
+            conn.execute(f"ALTER TABLE profiles ADD COLUMN {col} {col_type}")
+
+    # -------------------------
+    # CHAT MESSAGES
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id TEXT,
+        sender TEXT,
+        message TEXT,
+        file_path TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        created_ts INTEGER
+    )
+    """)
+
+    if not column_exists(conn, "messages", "created_ts"):
+        conn.execute("ALTER TABLE messages ADD COLUMN created_ts INTEGER")
+    if not column_exists(conn, "messages", "file_path"):
+        conn.execute("ALTER TABLE messages ADD COLUMN file_path TEXT")
+
+    # -------------------------
+    # SESSION RATINGS
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS session_ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id TEXT,
+        rater_id INTEGER,
+        rating INTEGER CHECK(rating BETWEEN 1 AND 5),
+        feedback TEXT,
+        rated_at TEXT DEFAULT (datetime('now'))
+    )
+    """)
+    
+    if not column_exists(conn, "session_ratings", "feedback"):
+        conn.execute("ALTER TABLE session_ratings ADD COLUMN feedback TEXT")
+
+    # -------------------------
+    # USER STREAKS
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_streaks (
+        user_id INTEGER PRIMARY KEY,
+        streak INTEGER DEFAULT 0,
+        last_active DATE
+    )
+    """)
+
+    # -------------------------
+    # REMATCH REQUESTS (With 'seen' status)
+    # -------------------------
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rematch_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        from_user INTEGER,
+        to_user INTEGER,
+        status TEXT DEFAULT 'pending',
+        seen INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT (datetime('now'))
+    )
+    """)
+
+    if not column_exists(conn, "rematch_requests", "seen"):
+        conn.execute("ALTER TABLE rematch_requests ADD COLUMN seen INTEGER DEFAULT 0")
+
+    # -------------------------
+    # INDEXES
+    # -------------------------
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_match_id ON profiles(match_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_match_id ON messages(match_id)")
+
+def migrate_query_audit_indexes(conn):
+    # Indexes reported missing by query_audit.py.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_status ON profiles(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_ratings_rater_id ON session_ratings(rater_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_ratings_match_id ON session_ratings(match_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_ratings_rated_at ON session_ratings(rated_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rematch_requests_to_user ON rematch_requests(to_user, status)")
+    # (match_id, created_ts) serves every lookup idx_messages_match_id did,
+    # and also returns the transcript already sorted.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_match_ts ON messages(match_id, created_ts)")
+    conn.execute("DROP INDEX IF EXISTS idx_messages_match_id")
+
+def migrate_profile_subjects(conn):
+    # One row per (user, kind, subject), kind being 'strong', 'weak' or
+    # 'teaches'. The comma-joined profile columns stay as the display copy.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profile_subjects (
+        user_id INTEGER NOT NULL,
+        subject TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        PRIMARY KEY (user_id, kind, subject)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_subjects_lookup ON profile_subjects(subject, kind, user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_time_status ON profiles(time, status)")
+
+    rows = conn.execute(
+        "SELECT user_id, strong_subjects, weak_subjects, teaches FROM profiles"
+    ).fetchall()
+    for user_id, strong, weak, teaches in rows:
+        for kind, value in (("strong", strong), ("weak", weak), ("teaches", teaches)):
+            subjects = {s.strip() for s in (value or "").split(",") if s.strip()}
+            conn.executemany(
+                "INSERT OR IGNORE INTO profile_subjects (user_id, subject, kind) VALUES (?, ?, ?)",
+                [(user_id, subject, kind) for subject in subjects]
+            )
+
+def migrate_messages_archive(conn):
+    # Cold copy of messages from finished sessions; see chat_archive.py.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS messages_archive (
+        id INTEGER PRIMARY KEY,
+        match_id TEXT,
+        sender TEXT,
+        message TEXT,
+        file_path TEXT,
+        created_at TEXT,
+        created_ts INTEGER,
+        archived_at INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_archive_match_ts ON messages_archive(match_id, created_ts)")
+
+def migrate_match_events(conn):
+    # Cross-process fallback for the confirmation handshake; see notify.py.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS match_events (
+        id INTEGER PRIMARY KEY,
+        match_id TEXT NOT NULL,
+        event TEXT NOT NULL,
+        user_id INTEGER,
+        created_ts INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_events_match_id ON match_events(match_id, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_events_created_ts ON match_events(created_ts)")
 
-        if not column_exists("rematch_requests", "seen"):
-            cursor.execute("ALTER TABLE rematch_requests ADD COLUMN seen INTEGER DEFAULT 0")
+def migrate_presence(conn):
+    # Heartbeats write profiles.last_seen; see presence.py. The composite
+    # index serves both fresh-waiting lookups and the reaper, and makes the
+    # status-only index redundant.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_profiles_status_last_seen ON profiles(status, last_seen)")
+    conn.execute("DROP INDEX IF EXISTS idx_profiles_status")
+    # Rows from before heartbeats count as seen now, not as long gone.
+    conn.execute("UPDATE profiles SET last_seen = CAST(strftime('%s', 'now') AS INTEGER) WHERE last_seen IS NULL")
 
-        # -------------------------
-        # INDEXES
-        # -------------------------
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_profiles_match_id ON profiles(match_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_match_id ON messages(match_id)")
+def migrate_sessions(conn):
+    # One row per match, one per (match, participant); see session_registry.py.
+    # profiles.match_id only holds a user's current match, so history and
+    # ratings received are looked up here instead.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        match_id TEXT PRIMARY KEY,
+        started_ts INTEGER NOT NULL,
+        ended_ts INTEGER,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        last_message_ts INTEGER
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS session_participants (
+        match_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        peer_id INTEGER NOT NULL,
+        started_ts INTEGER NOT NULL,
+        PRIMARY KEY (match_id, user_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_participants_user ON session_participants(user_id, started_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_session_ratings_match_rater ON session_ratings(match_id, rater_id)")
+    conn.execute("DROP INDEX IF EXISTS idx_session_ratings_match_id")
+    # Chat inserts keep the per-session counters current.
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_messages_session_stats AFTER INSERT ON messages
+    BEGIN
+        UPDATE sessions
+        SET message_count = message_count + 1,
+            last_message_ts = MAX(COALESCE(last_message_ts, 0), COALESCE(NEW.created_ts, 0))
+        WHERE match_id = NEW.match_id;
+    END
+    """)
+
+    # Backfill pairs still recoverable: current matches, handshake events
+    # and matches both partners rated.
+    conn.execute("""
+    CREATE TEMP TABLE backfill_pairs AS
+    SELECT match_id, MIN(user_id) AS a, MAX(user_id) AS b FROM (
+        SELECT match_id, user_id FROM profiles WHERE match_id IS NOT NULL
+        UNION SELECT match_id, user_id FROM match_events WHERE user_id IS NOT NULL
+        UNION SELECT match_id, rater_id FROM session_ratings WHERE match_id IS NOT NULL
+    )
+    GROUP BY match_id HAVING COUNT(DISTINCT user_id) = 2
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO sessions (match_id, started_ts, message_count, last_message_ts)
+    SELECT bp.match_id,
+           COALESCE(MIN(m.created_ts), CAST(strftime('%s', 'now') AS INTEGER)),
+           COUNT(m.match_id), MAX(m.created_ts)
+    FROM backfill_pairs bp
+    LEFT JOIN (
+        SELECT match_id, created_ts FROM messages
+        UNION ALL SELECT match_id, created_ts FROM messages_archive
+    ) m ON m.match_id = bp.match_id
+    GROUP BY bp.match_id
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO session_participants (match_id, user_id, peer_id, started_ts)
+    SELECT bp.match_id, bp.a, bp.b, s.started_ts FROM backfill_pairs bp JOIN sessions s USING (match_id)
+    UNION ALL
+    SELECT bp.match_id, bp.b, bp.a, s.started_ts FROM backfill_pairs bp JOIN sessions s USING (match_id)
+    """)
+    conn.execute("DROP TABLE backfill_pairs")
+    # Only a current match can still be running.
+    conn.execute("""
+    UPDATE sessions SET ended_ts = COALESCE(last_message_ts, started_ts)
+    WHERE ended_ts IS NULL
+      AND match_id NOT IN (SELECT match_id FROM profiles WHERE match_id IS NOT NULL)
+    """)
+
+def migrate_chat_cursor(conn):
+    # Incremental chat sync reads `id > cursor` / `id < oldest` per match in
+    # id order (see chat_sync.py); idx_messages_match_ts can only find the
+    # match's rows, which then go through a temp B-tree sort.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_match_cursor ON messages(match_id, id)")
+
+def migrate_attachments(conn):
+    # Content-addressed attachment store; see attachments.py.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS attachments (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        name TEXT,
+        content_type TEXT,
+        created_ts INTEGER NOT NULL,
+        preview INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS attachment_owners (
+        user_id INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        created_ts INTEGER NOT NULL,
+        PRIMARY KEY (user_id, sha256)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attachment_owners_sha256 ON attachment_owners(sha256)")
+    # The collector walks blobs past their grace period and looks up
+    # references to each by digest.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_attachments_created_ts ON attachments(created_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_file_path ON messages(file_path) WHERE file_path IS NOT NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_archive_file_path ON messages_archive(file_path) WHERE file_path IS NOT NULL")
+
+def migrate_queue_entry(conn):
+    # When a user last joined the waiting queue; discovery offers peers in
+    # this order. last_seen is the best guess for rows already waiting.
+    if not column_exists(conn, "profiles", "waiting_since"):
+        conn.execute("ALTER TABLE profiles ADD COLUMN waiting_since INTEGER")
+    conn.execute("UPDATE profiles SET waiting_since = last_seen WHERE status = 'waiting' AND waiting_since IS NULL")
+
+MIGRATIONS = [
+    (1, "base schema", migrate_base_schema),
+    (2, "query audit indexes", migrate_query_audit_indexes),
+    (3, "profile subjects", migrate_profile_subjects),
+    (4, "messages archive", migrate_messages_archive),
+    (5, "match events", migrate_match_events),
+    (6, "presence", migrate_presence),
+    (7, "sessions", migrate_sessions),
+    (8, "chat cursor", migrate_chat_cursor),
+    (9, "attachments", migrate_attachments),
+    (10, "queue entry", migrate_queue_entry),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+# =========================================================
+# INITIALIZE DATABASE
+# =========================================================
+def init_db(db_pool=None):
+    db_pool = db_pool or pool
+
+    # Warm start: a single primary-key read and nothing else.
+    with db_pool.connection() as conn:
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return
+
+    with _db_lock:
+        with db_pool.transaction() as conn:
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TEXT DEFAULT (datetime('now'))
+            )
+            """)
 
-        conn.commit()
+        for version, name, migrate in MIGRATIONS:
+            with db_pool.transaction() as conn:
+                # Re-read under the write lock: another worker may have
+                # migrated while we were waiting.
+                if schema_version(conn) >= version:
+                    continue
+                migrate(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                    (version, name)
+                )
 
 init_db()
@@ -0,0 +1,164 @@
+"""Single background writer that group-commits queued writes.
+
+Chat messages, ratings, streak updates and rematch requests are handed to
+one writer thread instead of each committing (and fsyncing) on its own
+script thread. The writer drains everything queued, lingers briefly for
+stragglers, and commits the whole batch in one transaction. Each write
+still gets its own savepoint, so a bad statement fails alone.
+
+Callers get a Future that resolves only after the batch is committed:
+
+    write("INSERT INTO messages ...", params)          # blocks until durable
+    fut = submit_write("UPDATE ...", params)           # fire now, check later
+
+The writer keeps its own connection, outside the pool, with
+``synchronous=FULL`` (WRITER_SYNCHRONOUS). The pooled "wal" profile runs
+at NORMAL, where a committed transaction can be lost on power failure;
+FULL syncs the WAL at every commit, so an acknowledged write survives it.
+Group commit keeps that to one sync per batch.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from database import pool
+
+WRITER_MAX_BATCH = 128
+WRITER_LINGER = 0.005      # seconds to wait for more writes before committing
+WRITER_TIMEOUT = 30.0
+WRITER_SYNCHRONOUS = "FULL"
+
+
+class WriteQueue:
+    def __init__(self, db_pool=pool, max_batch=WRITER_MAX_BATCH, linger=WRITER_LINGER):
+        self.db_pool = db_pool
+        self.max_batch = max_batch
+        self.linger = linger
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "batches": 0,
+            "writes": 0,
+            "failed": 0,
+            "largest_batch": 0,
+            "commit_time": 0.0,
+            "max_latency": 0.0,
+        }
+
+    # -----------------------------------------------------
+    # PUBLIC API
+    # -----------------------------------------------------
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="sahay-db-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, query, params=()):
+        """Queue a write. The Future's result is the statement's lastrowid."""
+        self.start()
+        future = Future()
+        self._queue.put((query, params, future, time.perf_counter()))
+        return future
+
+    def write(self, query, params=(), timeout=WRITER_TIMEOUT):
+        return self.submit(query, params).result(timeout)
+
+    def flush(self, timeout=WRITER_TIMEOUT):
+        """Block until everything queued before this call is committed."""
+        self.submit(None).result(timeout)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self.depth()
+        s["avg_batch"] = s["writes"] / s["batches"] if s["batches"] else 0.0
+        return s
+
+    # -----------------------------------------------------
+    # WRITER THREAD
+    # -----------------------------------------------------
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.linger
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self.db_pool.connect(synchronous=WRITER_SYNCHRONOUS)
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            results = []
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for query, params, future, _ in batch:
+                    if query is None:
+                        results.append((future, None, None))
+                        continue
+                    conn.execute("SAVEPOINT queued_write")
+                    try:
+                        cursor = conn.execute(query, params)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO queued_write")
+                        results.append((future, None, e))
+                    else:
+                        results.append((future, cursor.lastrowid, None))
+                    conn.execute("RELEASE queued_write")
+                conn.commit()
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                results = [(item[2], None, e) for item in batch]
+
+            finished = time.perf_counter()
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["writes"] += sum(1 for item in batch if item[0] is not None)
+                self._stats["failed"] += sum(1 for _, _, err in results if err)
+                self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+                self._stats["commit_time"] += finished - started
+                self._stats["max_latency"] = max(
+                    self._stats["max_latency"],
+                    max(finished - item[3] for item in batch)
+                )
+
+            for future, result, err in results:
+                if err is not None:
+                    future.set_exception(err)
+                else:
+                    future.set_result(result)
+
+
+writer = WriteQueue()
+
+def submit_write(query, params=()):
+    return writer.submit(query, params)
+
+def write(query, params=(), timeout=WRITER_TIMEOUT):
+    return writer.write(query, params, timeout)
+
+def flush_writes(timeout=WRITER_TIMEOUT):
+    writer.flush(timeout)
+
+def writer_stats():
+    return writer.stats()
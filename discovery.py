@@ -0,0 +1,233 @@
+"""Process-wide index of waiting profiles for peer discovery.
+
+Waiting users are bucketed by (time slot, subject, grade band) twice:
+under the subjects they can help with ("offers") and the subjects they
+need help with ("needs"). Finding a partner is then a handful of dict
+lookups: first someone who offers one of my weak subjects, then someone
+who needs one of my strong subjects. Each bucket keeps users in the order
+they joined the queue (profiles.waiting_since), so the longest-waiting
+compatible peer is found first.
+
+Every code path that moves a profile into or out of 'waiting' updates the
+index. The index also reloads from the database every INDEX_TTL seconds,
+which picks up changes made by other worker processes. Users whose last
+heartbeat (see presence.py) is older than PRESENCE_TTL are never offered
+as partners.
+"""
+import os
+import re
+import threading
+import time
+
+from database import get_connection
+from profiles import MENTOR_KINDS, load_profile_subjects
+
+INDEX_TTL = 60
+PRESENCE_TTL = int(os.environ.get("SAHAY_PRESENCE_TTL", 120))   # seconds without a heartbeat before a user is offline
+GRADE_BAND_SIZE = 3
+GRADE_BANDS = range(0, 10 // GRADE_BAND_SIZE + 1)
+
+
+def grade_band(grade):
+    nums = re.findall(r"\d+", str(grade or ""))
+    return (int(nums[0]) - 1) // GRADE_BAND_SIZE if nums else None
+
+
+def band_order(band):
+    """Own grade band first, then neighbours by distance, then ungraded."""
+    if band is None:
+        return (None, *GRADE_BANDS)
+    return (*sorted(GRADE_BANDS, key=lambda b: (abs(b - band), b)), None)
+
+
+class DiscoveryIndex:
+    def __init__(self, ttl=INDEX_TTL, presence_ttl=PRESENCE_TTL):
+        self.ttl = ttl
+        self.presence_ttl = presence_ttl
+        self.loaded_at = None
+        self._lock = threading.RLock()
+        self._offers = {}
+        self._needs = {}
+        self._entries = {}
+        self._profiles = {}
+        self._seen = {}
+        self._stats = {"lookups": 0, "hits": 0, "reloads": 0}
+
+    # -----------------------------------------------------
+    # MAINTENANCE
+    # -----------------------------------------------------
+    def add(self, user_id, time_slot, grade, subjects, last_seen=None):
+        """Register a waiting user; `subjects` maps kind -> list of subjects."""
+        band = grade_band(grade)
+        with self._lock:
+            self._remove_locked(user_id)
+            entries = []
+            for kind, values in subjects.items():
+                table = self._offers if kind in MENTOR_KINDS else self._needs
+                for subject in values:
+                    key = (time_slot, subject, band)
+                    table.setdefault(key, {})[user_id] = None
+                    entries.append((table, key))
+            self._entries[user_id] = entries
+            self._profiles[user_id] = (time_slot, grade, subjects)
+            self._seen[user_id] = last_seen or time.time()
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove_locked(user_id)
+
+    def _remove_locked(self, user_id):
+        self._profiles.pop(user_id, None)
+        self._seen.pop(user_id, None)
+        for table, key in self._entries.pop(user_id, ()):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.pop(user_id, None)
+                if not bucket:
+                    del table[key]
+
+    def reload(self):
+        profiles = {}
+        with get_connection() as conn:
+            rows = conn.execute("""
+                SELECT p.user_id, p.time, p.grade, p.last_seen, ps.subject, ps.kind
+                FROM profiles p
+                JOIN profile_subjects ps ON ps.user_id = p.user_id
+                WHERE p.status = 'waiting' AND p.last_seen >= ?
+                ORDER BY p.waiting_since, p.user_id
+            """, (int(time.time()) - self.presence_ttl,)).fetchall()
+        for user_id, time_slot, grade, last_seen, subject, kind in rows:
+            entry = profiles.setdefault(user_id, (time_slot, grade, last_seen, {}))
+            entry[3].setdefault(kind, []).append(subject)
+
+        with self._lock:
+            self._offers, self._needs, self._entries, self._profiles, self._seen = {}, {}, {}, {}, {}
+            for user_id, (time_slot, grade, last_seen, subjects) in profiles.items():
+                self.add(user_id, time_slot, grade, subjects, last_seen)
+            self.loaded_at = time.time()
+            self._stats["reloads"] += 1
+
+    def ensure_loaded(self):
+        if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+            with self._lock:
+                if self.loaded_at is None or time.time() - self.loaded_at > self.ttl:
+                    self.reload()
+
+    def sync_user(self, user_id):
+        """Re-read one user's status and subjects after a profile write."""
+        with get_connection() as conn:
+            row = conn.execute(
+                "SELECT status, time, grade, last_seen FROM profiles WHERE user_id=?", (user_id,)
+            ).fetchone()
+            subjects = load_profile_subjects(conn, user_id) if row else None
+        if row and row["status"] == "waiting":
+            self.add(user_id, row["time"], row["grade"], subjects, row["last_seen"])
+        else:
+            self.remove(user_id)
+
+    def stored_profile(self, user_id):
+        """(time_slot, grade, subjects) as saved, for a user who need not be waiting."""
+        with get_connection() as conn:
+            row = conn.execute("SELECT time, grade FROM profiles WHERE user_id=?", (user_id,)).fetchone()
+            return (row["time"], row["grade"], load_profile_subjects(conn, user_id)) if row else None
+
+    def touch(self, user_id, seen_at=None):
+        """Record a heartbeat for a user already in the index."""
+        with self._lock:
+            if user_id in self._seen:
+                self._seen[user_id] = seen_at or time.time()
+
+    # -----------------------------------------------------
+    # LOOKUP
+    # -----------------------------------------------------
+    def _fresh_since(self):
+        return time.time() - self.presence_ttl
+
+    def _iter(self, table, time_slot, subjects, band, exclude, skip=()):
+        fresh_since = self._fresh_since()
+        seen = set()
+        for subject in subjects:
+            for b in band_order(band):
+                for user_id in table.get((time_slot, subject, b), ()):
+                    if user_id == exclude or user_id in skip or user_id in seen:
+                        continue
+                    if self._seen.get(user_id, 0) >= fresh_since:
+                        seen.add(user_id)
+                        yield user_id
+
+    def find_candidates(self, user_id, time_slot, grade, subjects, limit=1, skip_mentors=()):
+        """Up to `limit` compatible peers as (peer_id, mentor_id), best first.
+
+        Peers who offer one of my weak subjects come first (they mentor me),
+        then peers who need one of my offered subjects (I mentor them).
+        Mentors in `skip_mentors` are left out on either side. With
+        ``limit=None`` every compatible peer is returned.
+        """
+        self.ensure_loaded()
+        band = grade_band(grade)
+        weak = subjects.get("weak", [])
+        offered = [s for kind in MENTOR_KINDS for s in subjects.get(kind, [])]
+        limit = float("inf") if limit is None else limit
+        found = []
+        with self._lock:
+            self._stats["lookups"] += 1
+            for peer in self._iter(self._offers, time_slot, weak, band, user_id, skip_mentors):
+                found.append((peer, peer))
+                if len(found) >= limit:
+                    break
+            if len(found) < limit and user_id not in skip_mentors:
+                taken = {peer for peer, _ in found}
+                for peer in self._iter(self._needs, time_slot, offered, band, user_id, taken):
+                    found.append((peer, user_id))
+                    if len(found) >= limit:
+                        break
+            if found:
+                self._stats["hits"] += 1
+        return found
+
+    def find_peer(self, user_id, time_slot, grade, subjects):
+        """Longest-waiting compatible peer for this user, or None."""
+        found = self.find_candidates(user_id, time_slot, grade, subjects)
+        return found[0][0] if found else None
+
+    def profile(self, user_id):
+        """(time_slot, grade, subjects) of an indexed user, or None."""
+        with self._lock:
+            return self._profiles.get(user_id)
+
+    def queue(self):
+        """Online waiting users as (user_id, time_slot, grade, subjects), earliest entries first."""
+        self.ensure_loaded()
+        with self._lock:
+            fresh_since = self._fresh_since()
+            return [
+                (user_id, *profile) for user_id, profile in self._profiles.items()
+                if self._seen.get(user_id, 0) >= fresh_since
+            ]
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["waiting"] = len(self._entries)
+            s["buckets"] = len(self._offers) + len(self._needs)
+        return s
+
+
+index = DiscoveryIndex()
+
+def load_discovery_profile(user_id):
+    """(time_slot, grade, subjects) for a user, or None without a profile."""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT time, grade FROM profiles WHERE user_id=?", (user_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return row["time"], row["grade"], load_profile_subjects(conn, user_id)
+
+def find_compatible_peer(user_id):
+    profile = load_discovery_profile(user_id)
+    if profile is None:
+        return None
+    time_slot, grade, subjects = profile
+    return index.find_peer(user_id, time_slot, grade, subjects)
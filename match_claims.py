@@ -0,0 +1,50 @@
+"""Atomic match claiming.
+
+A claim moves two profiles to 'confirming' under one fresh match id in a
+single UPDATE, inside a BEGIN IMMEDIATE transaction, and only succeeds if
+it changed exactly both rows. If the peer has already been taken (or the
+claimer has been matched by someone else in the meantime) nothing is
+written, so two scanners can never end up holding the same peer. A
+successful claim also registers the session (see session_registry.py).
+"""
+import uuid
+
+from database import pool
+from discovery import index as discovery_index
+from session_registry import register_session
+
+# Statuses from which a user may start a claim; the peer must be 'waiting'.
+CLAIMER_STATUSES = ("waiting", "active")
+
+
+def new_match_id(prefix="sess"):
+    return f"{prefix}_{uuid.uuid4().hex}"
+
+def claim_pair(conn, user_id, peer_id, match_id, claimer_statuses=CLAIMER_STATUSES):
+    """Claim both profiles inside an open transaction; True if both moved, else nothing changed."""
+    if user_id == peer_id:
+        return False
+    placeholders = ",".join("?" for _ in claimer_statuses)
+    conn.execute("SAVEPOINT match_claim")
+    cur = conn.execute(f"""
+        UPDATE profiles SET status='confirming', match_id=?, accepted=0
+        WHERE (user_id = ? AND status IN ({placeholders}))
+           OR (user_id = ? AND status = 'waiting')
+    """, (match_id, user_id, *claimer_statuses, peer_id))
+    if cur.rowcount == 2:
+        register_session(conn, match_id, user_id, peer_id)
+    else:
+        conn.execute("ROLLBACK TO match_claim")
+    conn.execute("RELEASE match_claim")
+    return cur.rowcount == 2
+
+def claim_match(user_id, peer_id, claimer_statuses=CLAIMER_STATUSES, db_pool=None):
+    """Atomically pair `user_id` with a waiting `peer_id`; returns the match id or None."""
+    match_id = new_match_id()
+    with (db_pool or pool).transaction() as conn:
+        claimed = claim_pair(conn, user_id, peer_id, match_id, claimer_statuses)
+    if not claimed:
+        return None
+    discovery_index.remove(user_id)
+    discovery_index.remove(peer_id)
+    return match_id
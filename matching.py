@@ -1,43 +1,50 @@
 import streamlit as st
-import time
 import os
+import time
 import json
 import sqlite3
 import requests
 import re  
-from database import DB_PATH
+from html import escape
+from attachments import blob_path, preview_path, read_blob, session_attachments, store as store_attachment
+from database import get_connection, transaction
+from db_writer import write
+from chat_archive import load_transcript
+from chat_sync import ChatCursor, fanout as chat_fanout, post_message
+from discovery import index as discovery_index
+from matchmaker import claim_next_candidate, matchmaker, matchmaker_stats
+from notify import bus as notify_bus, poll_events, publish
+from polling import session_poller
+from presence import heartbeat
+from session_registry import end_session, session_peer
 from ai_helper import ask_ai
 from streamlit_lottie import st_lottie
 
-# Ensure upload directory exists
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Confirmation handshake: seconds between bus checks, and before a full re-check
+CONFIRM_TICK = 1
+CONFIRM_TIMEOUT = 60
+
+# Live chat: seconds between chat ticks (cheap when nothing is new)
+CHAT_TICK = 1
+# Fragment ticks; each one only queries when its poller is due (see polling.py)
+WAITING_ROOM_TICK = 3
 
 # ---------------------------------------------------------
 # DATABASE HELPERS
 # ---------------------------------------------------------
-def get_db_connection():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
-
 def run_query(query, params=(), fetchone=False, fetchall=False, commit=False):
-    conn = get_db_connection()
     try:
-        conn.row_factory = sqlite3.Row 
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        if commit:
-            conn.commit()
-        if fetchone:
-            res = cursor.fetchone()
-            return dict(res) if res else None
-        if fetchall:
-            res = cursor.fetchall()
-            return [dict(row) for row in res] if res else []
+        with (transaction() if commit else get_connection()) as conn:
+            cursor = conn.execute(query, params)
+            if fetchone:
+                res = cursor.fetchone()
+                return dict(res) if res else None
+            if fetchall:
+                res = cursor.fetchall()
+                return [dict(row) for row in res] if res else []
     except sqlite3.OperationalError as e:
         st.error(f"Database Configuration Error: {e}")
         return None
-    finally:
-        conn.close()
 
 def load_lottieurl(url: str):
     try:
@@ -97,60 +104,142 @@ def show_discovery():
     st.title("Network Discovery")
     lottie_scan = load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_6p8ov98e.json")
     if lottie_scan: st_lottie(lottie_scan, height=200, key="scan")
-    st.write("Scanning for active peer nodes in the emerald network...")
-    if st.button("Initiate Discovery Scan"):
-        peer = run_query("""
-            SELECT p.user_id, a.name FROM profiles p 
-            JOIN auth_users a ON a.id = p.user_id 
-            WHERE p.status = 'waiting' AND p.user_id != ? LIMIT 1
-        """, (st.session_state.user_id,), fetchone=True)
-        if peer:
-            m_id = f"sess_{int(time.time())}"
-            st.session_state.peer_info = {"id": peer['user_id'], "name": peer['name']}
-            st.session_state.current_match_id = m_id
-            run_query("UPDATE profiles SET status='confirming', match_id=?, accepted=0 WHERE user_id=?", (m_id, st.session_state.user_id), commit=True)
-            run_query("UPDATE profiles SET status='confirming', match_id=?, accepted=0 WHERE user_id=?", (m_id, peer['user_id']), commit=True)
-            st.session_state.session_step = "confirmation"
+    res = run_query("SELECT status FROM profiles WHERE user_id=?", (st.session_state.user_id,), fetchone=True)
+    if not res:
+        st.info("Complete your learning profile on the dashboard to join matchmaking.")
+    elif res['status'] != 'waiting':
+        st.write("You are not in the matching queue right now.")
+        if st.button("Join Matching Queue"):
+            now = int(time.time())
+            run_query("UPDATE profiles SET status='waiting', match_id=NULL, accepted=0, last_seen=?, waiting_since=? WHERE user_id=?", (now, now, st.session_state.user_id), commit=True)
+            discovery_index.sync_user(st.session_state.user_id)
+            st.rerun()
+    else:
+        render_waiting_room()
+        if st.button("Leave Queue"):
+            run_query("UPDATE profiles SET status='active' WHERE user_id=? AND status='waiting'", (st.session_state.user_id,), commit=True)
+            discovery_index.sync_user(st.session_state.user_id)
+            matchmaker.scheduler.dequeue(st.session_state.user_id)
             st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
+@st.fragment(run_every=WAITING_ROOM_TICK)
+def render_waiting_room():
+    # The matchmaker writes the match; we only watch our own row.
+    heartbeat(st.session_state.user_id)
+    poller = session_poller(st.session_state, "waiting_room", st.session_state.user_name,
+                            min_interval=WAITING_ROOM_TICK)
+    if discovery_index.profile(st.session_state.user_id) is None:
+        # Matched or dropped from the queue in this process: look now.
+        poller.activity()
+    if poller.due():
+        res = run_query("SELECT status FROM profiles WHERE user_id=?", (st.session_state.user_id,), fetchone=True)
+        changed = bool(res and res['status'] != 'waiting')
+        poller.record(changed)
+        if changed:
+            # Matched by another worker, or reaped: this process stops the clock too.
+            matchmaker.scheduler.dequeue(st.session_state.user_id)
+            st.rerun(scope="app")
+    stats = matchmaker_stats()
+    waited = matchmaker.waiting_for(st.session_state.user_id)
+    st.write("Scanning for active peer nodes in the emerald network...")
+    c1, c2 = st.columns(2)
+    c1.metric("Peers in queue", stats["queue"])
+    c2.metric("You have waited", f"{int(waited or 0)}s")
+    if stats["time_to_match"]:
+        st.caption(f"Typical time to match: {int(stats['time_to_match']['p50'])}s")
+
 def show_confirmation():
     inject_emerald_theme()
     st.markdown("<div class='emerald-card'>", unsafe_allow_html=True)
     st.title("Connection Request")
     lottie_conn = load_lottieurl("https://assets10.lottiefiles.com/packages/lf20_pqnfmone.json")
     if lottie_conn: st_lottie(lottie_conn, height=150, key="conn")
+    m_id = st.session_state.current_match_id
     status_data = run_query("SELECT accepted FROM profiles WHERE user_id=?", (st.session_state.user_id,), fetchone=True)
-    peer_data = run_query("SELECT accepted FROM profiles WHERE user_id=?", (st.session_state.peer_info['id'],), fetchone=True)
+    peer_data = run_query("SELECT accepted, match_id FROM profiles WHERE user_id=?", (st.session_state.peer_info['id'],), fetchone=True)
     my_acc = status_data['accepted'] if status_data else 0
     peer_acc = peer_data['accepted'] if peer_data else 0
-    if my_acc == 1 and peer_acc == 1:
+    if not peer_data or peer_data['match_id'] != m_id:
+        leave_confirmation(m_id)
+        st.warning(f"{st.session_state.peer_info['name']} is no longer available.")
+        if st.button("Back to Discovery"):
+            st.rerun()
+    elif my_acc == 1 and peer_acc == 1:
+        notify_bus.forget(m_id)
+        st.session_state.pop("confirm_started", None)
         st.session_state.session_step = "live"
         st.rerun()
     elif my_acc == 1:
-        st.info(f"Synchronizing... Waiting for {st.session_state.peer_info['name']} to accept.")
-        time.sleep(2)
-        st.rerun()
+        await_peer_confirmation()
     else:
         st.write(f"Establish a secure learning link with **{st.session_state.peer_info['name']}**?")
         if st.button("Confirm Link"):
             run_query("UPDATE profiles SET accepted=1 WHERE user_id=?", (st.session_state.user_id,), commit=True)
+            publish(m_id, "accept", st.session_state.user_id)
             st.rerun()
         if st.button("Abort"):
-            run_query("UPDATE profiles SET status='active', match_id=NULL, accepted=0 WHERE user_id=?", (st.session_state.user_id,), commit=True)
-            st.session_state.session_step = "discovery"
+            declined = st.session_state.peer_info['id']
+            leave_confirmation(m_id)
+            publish(m_id, "abort", st.session_state.user_id)
+            # Offer the next-ranked waiting peer right away; matchmaking_page
+            # picks up the new 'confirming' row on rerun.
+            claim_next_candidate(st.session_state.user_id, skip=(declined,))
             st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
-@st.fragment(run_every=2)
+def leave_confirmation(m_id):
+    run_query("UPDATE profiles SET status='active', match_id=NULL, accepted=0 WHERE user_id=? AND match_id=?", (st.session_state.user_id, m_id), commit=True)
+    end_session(m_id)
+    notify_bus.forget(m_id)
+    st.session_state.session_step = "discovery"
+    st.session_state.pop("confirm_event_id", None)
+    st.session_state.pop("confirm_started", None)
+
+@st.fragment(run_every=CONFIRM_TICK)
+def await_peer_confirmation():
+    # One non-blocking look at the notification bus per tick; the database
+    # is only read when the poller is due, and no script thread is held
+    # between ticks.
+    m_id = st.session_state.current_match_id
+    peer = st.session_state.peer_info
+    st.info(f"Synchronizing... Waiting for {peer['name']} to accept.")
+    poller = session_poller(st.session_state, "confirmation", st.session_state.user_name)
+    started = st.session_state.setdefault("confirm_started", time.monotonic())
+    for event in poll_events(m_id, st.session_state.get("confirm_event_id", 0), poller=poller):
+        st.session_state.confirm_event_id = event["id"]
+        if event["user_id"] == peer['id'] and event["event"] in ("accept", "abort"):
+            # Re-run the page; show_confirmation reads the final state once.
+            st.rerun(scope="app")
+    if time.monotonic() - started >= CONFIRM_TIMEOUT:
+        # Re-check the database in case an event was missed.
+        st.session_state.pop("confirm_started")
+        st.rerun(scope="app")
+
+@st.fragment(run_every=CHAT_TICK)
 def render_live_chat():
-    msgs = run_query("SELECT sender, message FROM messages WHERE match_id=? ORDER BY created_ts ASC", 
-                    (st.session_state.current_match_id,), fetchall=True)
-    st.markdown('<div class="chat-scroll">', unsafe_allow_html=True)
-    for m in msgs:
-        cls = "bubble-me" if m['sender'] == st.session_state.user_name else "bubble-peer"
-        st.markdown(f'<div class="bubble {cls}"><b>{m["sender"]}</b><br>{m["message"]}</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+    # Only messages newer than the cursor are fetched; see chat_sync.py.
+    poller = session_poller(st.session_state, "chat", st.session_state.user_name, min_interval=CHAT_TICK)
+    cursor = st.session_state.get("chat_cursor")
+    if cursor is None or cursor.match_id != st.session_state.current_match_id:
+        cursor = st.session_state.chat_cursor = ChatCursor(st.session_state.current_match_id)
+        poller.activity()
+    elif cursor.behind():
+        poller.activity()
+    if poller.due():
+        poller.record(cursor.sync())
+    if cursor.has_older() and st.button("Load older messages", key="chat_load_older"):
+        cursor.load_older()
+    st.markdown(chat_html(cursor.visible(), st.session_state.user_name), unsafe_allow_html=True)
+
+def chat_html(messages, me):
+    # One pre-built element per tick instead of one per message.
+    bubbles = "".join(
+        f'<div class="bubble {"bubble-me" if m["sender"] == me else "bubble-peer"}">'
+        f'<b>{escape(m["sender"] or "")}</b><br>{escape(m["message"] or "")}</div>'
+        for m in messages
+    )
+    return f'<div class="chat-scroll">{bubbles}</div>'
 
 def show_live_session():
     inject_emerald_theme()
@@ -160,15 +249,45 @@ def show_live_session():
     msg = st.text_input("Data Entry", key="chat_input", label_visibility="collapsed")
     if st.button("Transmit Message"):
         if msg:
-            run_query("INSERT INTO messages (match_id, sender, message, created_ts) VALUES (?,?,?,?)",
-                     (st.session_state.current_match_id, st.session_state.user_name, msg, int(time.time())), commit=True)
+            post_message(st.session_state.current_match_id, st.session_state.user_name, msg)
+            session_poller(st.session_state, "chat").activity()
+            st.rerun()
+    up_file = st.file_uploader("Share a file", key="chat_upload")
+    if up_file and st.button("Send File"):
+        try:
+            digest = store_attachment(up_file, st.session_state.user_id, up_file.name, up_file.type)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            post_message(st.session_state.current_match_id, st.session_state.user_name, f"📎 {up_file.name}", file_path=digest)
+            session_poller(st.session_state, "chat").activity()
             st.rerun()
+    render_shared_files()
     st.divider()
     if st.button("Terminate Connection"):
+        end_session(st.session_state.current_match_id)
         st.session_state.session_step = "rating"
         st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
 
+def render_shared_files():
+    files = session_attachments(st.session_state.current_match_id)
+    if not files:
+        return
+    with st.expander(f"Shared files ({len(files)})"):
+        names = [f"{f['name'] or f['sha256'][:12]} ({f['size'] / 1024:.0f} KB)" for f in files]
+        picked = files[st.selectbox("File", range(len(files)), format_func=names.__getitem__, index=len(files) - 1)]
+        # Images show their downscaled preview; the original is only sent on download.
+        if picked["preview"]:
+            st.image(preview_path(picked["sha256"]))
+        digest = picked["sha256"]
+        if os.path.exists(blob_path(digest)):
+            # Read on click only, so reruns never load the original.
+            st.download_button("Download", lambda: read_blob(digest), file_name=picked["name"] or digest,
+                               mime=picked["content_type"], key=f"dl_{digest}")
+        else:
+            st.caption("This file is no longer available.")
+
 def show_rating():
     inject_emerald_theme()
     st.markdown("<div class='emerald-card'>", unsafe_allow_html=True)
@@ -180,11 +299,11 @@ def show_rating():
     feedback = st.text_area("Observation Notes")
     
     if st.button("Submit Report"):
-        run_query("INSERT INTO session_ratings (match_id, rater_id, rating, feedback) VALUES (?,?,?,?)",
-                 (st.session_state.current_match_id, st.session_state.user_id, rating, feedback), commit=True)
+        write("INSERT INTO session_ratings (match_id, rater_id, rating, feedback) VALUES (?,?,?,?)",
+              (st.session_state.current_match_id, st.session_state.user_id, rating, feedback))
         
         with st.spinner("Groq AI Generating Session Analytics..."):
-            msgs = run_query("SELECT sender, message FROM messages WHERE match_id=?", (st.session_state.current_match_id,), fetchall=True)
+            msgs = load_transcript(st.session_state.current_match_id)
             transcript = "\n".join([f"{m['sender']}: {m['message']}" for m in msgs]) if msgs else "No data."
             prompt = f"Analyze this study chat transcript: {transcript}. Provide a summary in [SUMMARY] tags and 3 MCQs in [QUIZ] tags."
             
@@ -224,8 +343,10 @@ def show_quiz():
     if st.session_state.get('quiz_done'):
         if st.button("Return to Discovery Mode"):
             run_query("UPDATE profiles SET status='active', match_id=NULL, accepted=0 WHERE user_id=?", (st.session_state.user_id,), commit=True)
+            end_session(st.session_state.get('current_match_id'))
+            chat_fanout.forget(st.session_state.get('current_match_id'))
             st.session_state.session_step = "discovery"
-            for key in ['session_summary', 'quiz_data', 'quiz_done', 'peer_info', 'current_match_id']:
+            for key in ['session_summary', 'quiz_data', 'quiz_done', 'peer_info', 'current_match_id', 'chat_cursor']:
                 if key in st.session_state: del st.session_state[key]
             st.rerun()
     st.markdown("</div>", unsafe_allow_html=True)
@@ -242,33 +363,26 @@ def matchmaking_page():
     
     # 2. Check for 'matched' status (This is the Rematch trigger)
     if res and res.get('status') == 'matched' and res.get('match_id'):
-        peer = run_query("""
-            SELECT a.name, p.user_id FROM profiles p 
-            JOIN auth_users a ON a.id = p.user_id 
-            WHERE p.match_id = ? AND p.user_id != ?
-        """, (res['match_id'], st.session_state.user_id), fetchone=True)
+        peer = session_peer(res['match_id'], st.session_state.user_id)
         
         if peer:
-            st.session_state.peer_info = {"id": peer['user_id'], "name": peer['name']}
+            st.session_state.peer_info = {"id": peer['peer_id'], "name": peer['name']}
             st.session_state.current_match_id = res['match_id']
             st.session_state.session_step = "live" # BYPASS directly to live session
         else:
             st.info("Waiting for your partner to join the session...")
             if st.button("Cancel & Return"):
                 run_query("UPDATE profiles SET status='active', match_id=NULL WHERE user_id=?", (st.session_state.user_id,), commit=True)
+                end_session(res['match_id'])
                 st.rerun()
             return
 
     # 3. Check for 'confirming' status (Standard discovery logic)
     elif res and res.get('status') == 'confirming' and st.session_state.session_step == "discovery":
-        peer = run_query("""
-            SELECT a.name, p.user_id FROM profiles p 
-            JOIN auth_users a ON a.id = p.user_id 
-            WHERE p.match_id = ? AND p.user_id != ?
-        """, (res['match_id'], st.session_state.user_id), fetchone=True)
+        peer = session_peer(res['match_id'], st.session_state.user_id)
         
         if peer:
-            st.session_state.peer_info = {"id": peer['user_id'], "name": peer['name']}
+            st.session_state.peer_info = {"id": peer['peer_id'], "name": peer['name']}
             st.session_state.current_match_id = res['match_id']
             st.session_state.session_step = "confirmation"
             st.rerun()
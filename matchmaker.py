@@ -0,0 +1,196 @@
+"""Background matchmaker.
+
+A daemon thread consumes the waiting queue held by the discovery index.
+Each tick collects up to CANDIDATES compatible peers per waiting user,
+lets the scheduler pick pairs by score and wait time within each
+mentor's capacity (see scheduler.py), and writes them with
+``claim_match``, so the matchmaker can run alongside batch rounds, or in
+several worker processes, without double-booking anyone. Pages only read
+their own profile status to find out they have been matched.
+
+When someone declines a match, ``claim_next_candidate`` reads every
+compatible waiting peer from profile_subjects, ranks them with
+``ranking.top_k`` and claims the best one still waiting, so they are
+offered the next partner without re-queueing. ``top_k_mentors`` returns the same ranking, mentors only,
+with score reasons.
+"""
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+from background import loop_stats, start_loop
+from discovery import index as discovery_index
+from match_claims import claim_match
+from profiles import MENTOR_KINDS, find_candidates
+from ranking import TOP_K, top_k
+from scheduler import MIN_SCORE, offered_subjects, pair_score, score_reasons, scheduler as match_scheduler
+
+MATCHMAKER_TICK = float(os.environ.get("SAHAY_MATCHMAKER_TICK", 1.0))  # seconds between passes
+LATENCY_WINDOW = 1000       # recent time-to-match samples kept for percentiles
+RATE_WINDOW = 60            # recent ticks used for the tick rate
+CANDIDATES = 5              # peers considered per waiting user and tick
+LOOP_NAME = "sahay-matchmaker"
+
+
+class Matchmaker:
+    def __init__(self, tick=MATCHMAKER_TICK, scheduler=match_scheduler):
+        self.tick = tick
+        self.scheduler = scheduler
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._tick_starts = deque(maxlen=RATE_WINDOW)
+        self._stats = {"ticks": 0, "matches": 0, "lost_claims": 0,
+                       "queue": 0, "last_tick_s": 0.0, "mentors_at_capacity": 0}
+
+    # -----------------------------------------------------
+    # MATCHING
+    # -----------------------------------------------------
+    def run_tick(self):
+        """One pass over the queue; returns the number of pairs written."""
+        started = time.time()
+        queue = discovery_index.queue()
+        waiting = {user_id for user_id, *_ in queue}
+        self.scheduler.observe(waiting, started)
+
+        profiles = {user_id: profile for user_id, *profile in queue}
+        saturated = self.scheduler.saturated(started)
+        candidates = []
+        for user_id, (time_slot, grade, subjects) in profiles.items():
+            found = discovery_index.find_candidates(
+                user_id, time_slot, grade, subjects, limit=CANDIDATES, skip_mentors=saturated
+            )
+            for peer_id, mentor_id in found:
+                peer = profiles.get(peer_id) or discovery_index.profile(peer_id)
+                if peer is None:
+                    continue
+                me = profiles[user_id]
+                mentee_id, mentee, mentor = (peer_id, peer, me) if mentor_id == user_id else (user_id, me, peer)
+                candidates.append((mentee_id, mentor_id, pair_score(mentee, mentor)))
+
+        matched = set()
+        for mentee_id, mentor_id, _ in self.scheduler.plan(candidates, started):
+            if claim_match(mentee_id, mentor_id, claimer_statuses=("waiting",)):
+                now = time.time()
+                self.scheduler.record_session(mentor_id, now)
+                for uid in (mentee_id, mentor_id):
+                    matched.add(uid)
+                    self._latencies.append(self.scheduler.dequeue(uid, now))
+            else:
+                # One of them moved on since the index last saw them.
+                with self._lock:
+                    self._stats["lost_claims"] += 1
+                self.resync(mentee_id, mentor_id)
+
+        with self._lock:
+            self._stats["ticks"] += 1
+            self._stats["matches"] += len(matched) // 2
+            self._stats["queue"] = len(waiting) - len(matched)
+            self._stats["last_tick_s"] = time.time() - started
+            self._stats["mentors_at_capacity"] = len(saturated)
+            self._tick_starts.append(started)
+        return len(matched) // 2
+
+    def rank_candidates(self, user_id, k=TOP_K, skip=(), mentors_only=False):
+        """The k best (peer_id, mentor_id, score, reasons) for `user_id`, best first.
+
+        Every compatible online waiting peer is read with
+        ``profiles.find_candidates``, an index seek on profile_subjects,
+        so peers queued by other workers count before the next index
+        reload. They are scored with ``score_reasons`` and ranked with
+        ``top_k``; peers in `skip` and mentors at capacity are left out.
+        With `mentors_only`, only peers who would mentor the user are ranked.
+        """
+        me = discovery_index.stored_profile(user_id)
+        if me is None:
+            return []
+        time_slot, _, subjects = me
+        fresh_since = time.time() - discovery_index.presence_ttl
+        saturated = self.scheduler.saturated()
+        found = []
+        mentors = find_candidates(subjects.get("weak", []), time_slot, MENTOR_KINDS, fresh_since, user_id)
+        found += [(peer_id, peer_id, peer) for peer_id, peer in mentors.items() if peer_id not in saturated]
+        if not mentors_only and user_id not in saturated:
+            mentees = find_candidates(offered_subjects(subjects), time_slot, ("weak",), fresh_since, user_id)
+            found += [(peer_id, user_id, peer) for peer_id, peer in mentees.items() if peer_id not in mentors]
+
+        def score(candidate):
+            peer_id, mentor_id, peer = candidate
+            mentee, mentor = (peer, me) if mentor_id == user_id else (me, peer)
+            return score_reasons(mentee, mentor)
+
+        return [(peer_id, mentor_id, value, reasons)
+                for (peer_id, mentor_id, _), value, reasons
+                in top_k((c for c in found if c[0] not in skip), score, k, MIN_SCORE)]
+
+    def claim_next(self, user_id, skip=(), k=TOP_K):
+        """Claim the best-ranked waiting peer for `user_id`, other than `skip`.
+
+        Candidates come from ``rank_candidates``; the first that can still
+        be claimed wins. Returns (match_id, peer_id) or None.
+        """
+        for peer_id, mentor_id, _, _ in self.rank_candidates(user_id, k, skip):
+            match_id = claim_match(user_id, peer_id)
+            if match_id:
+                self.scheduler.record_session(mentor_id)
+                self.scheduler.dequeue(peer_id)
+                return match_id, peer_id
+            self.resync(peer_id)
+        return None
+
+    def resync(self, *user_ids):
+        """Re-read users after a lost claim; those no longer waiting leave the queue."""
+        for user_id in user_ids:
+            discovery_index.sync_user(user_id)
+            if discovery_index.profile(user_id) is None:
+                self.scheduler.dequeue(user_id)
+
+    def start(self):
+        """Start the matchmaker thread once per process."""
+        return start_loop(LOOP_NAME, self.run_tick, self.tick)
+
+    # -----------------------------------------------------
+    # METRICS
+    # -----------------------------------------------------
+    def waiting_for(self, user_id):
+        """Seconds this user has been in the queue as seen by the matchmaker."""
+        return self.scheduler.waited(user_id)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            starts = list(self._tick_starts)
+            latencies = sorted(self._latencies)
+        s["tick_rate"] = (len(starts) - 1) / (starts[-1] - starts[0]) if len(starts) > 1 and starts[-1] > starts[0] else 0.0
+        loop = loop_stats().get(LOOP_NAME)
+        s["running"] = bool(loop and loop["running"])
+        s["errors"] = loop["failures"] if loop else 0
+        if len(latencies) >= 2:
+            cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+            s["time_to_match"] = {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98], "samples": len(latencies)}
+        else:
+            s["time_to_match"] = None
+        return s
+
+
+matchmaker = Matchmaker()
+
+def start_matchmaker():
+    matchmaker.start()
+
+def matchmaker_stats():
+    return matchmaker.stats()
+
+def claim_next_candidate(user_id, skip=()):
+    return matchmaker.claim_next(user_id, skip)
+
+def top_k_mentors(mentee_id, k=TOP_K):
+    """The k best waiting mentors for a user as (mentor_id, score, reasons), best first.
+
+    This is the ``top_k_mentors(mentee, k)`` entry point for the live app:
+    the mentee is a user id, since profiles are loaded from the database.
+    ``ranking.top_k_mentors`` is the form app6 uses on its mentor dicts.
+    """
+    return [(mentor_id, score, reasons)
+            for _, mentor_id, score, reasons in matchmaker.rank_candidates(mentee_id, k, mentors_only=True)]
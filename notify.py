@@ -0,0 +1,116 @@
+"""Match notification bus.
+
+Sessions waiting on their partner (the confirmation handshake) look for
+events keyed by match id instead of re-querying both profiles. ``poll``
+never blocks: the confirmation fragment calls it once per tick and gets
+the events published in this process from memory. Every event is also
+written to ``match_events``; a poller that hasn't heard of it in-process
+checks that table every NOTIFY_DB_POLL seconds, which covers partners
+served by another worker process.
+
+Event ids are the ``match_events`` row ids, so in-process and database
+events share one ordering and ``poll(match_id, after_id)`` works for both.
+A caller can pass its own ``AdaptivePoller`` (see polling.py) to schedule
+the database checks instead of the fixed interval.
+"""
+import os
+import threading
+import time
+
+from database import pool
+
+NOTIFY_DB_POLL = float(os.environ.get("SAHAY_NOTIFY_DB_POLL", 2.0))  # 0 disables the fallback
+EVENTS_PER_MATCH = 50       # recent events kept in memory per match
+EVENT_TTL = 86_400          # seconds before persisted events are pruned
+PRUNE_EVERY = 500           # publishes between prunes
+
+
+class NotificationBus:
+    def __init__(self, db_pool=pool, db_poll=NOTIFY_DB_POLL):
+        self.db_pool = db_pool
+        self.db_poll = db_poll
+        self._lock = threading.Lock()
+        self._events = {}
+        self._db_checked = {}
+        self._published = 0
+
+    def _remember(self, match_id, events):
+        known = self._events.setdefault(match_id, [])
+        seen = {e["id"] for e in known}
+        known.extend(e for e in events if e["id"] not in seen)
+        known.sort(key=lambda e: e["id"])
+        del known[:-EVENTS_PER_MATCH]
+
+    def publish(self, match_id, event, user_id=None):
+        """Record an event for every session polling this match."""
+        now = int(time.time())
+        with self._lock:
+            self._published += 1
+            prune = self._published % PRUNE_EVERY == 0
+        with self.db_pool.transaction() as conn:
+            event_id = conn.execute(
+                "INSERT INTO match_events (match_id, event, user_id, created_ts) VALUES (?, ?, ?, ?)",
+                (match_id, event, user_id, now)
+            ).lastrowid
+            if prune:
+                conn.execute("DELETE FROM match_events WHERE created_ts < ?", (now - EVENT_TTL,))
+        record = {"id": event_id, "match_id": match_id, "event": event, "user_id": user_id, "created_ts": now}
+        with self._lock:
+            self._remember(match_id, [record])
+        return event_id
+
+    def _load(self, match_id, after_id):
+        with self.db_pool.connection() as conn:
+            rows = conn.execute("""
+                SELECT id, match_id, event, user_id, created_ts
+                FROM match_events
+                WHERE match_id = ? AND id > ?
+                ORDER BY id
+            """, (match_id, after_id)).fetchall()
+        return [dict(r) for r in rows]
+
+    def _pending(self, match_id, after_id):
+        return [e for e in self._events.get(match_id, ()) if e["id"] > after_id]
+
+    def _db_due_in(self, match_id, poller):
+        """Seconds until the next database check for this poller; call with the lock held."""
+        if poller is None:
+            return self._db_checked.get(match_id, 0) + self.db_poll - time.monotonic()
+        return poller.next_poll - time.monotonic()
+
+    def _check_db(self, match_id, after_id, poller):
+        events = self._load(match_id, after_id)
+        if poller is not None:
+            poller.record(len(events))
+        if events:
+            with self._lock:
+                self._remember(match_id, events)
+        return events
+
+    def poll(self, match_id, after_id=0, poller=None):
+        """Events for `match_id` newer than `after_id`, without blocking.
+
+        The database is only read when nothing is pending in memory and a
+        check is due.
+        """
+        with self._lock:
+            events = self._pending(match_id, after_id)
+            if events or self.db_poll <= 0 or self._db_due_in(match_id, poller) > 0:
+                return events
+            self._db_checked[match_id] = time.monotonic()
+        return self._check_db(match_id, after_id, poller)
+
+    def forget(self, match_id):
+        """Drop in-memory state for a finished handshake."""
+        with self._lock:
+            self._events.pop(match_id, None)
+            self._db_checked.pop(match_id, None)
+
+
+bus = NotificationBus()
+
+def publish(match_id, event, user_id=None):
+    return bus.publish(match_id, event, user_id)
+
+def poll_events(match_id, after_id=0, poller=None):
+    return bus.poll(match_id, after_id, poller)
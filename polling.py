@@ -0,0 +1,83 @@
+"""Adaptive polling for auto-refreshing fragments.
+
+Fragments rerun on a fixed timer (Streamlit only applies a new
+``run_every`` when the whole page reruns), but a rerun only queries the
+database when its ``AdaptivePoller`` is due. A poll that finds something,
+or local activity such as sending a message, resets the interval to the
+poller's minimum; every empty poll multiplies it by POLL_BACKOFF, up to
+its cap. In-process signals (the chat fanout, the discovery index) count
+as activity, so only changes made by another worker process wait for a
+backed-off poll.
+
+Each poller counts its polls and how many came back empty;
+``poller_stats`` lists the live ones for the admin page.
+"""
+import os
+import threading
+import time
+import weakref
+
+POLL_BACKOFF = 2.0
+POLL_MAX = float(os.environ.get("SAHAY_POLL_MAX", 15.0))   # default cap, seconds between idle polls
+
+_live = weakref.WeakSet()
+_live_lock = threading.Lock()
+
+
+class AdaptivePoller:
+    def __init__(self, name, owner=None, min_interval=1.0, max_interval=POLL_MAX, backoff=POLL_BACKOFF):
+        self.name = name
+        self.owner = owner
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = backoff
+        self.interval = min_interval
+        self.next_poll = 0.0
+        self.polls = 0
+        self.empty = 0
+        with _live_lock:
+            _live.add(self)
+
+    def due(self, now=None):
+        return (now or time.monotonic()) >= self.next_poll
+
+    def record(self, found, now=None):
+        """Account for a poll that returned `found` items and schedule the next one."""
+        now = now or time.monotonic()
+        self.polls += 1
+        if found:
+            self.interval = self.min_interval
+        else:
+            self.empty += 1
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        self.next_poll = now + self.interval
+
+    def activity(self, now=None):
+        """Local input or an in-process signal: poll now, and fast again."""
+        self.interval = self.min_interval
+        self.next_poll = now or time.monotonic()
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "polls": self.polls,
+            "empty": self.empty,
+            "empty_fraction": self.empty / self.polls if self.polls else 0.0,
+            "interval": self.interval,
+        }
+
+
+def session_poller(state, name, owner=None, **kwargs):
+    """The poller called `name` in a session-state mapping, created on first use."""
+    pollers = state.setdefault("pollers", {})
+    poller = pollers.get(name)
+    if poller is None:
+        poller = pollers[name] = AdaptivePoller(name, owner, **kwargs)
+    return poller
+
+def poller_stats():
+    """Stats of every poller still held by a live session, busiest first."""
+    with _live_lock:
+        live = list(_live)
+    return sorted((p.stats() for p in live), key=lambda s: -s["polls"])
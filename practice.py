@@ -3,7 +3,7 @@ import re
 import time
 import requests
 from practice_data import PRACTICE_DATA
-from database import cursor
+from database import get_connection
 from streak import init_streak, update_streak
 from streamlit_lottie import st_lottie
 
@@ -70,8 +70,8 @@ def inject_emerald_practice_styles():
     """, unsafe_allow_html=True)
 
 def get_normalized_class_level(user_id):
-    cursor.execute("SELECT class_level, grade FROM profiles WHERE user_id = ?", (user_id,))
-    row = cursor.fetchone()
+    with get_connection() as conn:
+        row = conn.execute("SELECT class_level, grade FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
     if not row: return None
     class_level_raw, grade_str = row
     if class_level_raw is not None and str(class_level_raw).isdigit():
@@ -99,8 +99,8 @@ def practice_page():
         return
 
     class_level = get_normalized_class_level(st.session_state.user_id)
-    cursor.execute("SELECT role FROM profiles WHERE user_id = ?", (st.session_state.user_id,))
-    role_row = cursor.fetchone()
+    with get_connection() as conn:
+        role_row = conn.execute("SELECT role FROM profiles WHERE user_id = ?", (st.session_state.user_id,)).fetchone()
     role = role_row[0] if role_row else "Student"
 
     if class_level is None and role == "Student":
@@ -0,0 +1,64 @@
+"""Heartbeat-based presence.
+
+Pages call ``heartbeat(user_id)`` on every run; at most one write per user
+per HEARTBEAT_INTERVAL reaches the database, through the write queue, as
+an update of ``profiles.last_seen``. Discovery only offers users seen
+within PRESENCE_TTL (see discovery.py), and a background reaper takes
+users who stopped sending heartbeats out of 'waiting' so they don't
+clutter the queue.
+"""
+import threading
+import time
+
+from background import start_loop
+from database import transaction
+from db_writer import submit_write
+from discovery import PRESENCE_TTL, index as discovery_index
+from scheduler import scheduler as match_scheduler
+
+HEARTBEAT_INTERVAL = 30     # seconds between last_seen writes per user
+REAP_INTERVAL = 60          # seconds between reaper passes
+
+_last_beat = {}
+_beat_lock = threading.Lock()
+
+# =========================================================
+# HEARTBEATS
+# =========================================================
+def heartbeat(user_id, now=None):
+    """Mark a user as online; returns True if this call wrote last_seen."""
+    if user_id is None:
+        return False
+    now = int(now or time.time())
+    with _beat_lock:
+        if now - _last_beat.get(user_id, 0) < HEARTBEAT_INTERVAL:
+            return False
+        _last_beat[user_id] = now
+    submit_write("UPDATE profiles SET last_seen=? WHERE user_id=?", (now, user_id))
+    discovery_index.touch(user_id, now)
+    return True
+
+# =========================================================
+# REAPER
+# =========================================================
+def reap_stale_waiting(ttl=PRESENCE_TTL, now=None):
+    """Move waiting users without a recent heartbeat to 'active'; returns their ids."""
+    cutoff = int(now or time.time()) - ttl
+    with transaction() as conn:
+        stale = [row[0] for row in conn.execute(
+            "SELECT user_id FROM profiles WHERE status='waiting' AND last_seen < ?", (cutoff,)
+        )]
+        conn.execute(
+            "UPDATE profiles SET status='active' WHERE status='waiting' AND last_seen < ?", (cutoff,)
+        )
+    for user_id in stale:
+        discovery_index.remove(user_id)
+        match_scheduler.dequeue(user_id)
+    with _beat_lock:
+        for user_id in stale:
+            _last_beat.pop(user_id, None)
+    return stale
+
+def start_reaper(interval=REAP_INTERVAL):
+    """Start the presence reaper once per process."""
+    return start_loop("sahay-presence-reaper", reap_stale_waiting, interval)
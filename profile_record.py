@@ -0,0 +1,153 @@
+"""Pre-parsed profiles for the language/subject/grade/topic scorer.
+
+``calculate_match_score`` (used by app.py and sahay.py) re-splits the
+comma-joined language and subject strings and re-parses both grades on
+every comparison. A ``Profile`` does that parsing once, when the profile
+is saved or loaded: languages and subjects become bitmasks over a shared
+vocabulary, the grade an int and the time slot an id, so scoring is a few
+integer ANDs and compares. ``score_profiles`` returns exactly what
+``calculate_match_score`` returns for the same two dicts.
+
+Parsing costs more than one dict comparison, so rows fetched on every
+search go through ``load_record``, which keeps one record per row id.
+Cached records don't hold on to their source row; ``best_match_index``
+says which of the fetched rows won.
+"""
+import threading
+from collections import OrderedDict
+
+RECORD_CACHE_SIZE = 100_000
+
+# =========================================================
+# VOCABULARIES
+# =========================================================
+class Vocabulary:
+    """Token -> bit position, shared by every profile in the process.
+
+    Session threads parse profiles concurrently; new tokens are numbered
+    under a lock so two of them never share a bit.
+    """
+
+    def __init__(self):
+        self.bits = {}
+        self._lock = threading.Lock()
+
+    def bit(self, token):
+        bit = self.bits.get(token)
+        if bit is None:
+            with self._lock:
+                bit = self.bits.setdefault(token, len(self.bits))
+        return bit
+
+    def mask(self, tokens):
+        mask = 0
+        for token in tokens:
+            mask |= 1 << self.bit(token)
+        return mask
+
+
+LANGUAGES = Vocabulary()
+SUBJECTS = Vocabulary()
+SLOTS = Vocabulary()
+
+
+def parse_tokens(value):
+    if isinstance(value, (list, tuple, set)):
+        value = ",".join(value)
+    return {x.strip() for x in (value or "").split(",") if x.strip()}
+
+def parse_grade(value):
+    """'Grade 7' -> 7; None when the scorer would fail to parse it."""
+    try:
+        return int(value.split(" ")[1])
+    except Exception:
+        return None
+
+# =========================================================
+# RECORD
+# =========================================================
+class Profile:
+    __slots__ = ("row", "name", "role", "time_slot", "slot", "grade", "student",
+                 "languages", "subjects", "topic")
+
+    @classmethod
+    def from_dict(cls, row, keep_row=True):
+        p = cls()
+        p.row = row if keep_row else None
+        p.name = row.get("name")
+        p.role = row.get("role")
+        p.time_slot = row.get("time_slot")
+        p.slot = SLOTS.bit(p.time_slot)
+        p.grade = parse_grade(row.get("grade"))
+        # The grade rule needs a role key; a missing one disables it, like the KeyError did.
+        p.student = (row["role"] == "Student") if "role" in row else None
+        p.languages = LANGUAGES.mask(parse_tokens(row.get("languages")))
+        p.subjects = SUBJECTS.mask(parse_tokens(row.get("subjects")))
+        p.topic = (row.get("specific_topics") or "").lower()
+        return p
+
+    def __repr__(self):
+        return f"Profile({self.name!r}, {self.role!r}, {self.time_slot!r})"
+
+
+_records = OrderedDict()
+_records_lock = threading.Lock()
+
+def load_record(row):
+    """Profile for a fetched profiles row, parsed once per (id, created_at).
+
+    Profile rows are inserted and deleted but never edited, so the id
+    identifies the scoring fields. Rows without an id are parsed each time.
+    The record does not keep `row`.
+    """
+    if row.get("id") is None:
+        return Profile.from_dict(row, keep_row=False)
+    key = (row["id"], row.get("created_at"))
+    with _records_lock:
+        record = _records.get(key)
+        if record is not None:
+            _records.move_to_end(key)
+            return record
+    record = Profile.from_dict(row, keep_row=False)
+    with _records_lock:
+        _records[key] = record
+        if len(_records) > RECORD_CACHE_SIZE:
+            _records.popitem(last=False)
+    return record
+
+# =========================================================
+# SCORING
+# =========================================================
+def score_profiles(me, candidate):
+    if not me.languages & candidate.languages:
+        return 0
+    score = 20
+    if not me.subjects & candidate.subjects:
+        return 0
+    score += 40
+
+    if me.grade is not None and candidate.grade is not None and me.student is not None:
+        diff = candidate.grade - me.grade
+        if me.student:
+            if diff > 0: score += 30
+            elif diff == 0: score += 15
+        elif diff < 0:
+            score += 30
+
+    if me.topic and candidate.topic and (me.topic in candidate.topic or candidate.topic in me.topic):
+        score += 25
+    return score
+
+def best_match_index(me, candidates):
+    """Position of the first candidate with the highest positive score, or None."""
+    best, high_score = None, 0
+    for i, p in enumerate(candidates):
+        s = score_profiles(me, p)
+        if s > high_score:
+            high_score, best = s, i
+    return best
+
+def best_match(me, candidates):
+    """First candidate with the highest positive score, or None."""
+    i = best_match_index(me, candidates)
+    return None if i is None else candidates[i]
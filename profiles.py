@@ -0,0 +1,72 @@
+import time
+
+from database import get_connection, transaction
+
+# Maps profile_subjects.kind to the comma-joined profiles column it mirrors.
+SUBJECT_KINDS = {
+    "strong": "strong_subjects",
+    "weak": "weak_subjects",
+    "teaches": "teaches",
+}
+
+# Kinds that make someone able to help with a subject.
+MENTOR_KINDS = ("teaches", "strong")
+
+# =========================================================
+# WRITE PATH
+# =========================================================
+def sync_profile_subjects(conn, user_id, strong, weak, teaches):
+    """Rewrite a user's profile_subjects rows; call inside the profile save transaction."""
+    conn.execute("DELETE FROM profile_subjects WHERE user_id=?", (user_id,))
+    rows = [
+        (user_id, subject, kind)
+        for kind, subjects in (("strong", strong), ("weak", weak), ("teaches", teaches))
+        for subject in dict.fromkeys(s.strip() for s in subjects if s.strip())
+    ]
+    conn.executemany(
+        "INSERT INTO profile_subjects (user_id, subject, kind) VALUES (?, ?, ?)",
+        rows
+    )
+
+def save_profile(user_id, role, grade, time_slot, strong, weak, teaches):
+    now = int(time.time())
+    with transaction() as conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO profiles (user_id, role, grade, time, strong_subjects, weak_subjects, teaches, status, last_seen, waiting_since)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'waiting', ?, ?)
+        """, (user_id, role, grade, time_slot, ",".join(strong), ",".join(weak), ",".join(teaches), now, now))
+        sync_profile_subjects(conn, user_id, strong, weak, teaches)
+
+# =========================================================
+# READ PATH
+# =========================================================
+def load_profile_subjects(conn, user_id):
+    """Return {'strong': [...], 'weak': [...], 'teaches': [...]} for one user."""
+    subjects = {kind: [] for kind in SUBJECT_KINDS}
+    for subject, kind in conn.execute(
+        "SELECT subject, kind FROM profile_subjects WHERE user_id=?", (user_id,)
+    ):
+        subjects[kind].append(subject)
+    return subjects
+
+def find_candidates(subjects, time_slot, kinds=MENTOR_KINDS, fresh_since=0, exclude_user=None):
+    """Online waiting users with any of `subjects` under any of `kinds`, available in `time_slot`.
+
+    Returns {user_id: (time_slot, grade, subjects)}. Resolved with index
+    seeks on profile_subjects(subject, kind) followed by primary-key
+    lookups into profiles; the CROSS JOIN keeps profile_subjects outermost.
+    """
+    subjects = list(dict.fromkeys(subjects))
+    if not subjects:
+        return {}
+    subject_marks = ",".join("?" for _ in subjects)
+    kind_marks = ",".join("?" for _ in kinds)
+    with get_connection() as conn:
+        rows = conn.execute(f"""
+            SELECT DISTINCT p.user_id, p.time, p.grade
+            FROM profile_subjects ps
+            CROSS JOIN profiles p ON p.user_id = ps.user_id
+            WHERE ps.subject IN ({subject_marks}) AND ps.kind IN ({kind_marks})
+              AND p.time = ? AND p.status = 'waiting' AND p.last_seen >= ? AND p.user_id != ?
+        """, (*subjects, *kinds, time_slot, int(fresh_since), exclude_user or -1)).fetchall()
+        return {row[0]: (row[1], row[2], load_profile_subjects(conn, row[0])) for row in rows}
@@ -0,0 +1,252 @@
+"""EXPLAIN QUERY PLAN audit for every SQL statement in the app.
+
+Statements are collected straight from the source: any string literal
+passed to ``execute``/``executemany``/``run_query`` or to the ``db_writer``
+queue. Each one is planned against a freshly migrated, seeded scratch
+database, and the plan is checked for full-table scans, automatic indexes,
+temp B-trees and correlated subqueries.
+
+    python query_audit.py            # report, exit 1 on unexpected findings
+    python query_audit.py --all      # also list allowed findings
+
+Findings that are expected (e.g. a COUNT(*) over a whole table) are listed
+in ALLOWED, keyed by file, function and plan line, with a reason; anything
+else fails the run, so a new query cannot silently regress.
+"""
+import argparse
+import ast
+import glob
+import os
+import sys
+import tempfile
+
+from database import ConnectionPool, init_db
+
+SQL_CALLS = {"execute", "executemany", "run_query", "write", "submit_write"}
+SQL_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+SKIP_FILES = {"query_audit.py"}
+SKIP_PREFIXES = ("bench_",)
+
+# (file, function, plan detail) -> reason
+ALLOWED = {
+    ("admin.py", "render_admin_panel", "SCAN profiles"):
+        "student/teacher totals count every profile",
+    ("admin.py", "render_admin_panel", "SCAN session_ratings"):
+        "sessions-rated total counts every rating",
+    ("admin.py", "render_admin_panel", "SCAN a"):
+        "user directory and leaderboard list every user",
+    ("admin.py", "render_admin_panel", "CORRELATED SCALAR SUBQUERY 1"):
+        "per-user average rating in the user directory",
+    ("admin.py", "render_admin_panel", "USE TEMP B-TREE FOR ORDER BY"):
+        "per-user feedback is sorted after the match join; leaderboard is ordered by an aggregate",
+    ("app6.py", "load_users", "no such column: p.class"):
+        "legacy entry point; profiles.class was never migrated",
+    ("app6.py", "<module>", "table profiles has no column named class"):
+        "legacy entry point; profiles.class was never migrated",
+    ("app6.py", "<module>", "no such table: ratings"):
+        "legacy entry point; the ratings table does not exist",
+    ("attachments.py", "collect_orphans", "CORRELATED SCALAR SUBQUERY 1"):
+        "reference check per expired blob, an index lookup on messages.file_path",
+    ("attachments.py", "collect_orphans", "CORRELATED SCALAR SUBQUERY 2"):
+        "reference check per expired blob, an index lookup on messages_archive.file_path",
+    ("attachments.py", "storage_stats", "SCAN attachments"):
+        "storage totals on the admin page cover every blob",
+    ("attachments.py", "sweep_stray_files", "SCAN attachments"):
+        "stray-file sweep loads every known digest once per pass",
+    ("database.py", "migrate_profile_subjects", "SCAN profiles"):
+        "one-off backfill of profile_subjects",
+    ("database.py", "migrate_presence", "SCAN profiles"):
+        "one-off backfill of last_seen",
+    ("database.py", "migrate_sessions", "no such table: backfill_pairs"):
+        "temp table that only exists while the sessions backfill runs",
+    ("database.py", "migrate_sessions", "SCAN sessions"):
+        "one-off close-out of backfilled sessions",
+    ("discovery.py", "reload", "USE TEMP B-TREE FOR ORDER BY"):
+        "index reload sorts the online waiting users by queue entry once per INDEX_TTL",
+}
+
+
+class Statement:
+    def __init__(self, file, function, line, sql):
+        self.file = file
+        self.function = function
+        self.line = line
+        self.sql = sql
+
+
+class Finding:
+    def __init__(self, statement, kind, detail):
+        self.statement = statement
+        self.kind = kind
+        self.detail = detail
+
+    @property
+    def key(self):
+        return (self.statement.file, self.statement.function, self.detail)
+
+    @property
+    def allowed(self):
+        return self.key in ALLOWED
+
+
+# ---------------------------------------------------------
+# COLLECTION
+# ---------------------------------------------------------
+class _Collector(ast.NodeVisitor):
+    def __init__(self, file):
+        self.file = file
+        self.stack = ["<module>"]
+        self.statements = []
+
+    def visit_FunctionDef(self, node):
+        self.stack.append(node.name)
+        self.generic_visit(node)
+        self.stack.pop()
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        func = node.func
+        name = func.attr if isinstance(func, ast.Attribute) else getattr(func, "id", None)
+        if name in SQL_CALLS and node.args:
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                sql = " ".join(arg.value.split())
+                if sql.upper().startswith(SQL_VERBS):
+                    self.statements.append(
+                        Statement(self.file, self.stack[-1], node.lineno, sql)
+                    )
+        self.generic_visit(node)
+
+
+def collect_statements(root="."):
+    statements = []
+    for path in sorted(glob.glob(os.path.join(root, "*.py"))):
+        file = os.path.basename(path)
+        if file in SKIP_FILES or file.startswith(SKIP_PREFIXES):
+            continue
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        collector = _Collector(file)
+        collector.visit(tree)
+        statements.extend(collector.statements)
+    return statements
+
+
+# ---------------------------------------------------------
+# SEEDED DATABASE
+# ---------------------------------------------------------
+def seed(db_pool, users=200):
+    with db_pool.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO auth_users (name, email, password) VALUES (?, ?, ?)",
+            [(f"user{i}", f"user{i}@example.org", "pw") for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT INTO profiles (user_id, role, grade, time, strong_subjects, weak_subjects, teaches, status, match_id) "
+            "VALUES (?, ?, 'Grade 5', '5-6 PM', 'Mathematics', 'English', 'Science', ?, ?)",
+            [
+                (i + 1, "Teacher" if i % 10 == 0 else "Student",
+                 "waiting" if i % 3 else "matched", f"sess_{i // 2}")
+                for i in range(users)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO sessions (match_id, started_ts) VALUES (?, ?)",
+            [(f"sess_{i}", i) for i in range(users // 2)]
+        )
+        conn.executemany(
+            "INSERT INTO session_participants (match_id, user_id, peer_id, started_ts) VALUES (?, ?, ?, ?)",
+            [(f"sess_{i // 2}", i + 1, i + 2 if i % 2 == 0 else i, i // 2) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT INTO messages (match_id, sender, message, created_ts) VALUES (?, ?, 'hi', ?)",
+            [(f"sess_{i % 100}", f"user{i % users}", i) for i in range(users * 10)]
+        )
+        conn.executemany(
+            "INSERT INTO session_ratings (match_id, rater_id, rating, feedback) VALUES (?, ?, ?, '')",
+            [(f"sess_{i // 2}", i + 1, 1 + i % 5) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT INTO rematch_requests (from_user, to_user) VALUES (?, ?)",
+            [(i + 1, (i * 7) % users + 1) for i in range(users)]
+        )
+        conn.executemany(
+            "INSERT INTO user_streaks (user_id, streak, last_active) VALUES (?, ?, date('now'))",
+            [(i + 1, i % 9) for i in range(users)]
+        )
+        conn.execute("ANALYZE")
+
+
+# ---------------------------------------------------------
+# PLAN ANALYSIS
+# ---------------------------------------------------------
+def classify(detail):
+    if detail.startswith("SCAN ") and " USING " not in detail:
+        return "full scan"
+    if "AUTOMATIC" in detail:
+        return "automatic index"
+    if "USE TEMP B-TREE" in detail:
+        return "temp b-tree"
+    if "CORRELATED" in detail:
+        return "correlated subquery"
+    return None
+
+
+def explain(conn, statement):
+    params = (None,) * statement.sql.count("?")
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + statement.sql, params).fetchall()
+    except Exception as e:
+        return [], [Finding(statement, "error", str(e))]
+    plan = [row[3] for row in rows]
+    findings = [
+        Finding(statement, kind, detail)
+        for kind, detail in ((classify(d), d) for d in plan)
+        if kind
+    ]
+    return plan, findings
+
+
+def audit(root="."):
+    statements = collect_statements(root)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_pool = ConnectionPool(os.path.join(tmp, "audit.db"), max_size=1)
+        init_db(db_pool)
+        seed(db_pool)
+        with db_pool.connection() as conn:
+            for statement in statements:
+                plan, findings = explain(conn, statement)
+                results.append((statement, plan, findings))
+        db_pool.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--all", action="store_true", help="show allowed findings and plans too")
+    args = parser.parse_args()
+
+    results = audit(os.path.dirname(os.path.abspath(__file__)))
+    unexpected = 0
+    for statement, plan, findings in results:
+        shown = [f for f in findings if args.all or not f.allowed]
+        if not shown and not args.all:
+            continue
+        print(f"{statement.file}:{statement.line} ({statement.function})")
+        print(f"    {statement.sql[:120]}")
+        if args.all:
+            for detail in plan:
+                print(f"    | {detail}")
+        for f in shown:
+            tag = "allowed" if f.allowed else "FAIL"
+            print(f"    [{tag}] {f.kind}: {f.detail}")
+        unexpected += sum(1 for f in findings if not f.allowed)
+
+    print(f"\n{len(results)} statements audited, {unexpected} unexpected finding(s)")
+    return 1 if unexpected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Bounded top-k ranking of match candidates.
+
+Offering a "next best" candidate needs more than the single best match,
+but sorting every eligible candidate to get a handful of them is wasted
+work. ``top_k`` scans the candidates once and keeps only the current k
+best in a min-heap, O(n log k). Ties go to the candidate listed first, so
+``k=1`` picks what a plain best-match loop would.
+"""
+import heapq
+
+TOP_K = 5
+
+
+def top_k(items, score, k=TOP_K, min_score=0):
+    """The k best (item, score, detail), best first.
+
+    `score(item)` returns (score, detail); items scoring below `min_score`
+    are left out.
+    """
+    items = list(items)
+    heap = []
+    for i, item in enumerate(items):
+        value, detail = score(item)
+        if value < min_score:
+            continue
+        entry = (value, -i, detail)
+        if len(heap) < k:
+            heapq.heappush(heap, entry)
+        elif entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+    return [(items[-neg_i], value, detail) for value, neg_i, detail in sorted(heap, key=lambda e: e[:2], reverse=True)]
+
+def top_k_mentors(mentee, mentors, score_pair, k=TOP_K, min_score=0):
+    """The k best (mentor, score, reasons) for a mentee dict, skipping the mentee themself.
+
+    `score_pair(mentee, mentor)` returns (score, reasons), like the app
+    scripts' ``calculate_match_score``. For a live user by id, see
+    ``matchmaker.top_k_mentors``.
+    """
+    return top_k(
+        (m for m in mentors if m["name"] != mentee["name"]),
+        lambda mentor: score_pair(mentee, mentor), k, min_score
+    )
@@ -0,0 +1,184 @@
+"""Fair scheduling of matches.
+
+Picking partners by score alone lets the best-scoring mentors take every
+session while mentees with weaker matches wait behind them. The
+scheduler adds two rules, shared by the matchmaker and batch rounds:
+
+* Mentor capacity: a mentor takes at most MENTOR_CAPACITY sessions per
+  CAPACITY_WINDOW. A profile holds one match at a time, so this caps
+  back-to-back sessions through the rush rather than parallel ones.
+* Wait priority: a candidate pair is worth its score plus WAIT_WEIGHT
+  points per second the longer-waiting of the two has been queued (up to
+  WAIT_CAP). Pairs are taken from a heap in that order, so a long wait
+  eventually outranks a better-scoring newcomer.
+
+The scheduler also records when each user joined the queue; the admin
+page shows percentiles of those ages. ``observe`` only adds users; they
+leave through ``dequeue`` when matched, when they leave the queue, when
+the presence reaper takes them out, or when a claim finds they moved on.
+Callers that see only part of the queue therefore can't reset anyone's
+wait.
+
+Both the queue clocks and the capacity counters live in memory and only
+hold for a single process: with several worker processes, each one
+counts only the matches it made itself, so a mentor can get up to
+MENTOR_CAPACITY sessions per window from every worker.
+"""
+import heapq
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+MENTOR_CAPACITY = int(os.environ.get("SAHAY_MENTOR_CAPACITY", 3))          # sessions per mentor per window
+CAPACITY_WINDOW = int(os.environ.get("SAHAY_CAPACITY_WINDOW", 3600))       # seconds
+WAIT_WEIGHT = float(os.environ.get("SAHAY_WAIT_WEIGHT", 0.5))              # score points per second waited
+WAIT_CAP = 300              # seconds of waiting that still add priority
+SUBJECT_POINTS = 50         # per weak subject of the mentee the mentor covers
+# Slot and grade add at most 30, so a pair needs at least one covered subject.
+MIN_SCORE = SUBJECT_POINTS
+
+
+def offered_subjects(subjects):
+    """Subjects someone can help with: what they teach, then what they are strong in."""
+    return list(dict.fromkeys([*subjects.get("teaches", []), *subjects.get("strong", [])]))
+
+def score_reasons(mentee, mentor):
+    """app6 point values for two discovery profiles (time_slot, grade, subjects).
+
+    +50 per weak subject of the mentee the mentor teaches or is strong in,
+    +20 for the same time slot and +10 for the same grade. Returns
+    (score, reasons) with reasons worded as in app6.
+    """
+    mentee_slot, mentee_grade, mentee_subjects = mentee
+    mentor_slot, mentor_grade, mentor_subjects = mentor
+    offered = set(offered_subjects(mentor_subjects))
+    reasons = [f"+{SUBJECT_POINTS} {s}" for s in mentee_subjects.get("weak", []) if s in offered]
+    score = SUBJECT_POINTS * len(reasons)
+    if mentee_slot == mentor_slot:
+        score += 20
+        reasons.append("+20 time match")
+    if mentee_grade == mentor_grade:
+        score += 10
+        reasons.append("+10 same grade")
+    return score, reasons
+
+def pair_score(mentee, mentor):
+    return score_reasons(mentee, mentor)[0]
+
+
+class MatchScheduler:
+    def __init__(self, capacity=MENTOR_CAPACITY, window=CAPACITY_WINDOW,
+                 wait_weight=WAIT_WEIGHT, wait_cap=WAIT_CAP):
+        self.capacity = capacity
+        self.window = window
+        self.wait_weight = wait_weight
+        self.wait_cap = wait_cap
+        self._lock = threading.Lock()
+        self._enqueued = {}
+        self._sessions = {}
+
+    # -----------------------------------------------------
+    # QUEUE
+    # -----------------------------------------------------
+    def observe(self, user_ids, now=None):
+        """Start the clock for users not queued yet; users already queued keep theirs."""
+        now = now or time.time()
+        with self._lock:
+            for user_id in user_ids:
+                self._enqueued.setdefault(user_id, now)
+
+    def waited(self, user_id, now=None):
+        """Seconds this user has been queued, or None if not queued."""
+        with self._lock:
+            since = self._enqueued.get(user_id)
+        return None if since is None else (now or time.time()) - since
+
+    def dequeue(self, user_id, now=None):
+        """Take a matched user off the queue; returns how long they waited."""
+        now = now or time.time()
+        with self._lock:
+            return now - self._enqueued.pop(user_id, now)
+
+    def queue_ages(self, now=None):
+        """Percentiles of how long the currently queued users have waited."""
+        now = now or time.time()
+        with self._lock:
+            ages = sorted(now - since for since in self._enqueued.values())
+        if len(ages) < 2:
+            return {"waiting": len(ages), "max": ages[-1] if ages else 0.0, "p50": None}
+        cuts = statistics.quantiles(ages, n=100, method="inclusive")
+        return {"waiting": len(ages), "max": ages[-1],
+                "p50": cuts[49], "p90": cuts[89], "p95": cuts[94], "p99": cuts[98]}
+
+    # -----------------------------------------------------
+    # CAPACITY
+    # -----------------------------------------------------
+    def record_session(self, mentor_id, at=None):
+        with self._lock:
+            self._sessions.setdefault(mentor_id, deque()).append(at or time.time())
+
+    def load(self, mentor_id, now=None):
+        """Sessions this mentor has started within the window."""
+        cutoff = (now or time.time()) - self.window
+        with self._lock:
+            started = self._sessions.get(mentor_id)
+            if not started:
+                return 0
+            while started and started[0] < cutoff:
+                started.popleft()
+            if not started:
+                del self._sessions[mentor_id]
+                return 0
+            return len(started)
+
+    def has_capacity(self, mentor_id, now=None):
+        return self.load(mentor_id, now) < self.capacity
+
+    def saturated(self, now=None):
+        """Mentors who can't take another session right now."""
+        with self._lock:
+            mentor_ids = list(self._sessions)
+        return {m for m in mentor_ids if not self.has_capacity(m, now)}
+
+    # -----------------------------------------------------
+    # ORDERING
+    # -----------------------------------------------------
+    def wait_bonus(self, waited):
+        return self.wait_weight * min(waited or 0.0, self.wait_cap)
+
+    def priority(self, score, waited):
+        return score + self.wait_bonus(waited)
+
+    def plan(self, candidates, now=None):
+        """Choose pairs from (mentee_id, mentor_id, score) candidates.
+
+        Candidates below MIN_SCORE (no covered subject) are dropped. The rest are popped from a
+        heap by blended priority (ties: earlier candidate first); a pair is
+        kept if neither user is already paired in this plan and the mentor
+        has capacity left. Returns the kept candidates in that order.
+        """
+        now = now or time.time()
+        heap = []
+        for seq, (mentee_id, mentor_id, score) in enumerate(candidates):
+            if score < MIN_SCORE:
+                continue
+            waited = max(self.waited(mentee_id, now) or 0.0, self.waited(mentor_id, now) or 0.0)
+            heap.append((-self.priority(score, waited), seq, mentee_id, mentor_id, score))
+        heapq.heapify(heap)
+
+        taken, planned = set(), []
+        while heap:
+            _, _, mentee_id, mentor_id, score = heapq.heappop(heap)
+            if mentee_id in taken or mentor_id in taken or not self.has_capacity(mentor_id, now):
+                continue
+            taken.update((mentee_id, mentor_id))
+            planned.append((mentee_id, mentor_id, score))
+        return planned
+
+
+scheduler = MatchScheduler()
+
+def queue_age_percentiles():
+    return scheduler.queue_ages()
@@ -0,0 +1,205 @@
+"""Deterministic synthetic population for load and scale testing.
+
+Fills auth_users, profiles (and profile_subjects), sessions (and
+session_participants), messages, session_ratings, user_streaks and
+rematch_requests at a named scale. The same scale and seed always produce
+the same rows; timestamps are laid out relative to ``now`` so presence
+and archival windows stay realistic.
+
+    python seed_data.py --scale small --db /tmp/sahay_small.db
+"""
+import argparse
+import os
+import random
+import time
+
+from database import ConnectionPool, init_db
+
+SCALES = {
+    "tiny":   {"students": 500,    "teachers": 50,   "messages": 20_000},
+    "small":  {"students": 5_000,  "teachers": 500,  "messages": 250_000},
+    "medium": {"students": 20_000, "teachers": 1_000, "messages": 2_000_000},
+    "large":  {"students": 50_000, "teachers": 2_000, "messages": 10_000_000},
+}
+
+SUBJECTS = ["Mathematics", "English", "Science"]
+TIME_SLOTS = ["4-5 PM", "5-6 PM", "6-7 PM"]
+STATUSES = ["waiting", "active", "confirming", "matched"]
+MESSAGES_PER_SESSION = 40
+CHUNK = 20_000
+DAY = 86_400
+
+
+def _chunks(rows, size=CHUNK):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(db_pool, sql, rows):
+    for batch in _chunks(rows):
+        with db_pool.transaction() as conn:
+            conn.executemany(sql, batch)
+
+
+def generate(db_pool, scale="tiny", seed=42, now=None):
+    """Populate an empty, migrated database; returns row counts per table."""
+    spec = SCALES[scale]
+    rng = random.Random(seed)
+    now = int(now or time.time())
+    students, teachers = spec["students"], spec["teachers"]
+    users = students + teachers
+    sessions = max(1, spec["messages"] // MESSAGES_PER_SESSION)
+
+    # -------------------------
+    # USERS AND PROFILES
+    # -------------------------
+    _insert(db_pool,
+        "INSERT INTO auth_users (id, name, email, password) VALUES (?, ?, ?, ?)",
+        ((uid, f"User {uid}", f"user{uid}@example.org", "pw") for uid in range(1, users + 1))
+    )
+
+    profiles, subjects = [], []
+    for uid in range(1, users + 1):
+        is_teacher = uid > students
+        grade = rng.randint(1, 10)
+        picks = rng.sample(SUBJECTS, rng.randint(1, 2))
+        if is_teacher:
+            strong, weak, teaches = [], [], picks
+        else:
+            rest = [s for s in SUBJECTS if s not in picks]
+            strong, weak = picks, rng.sample(rest, rng.randint(0, len(rest)))
+            teaches = []
+        time_slot = rng.choice(TIME_SLOTS)
+        status, last_seen = rng.choice(STATUSES), now - rng.randint(0, 3600)
+        profiles.append((
+            uid, "Teacher" if is_teacher else "Student", f"Grade {grade}", grade,
+            time_slot, ",".join(strong), ",".join(weak), ",".join(teaches),
+            status, last_seen, last_seen if status == "waiting" else None
+        ))
+        for kind, values in (("strong", strong), ("weak", weak), ("teaches", teaches)):
+            subjects.extend((uid, s, kind) for s in values)
+
+    _insert(db_pool,
+        "INSERT INTO profiles (user_id, role, grade, class_level, time, strong_subjects, weak_subjects, teaches, status, last_seen, waiting_since) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        profiles
+    )
+    _insert(db_pool,
+        "INSERT INTO profile_subjects (user_id, subject, kind) VALUES (?, ?, ?)",
+        subjects
+    )
+
+    # -------------------------
+    # SESSIONS: MESSAGES AND RATINGS
+    # -------------------------
+    pairs = []
+    for n in range(sessions):
+        a = rng.randint(1, students)
+        b = rng.randint(students + 1, users) if rng.random() < 0.6 else rng.randint(1, students)
+        if a == b:
+            b = a % students + 1
+        start = now - rng.randint(0, 90 * DAY)
+        pairs.append((f"sess_{seed}_{n}", a, b, start))
+
+    # Registered before the messages so the insert trigger counts them.
+    _insert(db_pool,
+        "INSERT INTO sessions (match_id, started_ts, ended_ts) VALUES (?, ?, ?)",
+        ((match_id, start, start + MESSAGES_PER_SESSION * 15) for match_id, _, _, start in pairs)
+    )
+    _insert(db_pool,
+        "INSERT INTO session_participants (match_id, user_id, peer_id, started_ts) VALUES (?, ?, ?, ?)",
+        (
+            (match_id, user, peer, start)
+            for match_id, a, b, start in pairs
+            for user, peer in ((a, b), (b, a))
+        )
+    )
+
+    def messages():
+        for match_id, a, b, start in pairs:
+            for i in range(MESSAGES_PER_SESSION):
+                sender = a if i % 2 == 0 else b
+                yield (match_id, f"User {sender}", f"message {i} in {match_id}", start + i * 15)
+
+    _insert(db_pool,
+        "INSERT INTO messages (match_id, sender, message, created_ts) VALUES (?, ?, ?, ?)",
+        messages()
+    )
+    _insert(db_pool,
+        "INSERT INTO session_ratings (match_id, rater_id, rating, feedback) VALUES (?, ?, ?, ?)",
+        (
+            (match_id, rater, rng.randint(1, 5), rng.choice(["", "Helpful", "Great session"]))
+            for match_id, a, b, _ in pairs
+            for rater in (a, b)
+            if rng.random() < 0.8
+        )
+    )
+
+    # The most recent session of a sample of users is still "current".
+    with db_pool.transaction() as conn:
+        conn.executemany(
+            "UPDATE profiles SET match_id=? WHERE user_id IN (?, ?)",
+            [(match_id, a, b) for match_id, a, b, _ in pairs[-min(len(pairs), users // 10):]]
+        )
+
+    # -------------------------
+    # STREAKS AND REMATCHES
+    # -------------------------
+    _insert(db_pool,
+        "INSERT INTO user_streaks (user_id, streak, last_active) VALUES (?, ?, date(?, 'unixepoch'))",
+        ((uid, rng.randint(0, 30), now - rng.randint(0, 5) * DAY) for uid in range(1, users + 1))
+    )
+    rematches = users // 5
+    _insert(db_pool,
+        "INSERT INTO rematch_requests (from_user, to_user, status, seen) VALUES (?, ?, ?, ?)",
+        (
+            (rng.randint(1, users), rng.randint(1, users),
+             rng.choice(["pending", "pending", "accepted"]), rng.randint(0, 1))
+            for _ in range(rematches)
+        )
+    )
+
+    with db_pool.connection() as conn:
+        conn.execute("ANALYZE")
+
+    return {
+        "auth_users": users,
+        "profiles": users,
+        "messages": sessions * MESSAGES_PER_SESSION,
+        "sessions": sessions,
+        "rematch_requests": rematches,
+    }
+
+
+def create_seeded_db(path, scale="tiny", seed=42):
+    """Create, migrate and fill a database at `path`; returns (pool, counts)."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists; seeding needs an empty database")
+    db_pool = ConnectionPool(path, max_size=2)
+    init_db(db_pool)
+    return db_pool, generate(db_pool, scale, seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=list(SCALES), default="tiny")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", required=True, help="path of the database to create")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db_pool, counts = create_seeded_db(args.db, args.scale, args.seed)
+    db_pool.close()
+    print(f"Seeded {args.db} at scale '{args.scale}' in {time.perf_counter() - started:.1f}s")
+    for table, n in counts.items():
+        print(f"  {table:<18}{n:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Session registry.
+
+``profiles.match_id`` only says which match a user is in right now; it is
+replaced by the next match and cleared when the user returns to
+discovery. Every match is therefore also recorded in ``sessions`` (one
+row per match: start and end time, message count, last message time)
+and ``session_participants`` (one row per user and match, with the
+partner's id), written in the same transaction that creates the match.
+Message counters are kept by a trigger on ``messages`` (see
+database.migrate_sessions).
+
+History, rematch and rating queries read ``session_participants`` by
+``(user_id, started_ts)`` or by match id.
+"""
+import time
+
+from database import get_connection
+from db_writer import submit_write
+
+
+def register_session(conn, match_id, user_id, peer_id, started_ts=None):
+    """Record a new match inside the caller's open transaction."""
+    started_ts = int(started_ts or time.time())
+    conn.execute(
+        "INSERT OR IGNORE INTO sessions (match_id, started_ts) VALUES (?, ?)",
+        (match_id, started_ts)
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO session_participants (match_id, user_id, peer_id, started_ts) VALUES (?, ?, ?, ?)",
+        [(match_id, user_id, peer_id, started_ts), (match_id, peer_id, user_id, started_ts)]
+    )
+
+def end_session(match_id, ended_ts=None):
+    """Mark a session finished; the first caller's time wins."""
+    if not match_id:
+        return None
+    return submit_write(
+        "UPDATE sessions SET ended_ts=? WHERE match_id=? AND ended_ts IS NULL",
+        (int(ended_ts or time.time()), match_id)
+    )
+
+def session_peer(match_id, user_id):
+    """(peer_id, peer_name) of a user's partner in a session, or None."""
+    with get_connection() as conn:
+        return conn.execute("""
+            SELECT sp.peer_id, a.name
+            FROM session_participants sp
+            JOIN auth_users a ON a.id = sp.peer_id
+            WHERE sp.match_id = ? AND sp.user_id = ?
+        """, (match_id, user_id)).fetchone()
@@ -0,0 +1,115 @@
+"""Read-only snapshot of the database for admin analytics.
+
+The admin panel's full scans and correlated rating subqueries run against
+a copy taken with ``sqlite3.Connection.backup`` instead of the live file
+the chat writes to. Readers open it with ``query_only`` set.
+
+Once the copy is older than the staleness bound, a reader starts a
+refresh on a background thread and keeps reading the previous copy, so
+the backup, which includes the large ``messages`` table, never runs
+inside a page request. Only when there is no copy at all is the first
+one taken inline.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from database import DB_PATH, pool
+
+SNAPSHOT_PATH = os.path.splitext(DB_PATH)[0] + "_snapshot.db"
+SNAPSHOT_MAX_AGE = float(os.environ.get("SAHAY_SNAPSHOT_MAX_AGE", 60))
+
+log = logging.getLogger("sahay.snapshot")
+
+
+class SnapshotStore:
+    def __init__(self, db_pool=pool, path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE):
+        self.db_pool = db_pool
+        self.path = path
+        self.max_age = max_age
+        # A copy left by an earlier run is served until the first refresh.
+        self.taken_at = os.path.getmtime(path) if os.path.exists(path) else None
+        self.last_duration = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def age(self):
+        return None if self.taken_at is None else time.time() - self.taken_at
+
+    def refresh(self):
+        """Take a new copy now; the previous one is replaced only once it is complete."""
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        started = time.perf_counter()
+        try:
+            dst = sqlite3.connect(tmp_path)
+            try:
+                with self.db_pool.connection() as src:
+                    src.backup(dst)
+                # A WAL-mode copy can't be opened read-only without its -shm file.
+                dst.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                dst.close()
+            os.replace(tmp_path, self.path)
+        finally:
+            # Only left behind if the backup failed partway.
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+        self.taken_at = time.time()
+        self.last_duration = time.perf_counter() - started
+
+    def _refresh_logged(self):
+        try:
+            self.refresh()
+            self.last_error = None
+        except Exception as exc:
+            log.exception("snapshot refresh failed")
+            self.last_error = f"{type(exc).__name__}: {exc}"
+
+    def refreshing(self):
+        return self._refresher is not None and self._refresher.is_alive()
+
+    def refresh_in_background(self):
+        """Start a refresh unless one is running; returns True if this call started it."""
+        with self._lock:
+            if self.refreshing():
+                return False
+            self._refresher = threading.Thread(target=self._refresh_logged, name="sahay-snapshot", daemon=True)
+            self._refresher.start()
+            return True
+
+    def ensure_fresh(self, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        if self.taken_at is None or not os.path.exists(self.path):
+            with self._lock:
+                # Another session may have taken the first copy while we waited.
+                if self.taken_at is None or not os.path.exists(self.path):
+                    self.refresh()
+            return
+        if self.age() > max_age:
+            self.refresh_in_background()
+
+    @contextmanager
+    def connection(self, max_age=None):
+        self.ensure_fresh(max_age)
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only=ON")
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+
+snapshots = SnapshotStore()
+
+def snapshot_connection(max_age=None):
+    return snapshots.connection(max_age)
+
+def snapshot_age():
+    return snapshots.age()
@@ -1,7 +1,8 @@
 import streamlit as st
 import requests
 from datetime import date
-from database import cursor, conn
+from database import get_connection, transaction
+from db_writer import write
 from streamlit_lottie import st_lottie
 
 # -----------------------------------------------------
@@ -93,11 +94,11 @@ def init_streak():
     if not user_id:
         return
 
-    cursor.execute(
-        "SELECT streak, last_active FROM user_streaks WHERE user_id=?",
-        (user_id,)
-    )
-    row = cursor.fetchone()
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT streak, last_active FROM user_streaks WHERE user_id=?",
+            (user_id,)
+        ).fetchone()
 
     if row:
         st.session_state.streak = row[0]
@@ -105,11 +106,11 @@ def init_streak():
             date.fromisoformat(row[1]) if row[1] else None
         )
     else:
-        cursor.execute(
-            "INSERT INTO user_streaks (user_id, streak, last_active) VALUES (?, 0, NULL)",
-            (user_id,)
-        )
-        conn.commit()
+        with transaction() as conn:
+            conn.execute(
+                "INSERT INTO user_streaks (user_id, streak, last_active) VALUES (?, 0, NULL)",
+                (user_id,)
+            )
 
 def update_streak():
     init_streak()
@@ -126,10 +127,9 @@ def update_streak():
             )
 
         st.session_state.last_active = today
-        cursor.execute("""
+        write("""
             UPDATE user_streaks SET streak=?, last_active=? WHERE user_id=?
         """, (st.session_state.streak, today.isoformat(), st.session_state.user_id))
-        conn.commit()
         return True
     return False
 